@@ -12,6 +12,14 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
 from .models import db
+from .db_engine import configure_database, init_replica_session, get_pool_stats
+from .jobs import init_job_queue, get_job_queue_stats
+from .temp_store import get_temp_store_stats
+from .api.ocr_cache import get_ocr_cache_stats
+from .api.store_geo import get_store_geo_stats
+from .api.store_search import get_store_search_stats
+from .api.recommendation_cache import get_recommendation_cache_stats
+from .gemini_gateway import init_request_deadline, get_gemini_stats
 from .errors import register_error_handlers
 from .admin.routes import admin_bp
 from .api.routes import api_bp
@@ -48,26 +56,20 @@ def create_app():
     
     # 設定資料庫 - 使用 try-catch 避免啟動失敗
     try:
-        # 從個別環境變數構建資料庫 URL
-        db_username = os.getenv('DB_USER')
-        db_password = os.getenv('DB_PASSWORD')
-        db_host = os.getenv('DB_HOST')
-        db_name = os.getenv('DB_DATABASE')
-        
-        if all([db_username, db_password, db_host, db_name]):
-            # 使用 MySQL 連線，添加 SSL 參數
-            database_url = f"mysql+pymysql://{db_username}:{db_password}@{db_host}/{db_name}?ssl={{'ssl': {{}}}}&ssl_verify_cert=false"
-            app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-            print(f"✓ 使用 MySQL 資料庫: {db_host}/{db_name}")
+        # 從個別環境變數構建資料庫 URL，並依 AppConfig 套用連線池設定
+        if configure_database(app):
+            print(f"✓ 使用 MySQL 資料庫: {os.getenv('DB_HOST')}/{os.getenv('DB_DATABASE')}")
+            if app.config.get('SQLALCHEMY_BINDS'):
+                print(f"✓ 唯讀查詢使用副本: {os.getenv('DB_REPLICA_HOST')}")
         else:
             # 回退到 SQLite
-            app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
             print("⚠️ 使用 SQLite 資料庫 (開發模式)")
         
         app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
         
         # 初始化資料庫
         db.init_app(app)
+        init_replica_session(app)
         print("✓ 資料庫初始化成功")
         
     except Exception as e:
@@ -75,6 +77,8 @@ def create_app():
         print("應用程式將在沒有資料庫的情況下啟動")
         # 設定一個簡單的 SQLite 配置作為後備
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config.pop('SQLALCHEMY_ENGINE_OPTIONS', None)
+        app.config.pop('SQLALCHEMY_BINDS', None)
         app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
         db.init_app(app)
     
@@ -86,6 +90,12 @@ def create_app():
     # 註冊錯誤處理
     register_error_handlers(app)
     
+    # 背景工作佇列（語音生成、LINE 推播、翻譯回填）
+    init_job_queue(app)
+    
+    # 每個請求的整體期限，Gemini 呼叫不會超過請求本身的逾時
+    init_request_deadline(app)
+    
     # 簡單的測試頁面
     @app.route('/test')
     def test_page():
@@ -153,6 +163,125 @@ def create_app():
             'port': app.config.get('PORT', 8080)
         }), 200
     
+    # 資料庫連線池監控端點 - 借用等待時間與使用中連線數
+    @app.route('/health/db-pool')
+    def db_pool_stats():
+        """連線池統計端點"""
+        try:
+            return jsonify({
+                'status': 'ok',
+                'timestamp': datetime.datetime.utcnow().isoformat(),
+                'pools': get_pool_stats()
+            }), 200
+        except Exception as e:
+            return jsonify({'status': 'error', 'error': str(e)}), 500
+    
+    # 翻譯快取監控端點 - L1/L2 命中率與負向快取次數
+    @app.route('/health/translation-cache')
+    def translation_cache_stats():
+        """翻譯快取統計端點"""
+        from .api.translation_service import get_translation_cache_stats
+        return jsonify({
+            'status': 'ok',
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+            'cache': get_translation_cache_stats()
+        }), 200
+    
+    # 外部 API 客戶端監控端點 - 各客戶端建立次數與呼叫延遲
+    @app.route('/health/clients')
+    def api_client_stats():
+        """外部 API 客戶端統計端點"""
+        from .clients import get_client_stats
+        return jsonify({
+            'status': 'ok',
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+            'clients': get_client_stats()
+        }), 200
+    
+    # TTS 音訊快取監控端點 - 命中率與快取大小
+    @app.route('/health/tts-cache')
+    def tts_cache_stats():
+        """TTS 音訊快取統計端點"""
+        from .api.helpers import get_tts_cache_stats
+        return jsonify({
+            'status': 'ok',
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+            'cache': get_tts_cache_stats()
+        }), 200
+    
+    # 背景工作佇列監控端點 - 各狀態數量與工作執行緒統計
+    @app.route('/health/jobs')
+    def job_queue_stats():
+        """背景工作佇列統計端點"""
+        try:
+            return jsonify({
+                'status': 'ok',
+                'timestamp': datetime.datetime.utcnow().isoformat(),
+                'jobs': get_job_queue_stats()
+            }), 200
+        except Exception as e:
+            return jsonify({'status': 'error', 'error': str(e)}), 500
+    
+    # 暫存狀態監控端點 - OCR 暫存資料的命中、過期淘汰與容量
+    @app.route('/health/temp-state')
+    def temp_state_stats():
+        """暫存狀態儲存統計端點"""
+        try:
+            return jsonify({
+                'status': 'ok',
+                'timestamp': datetime.datetime.utcnow().isoformat(),
+                'temp_state': get_temp_store_stats()
+            }), 200
+        except Exception as e:
+            return jsonify({'status': 'error', 'error': str(e)}), 500
+    
+    # OCR 結果快取監控端點 - 命中率、比對耗時與門檻
+    @app.route('/health/ocr-cache')
+    def ocr_cache_stats():
+        """OCR 結果快取統計端點"""
+        return jsonify({
+            'status': 'ok',
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+            'ocr_cache': get_ocr_cache_stats()
+        }), 200
+    
+    # Gemini 呼叫監控端點 - 各操作的延遲、錯誤、逾時與對沖統計
+    @app.route('/health/gemini')
+    def gemini_stats():
+        """Gemini 呼叫統計端點"""
+        return jsonify({
+            'status': 'ok',
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+            'gemini': get_gemini_stats()
+        }), 200
+    
+    @app.route('/health/store-geo')
+    def store_geo_stats():
+        """附近店家空間索引統計端點"""
+        return jsonify({
+            'status': 'ok',
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+            'store_geo': get_store_geo_stats()
+        }), 200
+    
+    @app.route('/health/store-search')
+    def store_search_stats():
+        """AI 推薦候選檢索索引統計端點"""
+        return jsonify({
+            'status': 'ok',
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+            'store_search': get_store_search_stats()
+        }), 200
+    
+    @app.route('/health/recommendation-cache')
+    def recommendation_cache_stats():
+        """AI 推薦結果快取統計端點"""
+        return jsonify({
+            'status': 'ok',
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+            'recommendation_cache': get_recommendation_cache_stats()
+        }), 200
+    
     return app
 
 
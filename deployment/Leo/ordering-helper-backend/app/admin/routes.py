@@ -15,7 +15,10 @@
 # =============================================================================
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from sqlalchemy.orm import joinedload
 from ..models import db, Store, Menu, MenuItem, MenuTranslation, User, Order, StoreTranslation, Language
+from ..order_rollups import get_order_totals, get_order_breakdown
+import datetime
 from flask_admin import Admin
 from flask_admin.contrib.sqla import ModelView
 from flask_admin.form import SecureForm
@@ -61,8 +64,8 @@ def dashboard():
     stats = {
         'total_stores': Store.query.count(),
         'total_users': User.query.count(),
-        'total_orders': Order.query.count(),
-        'recent_orders': Order.query.order_by(Order.order_time.desc()).limit(5).all()
+        'total_orders': get_order_totals()['orders'],
+        'recent_orders': Order.query.options(joinedload(Order.store)).order_by(Order.order_time.desc()).limit(5).all()
     }
     return render_template('admin/dashboard.html', stats=stats)
 
@@ -87,9 +90,15 @@ def orders():
 
 @admin_bp.route('/reports')
 def reports():
-    """報表查詢"""
-    # TODO: 實作報表功能
-    return render_template('admin/reports.html')
+    """報表查詢（本月統計由訂單每日彙總取得）"""
+    month_start = datetime.date.today().replace(day=1)
+    monthly = get_order_totals(start=month_start)
+    stats = {
+        'monthly_orders': monthly['orders'],
+        'monthly_revenue': monthly['revenue'],
+        'partner_stores': Store.query.filter(Store.partner_level > 0).count()
+    }
+    return render_template('admin/reports.html', stats=stats)
 
 # API 端點
 @admin_bp.route('/api/stores', methods=['GET'])
@@ -124,11 +133,20 @@ def api_create_store():
 
 @admin_bp.route('/api/orders/stats', methods=['GET'])
 def api_order_stats():
-    """訂單統計 API"""
-    # TODO: 實作訂單統計
+    """
+    訂單統計 API（由訂單每日彙總計算）
+
+    查詢參數：
+    - days：每日、店家、語言明細涵蓋的天數（預設 30，最多 366）
+    """
+    days = max(1, min(request.args.get('days', 30, type=int), 366))
+    today = datetime.date.today()
+    totals = get_order_totals()
     stats = {
-        'total_orders': Order.query.count(),
-        'total_revenue': sum(order.total_amount for order in Order.query.all()),
-        'recent_orders': Order.query.order_by(Order.order_time.desc()).limit(10).count()
+        'total_orders': totals['orders'],
+        'total_revenue': totals['revenue'],
+        'recent_orders': get_order_totals(start=today - datetime.timedelta(days=6))['orders'],
+        'days': days,
+        **get_order_breakdown(start=today - datetime.timedelta(days=days - 1))
     }
     return jsonify(stats) 
\ No newline at end of file
@@ -0,0 +1,191 @@
+# =============================================================================
+# 檔案名稱：app/api/audio_meta.py
+# 功能描述：語音檔中繼資料（播放長度）
+# 主要職責：
+# - 只讀取 MP3 影格標頭計算播放長度，不解碼音訊、不呼叫 ffmpeg
+# - 將長度寫在語音檔旁的 <檔名>.json，之後發送 LINE 語音訊息時直接讀取
+# - 無法解析時依文字長度與語速估算
+# =============================================================================
+
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DURATION_MS = 30000
+META_SUFFIX = '.json'
+
+# MPEG 版本（標頭 bit 19-20）：0 = MPEG 2.5、2 = MPEG 2、3 = MPEG 1
+_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    0: (11025, 12000, 8000)
+}
+
+# 位元率表（kbps），索引 1-14；鍵為 (是否 MPEG 1, layer)
+_BITRATES = {
+    (True, 1): (32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+}
+
+def _parse_frame_header(data, pos):
+    """
+    解析 pos 位置的 MP3 影格標頭
+
+    Returns:
+        tuple: (影格長度 bytes, 取樣數, 取樣率, MPEG 版本, 聲道模式)；不是合法標頭時返回 None
+    """
+    if pos + 4 > len(data):
+        return None
+    b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+    if data[pos] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 0x03
+    layer = 4 - ((b1 >> 1) & 0x03)
+    bitrate_index = (b2 >> 4) & 0x0F
+    sample_rate_index = (b2 >> 2) & 0x03
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index - 1] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    padding = (b2 >> 1) & 0x01
+    channel_mode = (b3 >> 6) & 0x03
+
+    if layer == 1:
+        samples = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or mpeg1) else 576
+        frame_length = samples // 8 * bitrate // sample_rate + padding
+    return frame_length, samples, sample_rate, version, channel_mode
+
+def _skip_id3v2(data):
+    """跳過檔頭的 ID3v2 標籤，返回音訊資料起點"""
+    if len(data) >= 10 and data[:3] == b'ID3':
+        size = (data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | (data[9] & 0x7F)
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+def _xing_frame_count(data, pos, version, channel_mode):
+    """讀取第一個影格中的 Xing/Info 標頭（VBR 檔案）的總影格數"""
+    mono = channel_mode == 3
+    if version == 3:
+        side_info = 17 if mono else 32
+    else:
+        side_info = 9 if mono else 17
+    tag_pos = pos + 4 + side_info
+    if data[tag_pos:tag_pos + 4] not in (b'Xing', b'Info') or tag_pos + 12 > len(data):
+        return None
+    flags = int.from_bytes(data[tag_pos + 4:tag_pos + 8], 'big')
+    if not flags & 0x01:
+        return None
+    return int.from_bytes(data[tag_pos + 8:tag_pos + 12], 'big')
+
+def mp3_duration_ms(data):
+    """
+    由 MP3 影格標頭計算播放長度
+
+    有 Xing/Info 標頭時直接使用其影格數，否則逐一走過影格標頭累加取樣數。
+
+    Args:
+        data (bytes): MP3 檔案內容
+
+    Returns:
+        int: 播放長度（毫秒）；找不到合法影格時返回 None
+    """
+    pos = _skip_id3v2(data)
+    end = len(data)
+    total_seconds = 0.0
+    frames = 0
+
+    while pos + 4 <= end:
+        header = _parse_frame_header(data, pos)
+        if header is None or header[0] <= 0:
+            # 重新同步：找下一個 0xFF
+            pos = data.find(b'\xff', pos + 1)
+            if pos < 0:
+                break
+            continue
+
+        frame_length, samples, sample_rate, version, channel_mode = header
+        if frames == 0:
+            frame_count = _xing_frame_count(data, pos, version, channel_mode)
+            if frame_count:
+                return int(round(frame_count * samples * 1000 / sample_rate))
+        total_seconds += samples / sample_rate
+        frames += 1
+        pos += frame_length
+
+    if frames == 0:
+        return None
+    return int(round(total_seconds * 1000))
+
+def estimate_tts_duration_ms(text, speaking_rate=1.0):
+    """依文字長度與語速估算語音長度（Cloud TTS 中文約每字 0.25 秒）"""
+    rate = speaking_rate or 1.0
+    return max(1000, int(len(text or '') * 250 / rate))
+
+def meta_path(audio_path):
+    """語音檔中繼資料的路徑（與語音檔同目錄）"""
+    return f"{audio_path}{META_SUFFIX}"
+
+def save_audio_meta(audio_path, duration_ms):
+    """將播放長度寫在語音檔旁"""
+    try:
+        with open(meta_path(audio_path), 'w', encoding='utf-8') as f:
+            json.dump({'duration_ms': int(duration_ms)}, f)
+    except OSError as e:
+        logger.warning(f"寫入語音中繼資料失敗: {audio_path}, {e}")
+
+def load_audio_meta(audio_path):
+    """讀取語音檔旁的中繼資料；不存在時返回 None"""
+    try:
+        with open(meta_path(audio_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def remove_audio_meta(audio_path):
+    """刪除語音檔旁的中繼資料"""
+    try:
+        os.remove(meta_path(audio_path))
+    except OSError:
+        pass
+
+def get_audio_duration_ms(audio_path, default=DEFAULT_DURATION_MS):
+    """
+    取得語音檔播放長度（毫秒），供 LINE AudioSendMessage 的 duration 使用
+
+    優先讀取旁邊的中繼資料；沒有時解析 MP3 影格標頭並寫回中繼資料。
+
+    Args:
+        audio_path (str): 本機語音檔路徑
+        default (int): 無法取得時的預設值
+
+    Returns:
+        int: 播放長度（毫秒）
+    """
+    meta = load_audio_meta(audio_path)
+    if meta and meta.get('duration_ms'):
+        return int(meta['duration_ms'])
+
+    try:
+        with open(audio_path, 'rb') as f:
+            duration_ms = mp3_duration_ms(f.read())
+    except OSError as e:
+        logger.warning(f"讀取語音檔失敗，使用預設長度: {audio_path}, {e}")
+        return default
+
+    if not duration_ms:
+        logger.warning(f"無法解析 MP3 影格，使用預設長度: {audio_path}")
+        return default
+    save_audio_meta(audio_path, duration_ms)
+    return duration_ms
@@ -30,36 +30,73 @@ from copy import deepcopy
 # 功能：提供批次翻譯服務，支援任意語言
 # =============================================================================
 
-def translate_text_batch(texts: List[str], target_language: str, source_language: str = None) -> List[str]:
+# Cloud Translation API 單次請求上限（官方建議 1024 個片段、30,000 個字元）
+MAX_SEGMENTS_PER_REQUEST = 1024
+MAX_CODEPOINTS_PER_REQUEST = 30000
+
+# 同時送出的區塊數上限與失敗區塊的重試次數
+TRANSLATE_MAX_CONCURRENCY = int(os.getenv('TRANSLATE_MAX_CONCURRENCY', '4'))
+TRANSLATE_CHUNK_RETRIES = int(os.getenv('TRANSLATE_CHUNK_RETRIES', '2'))
+
+def chunk_translation_texts(texts: List[str]) -> List[List[int]]:
     """
-    使用 Google Cloud Translation API 批次翻譯文字
+    依 API 的片段數與字元數上限切分文字列表
+    
+    Returns:
+        每個區塊包含的原始索引
+    """
+    chunks = []
+    current = []
+    current_size = 0
+    for index, text in enumerate(texts):
+        size = len(text or '')
+        if current and (len(current) >= MAX_SEGMENTS_PER_REQUEST or
+                        current_size + size > MAX_CODEPOINTS_PER_REQUEST):
+            chunks.append(current)
+            current = []
+            current_size = 0
+        current.append(index)
+        current_size += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+def translate_text_chunks(texts: List[str], target_language: str, source_language: str = None) -> List[Optional[str]]:
+    """
+    將文字切成符合 API 上限的區塊並行翻譯，保留原始順序；失敗的區塊只重試該區塊
     
     Args:
         texts: 要翻譯的文字列表
-        target_language: 目標語言碼 (如 'fr', 'de', 'th')
-        source_language: 來源語言碼 (如 'en', 'zh')，可為 None 自動偵測
+        target_language: 目標語言碼
+        source_language: 來源語言碼，可為 None 自動偵測
     
     Returns:
-        翻譯後的文字列表
+        翻譯後的文字列表；重試後仍失敗的區塊對應位置為 None
+    
+    Raises:
+        ImportError / Exception: 未安裝 google-cloud-translate 或未設定 GOOGLE_CLOUD_PROJECT
     """
-    try:
-        from google.cloud import translate_v3 as translate
-        
-        # 檢查環境變數
-        project_id = os.environ.get("GOOGLE_CLOUD_PROJECT")
-        if not project_id:
-            raise Exception("GOOGLE_CLOUD_PROJECT 環境變數未設定")
-        
-        location = "global"  # 或使用 "us-central1"
-        
-        # 建立翻譯客戶端
-        client = translate.TranslationServiceClient()
-        parent = f"projects/{project_id}/locations/{location}"
-        
+    from google.cloud import translate_v3 as translate  # noqa: F401 - 未安裝時直接拋出 ImportError
+    from concurrent.futures import ThreadPoolExecutor
+    import time
+    
+    # 檢查環境變數
+    project_id = os.environ.get("GOOGLE_CLOUD_PROJECT")
+    if not project_id:
+        raise Exception("GOOGLE_CLOUD_PROJECT 環境變數未設定")
+    
+    location = "global"  # 或使用 "us-central1"
+    parent = f"projects/{project_id}/locations/{location}"
+    
+    # 取得共用翻譯客戶端（執行緒安全，可供各區塊共用）
+    from ..clients import get_client
+    client = get_client('translate')
+    
+    def translate_chunk(indexes):
         # 準備翻譯請求
         request_data = {
             "parent": parent,
-            "contents": texts,
+            "contents": [texts[i] for i in indexes],
             "mime_type": "text/plain",
             "target_language_code": target_language,
         }
@@ -68,23 +105,93 @@ def translate_text_batch(texts: List[str], target_language: str, source_language
         if source_language:
             request_data["source_language_code"] = source_language
         
-        # 執行翻譯
         response = client.translate_text(request=request_data)
+        translated = [translation.translated_text for translation in response.translations]
+        if len(translated) != len(indexes):
+            raise Exception(f"翻譯結果數量不符: {len(translated)} != {len(indexes)}")
+        return translated
+    
+    results = [None] * len(texts)
+    pending = chunk_translation_texts(texts)
+    
+    for attempt in range(TRANSLATE_CHUNK_RETRIES + 1):
+        if attempt:
+            time.sleep(0.2 * (2 ** (attempt - 1)))
+            logging.warning(f"重試 {len(pending)} 個翻譯失敗的區塊（第 {attempt} 次）")
         
-        # 提取翻譯結果
-        translated_texts = [translation.translated_text for translation in response.translations]
+        if len(pending) == 1:
+            outcomes = []
+            try:
+                outcomes.append(translate_chunk(pending[0]))
+            except Exception as e:
+                outcomes.append(e)
+        else:
+            with ThreadPoolExecutor(max_workers=min(TRANSLATE_MAX_CONCURRENCY, len(pending))) as executor:
+                futures = [executor.submit(translate_chunk, indexes) for indexes in pending]
+                outcomes = []
+                for future in futures:
+                    try:
+                        outcomes.append(future.result())
+                    except Exception as e:
+                        outcomes.append(e)
+        
+        failed = []
+        for indexes, outcome in zip(pending, outcomes):
+            if isinstance(outcome, Exception):
+                logging.error(f"Google Cloud Translation API 區塊翻譯錯誤（{len(indexes)} 個片段）: {outcome}")
+                failed.append(indexes)
+                continue
+            for i, translated in zip(indexes, outcome):
+                results[i] = translated
         
-        return translated_texts
+        pending = failed
+        if not pending:
+            break
+    
+    return results
+
+def translate_text_batch(texts: List[str], target_language: str, source_language: str = None, strict: bool = False) -> List[str]:
+    """
+    使用 Google Cloud Translation API 批次翻譯文字
+    
+    超過單次請求上限的列表會切成多個區塊並行送出，只有失敗的區塊使用 fallback。
+    
+    Args:
+        texts: 要翻譯的文字列表
+        target_language: 目標語言碼 (如 'fr', 'de', 'th')
+        source_language: 來源語言碼 (如 'en', 'zh')，可為 None 自動偵測
+        strict: 為 True 時失敗直接拋出例外，不使用 fallback（供需要寫入資料庫的呼叫端判斷）
+    
+    Returns:
+        翻譯後的文字列表
+    """
+    try:
+        translated_texts = translate_text_chunks(texts, target_language, source_language)
         
     except ImportError:
         # 如果沒有安裝 google-cloud-translate，使用 fallback
         logging.warning("Google Cloud Translation API 未安裝，使用 fallback 翻譯")
+        if strict:
+            raise
         return translate_text_batch_fallback(texts, target_language, source_language)
         
     except Exception as e:
         logging.error(f"Google Cloud Translation API 錯誤: {str(e)}")
+        if strict:
+            raise
         # 使用 fallback 翻譯
         return translate_text_batch_fallback(texts, target_language, source_language)
+    
+    failed = [i for i, translated in enumerate(translated_texts) if translated is None]
+    if failed:
+        if strict:
+            raise Exception(f"{len(failed)}/{len(texts)} 個片段翻譯失敗")
+        # 只有失敗的片段使用 fallback 翻譯
+        fallback = translate_text_batch_fallback([texts[i] for i in failed], target_language, source_language)
+        for i, translated in zip(failed, fallback):
+            translated_texts[i] = translated
+    
+    return translated_texts
 
 def translate_text_batch_fallback(texts: List[str], target_language: str, source_language: str = None) -> List[str]:
     """
@@ -228,16 +335,17 @@ class OrderRequest(BaseModel):
 VOICE_DIR = "/tmp/voices"
 os.makedirs(VOICE_DIR, exist_ok=True)
 
+# 相同文字、語音與語速的 TTS 結果只合成一次（快取在 VOICE_DIR/cache，不受 cleanup_old_voice_files 清理）
+from .tts_cache import TTSAudioCache, make_tts_cache_key
+from .audio_meta import get_audio_duration_ms, estimate_tts_duration_ms, remove_audio_meta
+tts_audio_cache = TTSAudioCache(os.path.join(VOICE_DIR, 'cache'))
+
 # Gemini API 設定（延遲初始化）
 def get_gemini_client():
-    """取得 Gemini 客戶端"""
+    """取得 Gemini 客戶端（行程內共用）"""
     try:
-        api_key = os.getenv('GEMINI_API_KEY')
-        if not api_key:
-            print("警告: GEMINI_API_KEY 環境變數未設定")
-            return None
-        from google import genai
-        return genai.Client(api_key=api_key)
+        from ..clients import get_client
+        return get_client('gemini')
     except Exception as e:
         print(f"Gemini API 初始化失敗: {e}")
         return None
@@ -257,6 +365,7 @@ def get_speech_config():
 def generate_cloud_tts_audio(text_to_speak, output_filename, language_code="zh-TW", voice_name="cmn-TW-Wavenet-A", speaking_rate=1.0):
     """
     使用 Google Cloud Text-to-Speech API 將文字轉換為音訊檔案。
+    相同的（文字、語音、語言、語速）只會合成一次，之後直接使用快取的 MP3。
     
     Args:
         text_to_speak (str): 要轉換為語音的文字
@@ -268,13 +377,37 @@ def generate_cloud_tts_audio(text_to_speak, output_filename, language_code="zh-T
     Returns:
         bool: 如果成功生成並儲存檔案則返回 True，否則返回 False
     """
+    cache_key = make_tts_cache_key(text_to_speak, voice_name, language_code, speaking_rate)
+    try:
+        return tts_audio_cache.get_or_create(
+            cache_key,
+            output_filename,
+            lambda: _synthesize_cloud_tts(text_to_speak, language_code, voice_name, speaking_rate),
+            estimated_duration_ms=estimate_tts_duration_ms(text_to_speak, speaking_rate)
+        )
+    except Exception as e:
+        print(f"❌ 發生未預期的錯誤：{e}")
+        return False
+
+def get_tts_cache_stats():
+    """取得 TTS 音訊快取統計"""
+    return tts_audio_cache.get_stats()
+
+def _synthesize_cloud_tts(text_to_speak, language_code, voice_name, speaking_rate):
+    """
+    呼叫 Cloud TTS 合成 MP3
+    
+    Returns:
+        bytes: MP3 內容；失敗時返回 None
+    """
     try:
         from google.cloud import texttospeech
         from google.api_core import exceptions
         
-        # 1. 實例化一個客戶端
+        # 1. 取得共用客戶端
         # 在 Cloud Run 或其他 GCP 環境中，這會自動使用服務帳號進行驗證
-        client = texttospeech.TextToSpeechClient()
+        from ..clients import get_client
+        client = get_client('tts')
         
         # 2. 設定輸入文字
         synthesis_input = texttospeech.SynthesisInput(text=text_to_speak)
@@ -300,19 +433,15 @@ def generate_cloud_tts_audio(text_to_speak, output_filename, language_code="zh-T
             audio_config=audio_config
         )
         
-        # 6. 將音訊內容寫入檔案
-        with open(output_filename, "wb") as out:
-            out.write(response.audio_content)
-        
-        print(f"✅ 成功！MP3 音訊檔案已儲存至 '{output_filename}'")
-        return True
+        print(f"✅ 成功！MP3 音訊已生成（{len(response.audio_content)} bytes）")
+        return response.audio_content
         
     except exceptions.GoogleAPICallError as e:
         print(f"❌ API 呼叫失敗：{e}")
-        return False
+        return None
     except Exception as e:
         print(f"❌ 發生未預期的錯誤：{e}")
-        return False
+        return None
 
 def cleanup_old_voice_files(max_age=3600):
     """刪除 60 分鐘以前的 MP3（延長清理時間）"""
@@ -332,6 +461,7 @@ def cleanup_old_voice_files(max_age=3600):
             if os.path.isfile(full) and now - os.path.getmtime(full) > max_age:
                 try:
                     os.remove(full)
+                    remove_audio_meta(full)
                     cleaned_count += 1
                     print(f"清理舊語音檔: {fn}")
                 except Exception as e:
@@ -343,99 +473,45 @@ def cleanup_old_voice_files(max_age=3600):
     except Exception as e:
         print(f"清理語音檔目錄失敗: {e}")
 
-def process_menu_with_gemini(image_path, target_language='en'):
+# 菜單 OCR 的整體期限（秒）
+MENU_OCR_TIMEOUT = 240
+
+def process_menu_with_gemini(image_path, target_language='en', preprocess=True):
     """
     使用 Gemini 2.5 Flash API 處理菜單圖片
     1. OCR 辨識菜單文字
     2. 結構化為菜單項目
     3. 翻譯為目標語言
+    
+    preprocess 為 True 時先縮小、轉正、灰階並重新壓縮照片，再上傳處理後的圖片；
+    False 時上傳原始檔（benchmark_ocr_preprocess.py 用來比較）。
+    長寬比過大的照片（菜單看板、長截圖）會切成重疊區塊並行辨識（OCR_TILING=off 可停用）。
     """
     try:
         # 檢查檔案大小
-        file_size = os.path.getsize(image_path)
-        max_size = 10 * 1024 * 1024  # 10MB
-        if file_size > max_size:
-            return {
-                'success': False,
-                'error': f'檔案太大 ({file_size / 1024 / 1024:.1f}MB)，請上傳較小的圖片'
-            }
-        
-        print(f"處理圖片: {image_path}, 大小: {file_size / 1024:.1f}KB")
-        
-        # 讀取圖片並轉換為 PIL.Image 格式
-        from PIL import Image
-        import io
-        
-        with open(image_path, 'rb') as img_file:
-            image_bytes = img_file.read()
-        
-        # 將 bytes 轉換為 PIL.Image
-        image = Image.open(io.BytesIO(image_bytes))
+        size_error = _check_menu_image_size(image_path)
+        if size_error:
+            return size_error
         
-        # 圖片壓縮優化（減少處理時間）
-        max_dimension = 1024  # 最大邊長
-        if max(image.size) > max_dimension:
-            # 等比例縮放
-            ratio = max_dimension / max(image.size)
-            new_size = tuple(int(dim * ratio) for dim in image.size)
-            image = image.resize(new_size, Image.Resampling.LANCZOS)
-            print(f"圖片已壓縮至: {image.size}")
+        image_bytes, mime_type, image, tiled_dimension = _load_menu_image(image_path, preprocess)
         
-        # 檢查圖片格式並確定 MIME 類型
-        import mimetypes
-        mime_type, _ = mimetypes.guess_type(image_path)
-        if not mime_type or not mime_type.startswith('image/'):
-            mime_type = 'image/jpeg'  # 預設為 JPEG
+        # 相同菜單的照片（重新壓縮、小幅裁切）直接使用快取結果，不呼叫 Gemini
+        from .ocr_cache import get_cached_ocr_result, store_ocr_result
+        cached_result, image_signature = get_cached_ocr_result(image, target_language)
+        if cached_result is not None:
+            print(f"OCR 快取命中（相似度 {cached_result['cache']['similarity']}），共 {len(cached_result.get('menu_items', []))} 個項目")
+            return cached_result
         
         print(f"圖片 MIME 類型: {mime_type}")
         print(f"圖片尺寸: {image.size}")
         
         # 建立 Gemini 提示詞（JSON Mode 優化版）
-        prompt = f"""
-你是一個餐廳菜單解析器。請分析這張菜單圖片並輸出**唯一**的 JSON，符合下列 schema：
-
-## 輸出格式：
-{{
-  "success": true,
-  "menu_items": [
-    {{
-      "original_name": "原始中文菜名",
-      "translated_name": "翻譯為{target_language}的菜名", 
-      "price": 數字,
-      "description": "描述或null",
-      "category": "分類或null"
-    }}
-  ],
-  "store_info": {{
-    "name": "店名或null",
-    "address": "地址或null",
-    "phone": "電話或null"
-  }},
-  "processing_notes": "備註或null"
-}}
-
-## 重要規則：
-1. **original_name 必須是圖片中的原始中文菜名**，不要翻譯
-2. **translated_name 必須是翻譯為 {target_language} 的菜名**
-3. 如果圖片中的菜名已經是 {target_language}，則 original_name 和 translated_name 可以相同
-4. 圖片中沒有的店家資訊請回 `null`，不要猜測
-5. 一律不要使用 ``` 或任何程式碼區塊語法
-6. 價格輸出數字，無法辨識時用 0
-7. **只輸出 JSON**，不要其他文字
-8. 若圖片模糊或無法辨識，將 success 設為 false
-9. 優先處理清晰可見的菜單項目
-10. **確保每個菜品都有原始中文名稱和翻譯名稱**
-"""
+        prompt = _build_menu_ocr_prompt(target_language)
         
         # 呼叫 Gemini 2.5 Flash API（添加超時控制）
-        import signal
-        
-        def timeout_handler(signum, frame):
-            raise TimeoutError("Gemini API 處理超時")
-        
-        # 設定 240 秒超時（與 Cloud Run 300秒保持安全邊距）
-        signal.signal(signal.SIGALRM, timeout_handler)
-        signal.alarm(240)
+        # 設定 240 秒期限（與 Cloud Run 300秒保持安全邊距）；由 gemini_gateway 控制，不依賴 SIGALRM，任何執行緒都適用
+        from ..gemini_gateway import set_deadline, reset_deadline
+        deadline_token = set_deadline(MENU_OCR_TIMEOUT)
         
         try:
             # 取得 Gemini 客戶端
@@ -447,43 +523,26 @@ def process_menu_with_gemini(image_path, target_language='en'):
                     'processing_notes': '請檢查 GEMINI_API_KEY 環境變數'
                 }
             
-                    # 使用正確的 Gemini 模型名稱
-            response = gemini_client.models.generate_content(
-                model="models/gemini-2.5-flash-lite",
-                contents=[
-                    {
-                        "parts": [
-                            {"text": prompt},
-                            {
-                                "inline_data": {
-                                    "mime_type": mime_type,
-                                    "data": image_bytes
-                                }
-                            }
-                        ]
-                    }
-                ],
-                config={
-                    "thinking_config": {
-                        "thinking_budget": 512
-                    }
-                }
-            )
-            
-            # 取消超時
-            signal.alarm(0)
+            if tiled_dimension:
+                # 分塊並行辨識，合併重疊區域的重複菜品
+                result = _ocr_menu_tiles(image, prompt)
+                response = None
+            else:
+                result = None
+                response = _generate_menu_ocr(prompt, image_bytes, mime_type)
             
             # 解析回應
-            if response and hasattr(response, 'text'):
+            if result is not None or (response and hasattr(response, 'text')):
                 try:
-                    # 使用新的 JSON 解析函數
-                    result_text = response.text.strip()
-                    print(f"Gemini 回應長度: {len(result_text)} 字符")
-                    print(f"Gemini 回應前200字符: {result_text[:200]}...")
-                    
-                    # 使用強健的 JSON 解析函數
-                    result = parse_gemini_json_response(result_text)
-                    print("JSON 解析成功")
+                    if result is None:
+                        # 使用新的 JSON 解析函數
+                        result_text = response.text.strip()
+                        print(f"Gemini 回應長度: {len(result_text)} 字符")
+                        print(f"Gemini 回應前200字符: {result_text[:200]}...")
+                        
+                        # 使用強健的 JSON 解析函數
+                        result = parse_gemini_json_response(result_text)
+                        print("JSON 解析成功")
                     
                     # 驗證結果格式
                     if not isinstance(result, dict):
@@ -493,39 +552,13 @@ def process_menu_with_gemini(image_path, target_language='en'):
                             'processing_notes': '回應不是有效的 JSON 物件'
                         }
                     
-                    # 檢查必要欄位
-                    if 'success' not in result:
-                        result['success'] = True
-                    
-                    if 'menu_items' not in result:
-                        result['menu_items'] = []
-                    
-                    # 主要成功條件：以 menu_items 為準，而不是店家資訊
-                    if not result.get('menu_items') or len(result['menu_items']) == 0:
-                        result['success'] = False
-                        result['error'] = '無法從圖片中辨識菜單項目'
-                        result['processing_notes'] = '圖片可能模糊或不是菜單'
+                    # 檢查必要欄位；主要成功條件以 menu_items 為準
+                    result = _finalize_menu_ocr_result(result)
+                    if not result['menu_items']:
                         return result
                     
-                    if 'store_info' not in result:
-                        result['store_info'] = {
-                            'name': None,
-                            'address': None,
-                            'phone': None
-                        }
-                    
-                    # 保底填值：確保店家資訊欄位不會是 None，而是明確的 null 值
-                    if result.get('store_info'):
-                        store_info = result['store_info']
-                        if store_info.get('name') is None:
-                            store_info['name'] = None
-                            store_info['note'] = 'store_name_not_found_in_image'
-                        if store_info.get('address') is None:
-                            store_info['address'] = None
-                        if store_info.get('phone') is None:
-                            store_info['phone'] = None
-                    
                     print(f"成功處理菜單，共 {len(result.get('menu_items', []))} 個項目")
+                    store_ocr_result(image_signature, target_language, result)
                     return result
                         
                 except json.JSONDecodeError as e:
@@ -557,8 +590,7 @@ def process_menu_with_gemini(image_path, target_language='en'):
                 'processing_notes': '請稍後再試或聯繫技術支援'
             }
         finally:
-            # 確保取消超時
-            signal.alarm(0)
+            reset_deadline(deadline_token)
             
     except Exception as e:
         print(f"菜單處理失敗: {e}")
@@ -568,102 +600,286 @@ def process_menu_with_gemini(image_path, target_language='en'):
             'processing_notes': '請檢查圖片格式和大小'
         }
 
-def parse_gemini_json_response(response_text):
+def stream_menu_with_gemini(image_path, target_language='en'):
     """
-    解析 Gemini API 的 JSON 回應，包含多種修復策略
+    以串流方式辨識菜單，每個菜品在 Gemini 輸出完該物件時就產生
+    
+    依序產生 ('item', 菜品 dict)，最後產生一次 ('result', 結果 dict)，
+    結果格式與 process_menu_with_gemini 相同，menu_items 即為已產生的菜品。
+    快取命中或需要分塊的照片沒有串流可用，取得完整結果後依序產生其中的菜品。
+    串流中途逾時或失敗時，已產生的菜品仍保留在結果中（不寫入快取）。
     """
-    import re
-    import ast
+    import time
+    from .ocr_stream import MenuItemStreamParser
+    from .ocr_cache import get_cached_ocr_result, store_ocr_result
+    from ..gemini_gateway import set_deadline, reset_deadline, generate_content_stream
     
     try:
-        # 清理回應文本
-        result_text = response_text.strip()
-        
-        # 如果回應包含 JSON，嘗試解析
-        if '{' in result_text and '}' in result_text:
-            # 提取 JSON 部分
-            start = result_text.find('{')
-            end = result_text.rfind('}') + 1
-            json_text = result_text[start:end]
+        size_error = _check_menu_image_size(image_path)
+        if size_error:
+            yield 'result', size_error
+            return
+        image_bytes, mime_type, image, tiled_dimension = _load_menu_image(image_path)
+    except Exception as e:
+        print(f"菜單處理失敗: {e}")
+        yield 'result', {
+            'success': False,
+            'error': f'菜單處理失敗: {str(e)}',
+            'processing_notes': '請檢查圖片格式和大小'
+        }
+        return
+    
+    cached_result, image_signature = get_cached_ocr_result(image, target_language)
+    if cached_result is not None:
+        print(f"OCR 快取命中（相似度 {cached_result['cache']['similarity']}），共 {len(cached_result.get('menu_items', []))} 個項目")
+        for item in cached_result.get('menu_items', []):
+            yield 'item', item
+        yield 'result', cached_result
+        return
+    
+    prompt = _build_menu_ocr_prompt(target_language)
+    deadline_token = set_deadline(MENU_OCR_TIMEOUT)
+    items = []
+    try:
+        if tiled_dimension:
+            result = _finalize_menu_ocr_result(_ocr_menu_tiles(image, prompt))
+            for item in result['menu_items']:
+                yield 'item', item
+        else:
+            parser = MenuItemStreamParser()
+            started = time.time()
+            for chunk in generate_content_stream(
+                operation='menu_ocr_stream',
+                timeout=MENU_OCR_TIMEOUT,
+                contents=_menu_ocr_contents(prompt, image_bytes, mime_type),
+                config=MENU_OCR_CONFIG
+            ):
+                for item in parser.feed(getattr(chunk, 'text', None) or ''):
+                    if not items:
+                        print(f"串流 OCR 第一個菜品: {(time.time() - started) * 1000:.0f}ms")
+                    items.append(item)
+                    yield 'item', item
             
-            # 策略1: 直接解析
+            # 店家資訊在 menu_items 之後，需要完整回應才能取得（解析器已掃描過全部文字，不再重新解析）
             try:
-                return json.loads(json_text)
-            except json.JSONDecodeError as e:
-                print(f"直接解析失敗: {e}")
-                
-                # 策略2: 修復常見問題
-                try:
-                    # 移除尾隨逗號
-                    json_text = re.sub(r',(\s*[}\]])', r'\1', json_text)
-                    # 修復引號問題
-                    json_text = re.sub(r'([^\\])"([^"]*?)([^\\])"', r'\1"\2\3"', json_text)
-                    # 移除可能的控制字符
-                    json_text = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', json_text)
-                    # 修復多餘的逗號
-                    json_text = re.sub(r',\s*}', '}', json_text)
-                    json_text = re.sub(r',\s*]', ']', json_text)
-                    
-                    return json.loads(json_text)
-                except json.JSONDecodeError as e2:
-                    print(f"修復後解析失敗: {e2}")
-                    
-                    # 策略3: 嘗試提取 menu_items 部分
-                    try:
-                        # 尋找 menu_items 陣列
-                        menu_items_match = re.search(r'"menu_items"\s*:\s*\[(.*?)\]', json_text, re.DOTALL)
-                        if menu_items_match:
-                            menu_items_content = menu_items_match.group(1)
-                            # 嘗試解析每個菜單項目
-                            items = []
-                            # 簡單的正則表達式來提取項目
-                            item_matches = re.findall(r'\{[^}]*\}', menu_items_content)
-                            for item_match in item_matches:
-                                try:
-                                    # 清理項目文本
-                                    clean_item = re.sub(r',\s*}', '}', item_match)
-                                    clean_item = re.sub(r',\s*]', ']', clean_item)
-                                    item_data = json.loads(clean_item)
-                                    items.append(item_data)
-                                except:
-                                    continue
-                            
-                            if items:
-                                return {
-                                    'success': True,
-                                    'menu_items': items,
-                                    'store_info': {'name': 'Unknown Store'},
-                                    'processing_notes': 'JSON 解析修復成功'
-                                }
-                    except Exception as e3:
-                        print(f"提取 menu_items 失敗: {e3}")
-                    
-                    # 策略4: 使用 ast.literal_eval
-                    try:
-                        return ast.literal_eval(json_text)
-                    except:
-                        print("ast.literal_eval 也失敗")
-                        
-                        # 策略5: 嘗試提取部分有效的 JSON
-                        try:
-                            # 尋找最長的連續 JSON 結構
-                            json_pattern = r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}'
-                            matches = re.findall(json_pattern, json_text)
-                            if matches:
-                                longest_match = max(matches, key=len)
-                                return json.loads(longest_match)
-                        except:
-                            pass
-                        
-                        # 如果所有策略都失敗，拋出原始錯誤
-                        raise e
-        
-        # 如果沒有找到 JSON 結構
-        raise ValueError("回應中沒有找到有效的 JSON 結構")
-        
+                result = parser.result()
+            except Exception as e:
+                print(f"串流回應完整解析失敗，使用已解析的 {len(items)} 個菜品: {e}")
+                result = {}
+            if not isinstance(result, dict):
+                result = {}
+            if items:
+                # 以已送出的菜品為準，前端收到的內容與暫存結果一致
+                result['menu_items'] = items
+            else:
+                for item in result.get('menu_items') or []:
+                    yield 'item', item
+            result = _finalize_menu_ocr_result(result)
+            print(f"串流 OCR 完成，共 {len(result['menu_items'])} 個項目（{(time.time() - started) * 1000:.0f}ms）")
+        
+        if result['menu_items']:
+            store_ocr_result(image_signature, target_language, result)
+        yield 'result', result
+    except TimeoutError:
+        print(f"串流 OCR 超時，已辨識 {len(items)} 個項目")
+        yield 'result', _partial_stream_result(items, '處理超時', '圖片處理時間過長，請嘗試上傳較小的圖片')
+    except Exception as e:
+        print(f"串流 OCR 失敗: {e}")
+        yield 'result', _partial_stream_result(items, f'Gemini API 處理失敗: {str(e)}', '請稍後再試或聯繫技術支援')
+    finally:
+        try:
+            reset_deadline(deadline_token)
+        except ValueError:
+            # 產生器在其他 context 被關閉（例如客戶端斷線後回收）
+            pass
+
+def _partial_stream_result(items, error, notes):
+    """串流中斷時的結果：已產生的菜品仍可點餐（標記 partial），沒有任何菜品時視為失敗"""
+    if not items:
+        return {'success': False, 'error': error, 'processing_notes': notes}
+    result = _finalize_menu_ocr_result({'success': True, 'menu_items': items})
+    result['partial'] = True
+    result['processing_notes'] = f"{error}：{notes}"
+    return result
+
+def _check_menu_image_size(image_path, max_size=10 * 1024 * 1024):
+    """檔案超過上限（預設 10MB）時返回錯誤 dict，否則返回 None"""
+    file_size = os.path.getsize(image_path)
+    if file_size > max_size:
+        return {
+            'success': False,
+            'error': f'檔案太大 ({file_size / 1024 / 1024:.1f}MB)，請上傳較小的圖片'
+        }
+    print(f"處理圖片: {image_path}, 大小: {file_size / 1024:.1f}KB")
+    return None
+
+def _load_menu_image(image_path, preprocess=True):
+    """
+    讀取菜單照片，preprocess 為 True 時先前處理
+
+    Returns:
+        tuple: (上傳給 Gemini 的 bytes, MIME 類型, PIL.Image, 分塊時的最大邊長；不需分塊為 None)
+    """
+    with open(image_path, 'rb') as img_file:
+        image_bytes = img_file.read()
+    
+    tiled_dimension = None
+    if preprocess:
+        # 前處理後的位元組就是實際上傳給 Gemini 的內容
+        from .image_preprocess import preprocess_menu_image, OCR_IMAGE_MAX_DIMENSION
+        from .ocr_tiling import tiled_max_dimension
+        # 需要分塊時只把短邊縮到上限，保留長邊的解析度
+        tiled_dimension = tiled_max_dimension(image_bytes, OCR_IMAGE_MAX_DIMENSION)
+        image_bytes, mime_type, image, preprocess_stats = preprocess_menu_image(
+            image_bytes, max_dimension=tiled_dimension or OCR_IMAGE_MAX_DIMENSION
+        )
+        print(f"圖片已前處理: {preprocess_stats['original_bytes'] / 1024:.1f}KB → {preprocess_stats['processed_bytes'] / 1024:.1f}KB ({preprocess_stats['elapsed_ms']}ms)")
+    else:
+        from PIL import Image
+        import io
+        import mimetypes
+        image = Image.open(io.BytesIO(image_bytes))
+        mime_type, _ = mimetypes.guess_type(image_path)
+        if not mime_type or not mime_type.startswith('image/'):
+            mime_type = 'image/jpeg'  # 預設為 JPEG
+    return image_bytes, mime_type, image, tiled_dimension
+
+def _build_menu_ocr_prompt(target_language):
+    """建立菜單 OCR 的 Gemini 提示詞（JSON Mode 優化版）"""
+    prompt = f"""
+你是一個餐廳菜單解析器。請分析這張菜單圖片並輸出**唯一**的 JSON，符合下列 schema：
+
+## 輸出格式：
+{{
+  "success": true,
+  "menu_items": [
+    {{
+      "original_name": "原始中文菜名",
+      "translated_name": "翻譯為{target_language}的菜名", 
+      "price": 數字,
+      "description": "描述或null",
+      "category": "分類或null"
+    }}
+  ],
+  "store_info": {{
+    "name": "店名或null",
+    "address": "地址或null",
+    "phone": "電話或null"
+  }},
+  "processing_notes": "備註或null"
+}}
+
+## 重要規則：
+1. **original_name 必須是圖片中的原始中文菜名**，不要翻譯
+2. **translated_name 必須是翻譯為 {target_language} 的菜名**
+3. 如果圖片中的菜名已經是 {target_language}，則 original_name 和 translated_name 可以相同
+4. 圖片中沒有的店家資訊請回 `null`，不要猜測
+5. 一律不要使用 ``` 或任何程式碼區塊語法
+6. 價格輸出數字，無法辨識時用 0
+7. **只輸出 JSON**，不要其他文字
+8. 若圖片模糊或無法辨識，將 success 設為 false
+9. 優先處理清晰可見的菜單項目
+10. **確保每個菜品都有原始中文名稱和翻譯名稱**
+"""
+    return prompt
+
+def _finalize_menu_ocr_result(result):
+    """補齊 OCR 結果的必要欄位；沒有辨識出菜品時標記為失敗"""
+    if 'success' not in result:
+        result['success'] = True
+    
+    if 'menu_items' not in result:
+        result['menu_items'] = []
+    
+    # 主要成功條件：以 menu_items 為準，而不是店家資訊
+    if not result.get('menu_items') or len(result['menu_items']) == 0:
+        result['success'] = False
+        result['error'] = '無法從圖片中辨識菜單項目'
+        result['processing_notes'] = '圖片可能模糊或不是菜單'
+        return result
+    
+    if 'store_info' not in result:
+        result['store_info'] = {
+            'name': None,
+            'address': None,
+            'phone': None
+        }
+    
+    # 保底填值：確保店家資訊欄位不會是 None，而是明確的 null 值
+    if result.get('store_info'):
+        store_info = result['store_info']
+        if store_info.get('name') is None:
+            store_info['name'] = None
+            store_info['note'] = 'store_name_not_found_in_image'
+        if store_info.get('address') is None:
+            store_info['address'] = None
+        if store_info.get('phone') is None:
+            store_info['phone'] = None
+    return result
+
+# 菜單 OCR 的 Gemini 設定（限制思考預算以縮短回應時間）
+MENU_OCR_CONFIG = {
+    "thinking_config": {
+        "thinking_budget": 512
+    }
+}
+
+def _menu_ocr_contents(prompt, image_bytes, mime_type):
+    return [
+        {
+            "parts": [
+                {"text": prompt},
+                {
+                    "inline_data": {
+                        "mime_type": mime_type,
+                        "data": image_bytes
+                    }
+                }
+            ]
+        }
+    ]
+
+def _generate_menu_ocr(prompt, image_bytes, mime_type, operation='menu_ocr'):
+    """透過 gemini_gateway 送出一張菜單圖片（或分塊），回傳原始回應"""
+    from ..gemini_gateway import generate_content
+    return generate_content(
+        operation=operation,
+        timeout=MENU_OCR_TIMEOUT,
+        contents=_menu_ocr_contents(prompt, image_bytes, mime_type),
+        config=MENU_OCR_CONFIG
+    )
+
+def _ocr_menu_tiles(image, prompt):
+    """分塊並行辨識，等待時間以目前期限的剩餘秒數為上限"""
+    from .ocr_tiling import process_menu_tiles
+    from ..gemini_gateway import remaining_seconds
+    
+    def ocr_tile(tile_bytes):
+        tile_response = _generate_menu_ocr(prompt, tile_bytes, 'image/jpeg', operation='menu_ocr_tile')
+        return parse_gemini_json_response(tile_response.text.strip())
+    
+    result = process_menu_tiles(image, ocr_tile, timeout=remaining_seconds())
+    print(f"分塊辨識完成: {result['tiles']['succeeded']}/{result['tiles']['count']} 塊成功")
+    return result
+
+def parse_gemini_json_response(response_text, schema=None):
+    """
+    解析 Gemini API 的 JSON 回應
+    
+    單次掃描的容錯解析（見 app/llm_json.py）：容忍程式碼區塊與前後說明文字、尾隨逗號、
+    缺少逗號、未跳脫的引號與截斷，並依 schema 驗證（預設為菜單 OCR 格式，價格轉為數字、
+    沒有菜名的項目略過）。
+    
+    Raises:
+        json.JSONDecodeError: 找不到 JSON 或不符合 schema（LLMJSONError）
+    """
+    from ..llm_json import parse_llm_json, MENU_OCR_SCHEMA
+    
+    try:
+        return parse_llm_json(response_text, MENU_OCR_SCHEMA if schema is None else schema)
     except Exception as e:
         print(f"JSON 解析完全失敗: {e}")
-        raise e
+        raise
 
 def normalize_order_text_for_tts(text):
     """
@@ -979,10 +1195,6 @@ def translate_text(text, target_language='en'):
     try:
         from google import genai
         
-        # 設定 Gemini API
-        print(f"🎯 設定 Gemini API...")
-        genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
-        
         # 建立翻譯提示詞
         prompt = f"""
         請將以下文字翻譯為 {target_language} 語言：
@@ -994,8 +1206,11 @@ def translate_text(text, target_language='en'):
         print(f"🎯 翻譯提示詞: {prompt}")
         
         print(f"🎯 調用 Gemini API...")
-        response = get_gemini_client().models.generate_content(
-            model="models/gemini-2.5-flash-lite",
+        from ..gemini_gateway import generate_content
+        response = generate_content(
+            operation='translate_text',
+            timeout=20,
+            hedge=True,
             contents=[prompt],
             config={
                 "thinking_config": genai.types.ThinkingConfig(thinking_budget=512)
@@ -1179,6 +1394,7 @@ def translate_menu_items_with_db_fallback(menu_items, target_language):
 def translate_store_info_with_db_fallback(store, target_language):
     """翻譯店家資訊，優先使用資料庫翻譯，失敗時使用 AI 翻譯"""
     from ..models import StoreTranslation
+    from .translation_service import normalize_lang, translate_text as translate_text_cached
     
     print(f"🔍 查詢店家翻譯: store_id={store.store_id}, store_name='{store.store_name}', target_language={target_language}")
     
@@ -1214,7 +1430,7 @@ def translate_store_info_with_db_fallback(store, target_language):
         # 使用 AI 翻譯
         try:
             print(f"🔧 嘗試AI翻譯店家名稱: '{store.store_name}'")
-            translated_name = translate_text_with_fallback(store.store_name, target_language)
+            translated_name = translate_text_cached(store.store_name, normalize_lang(target_language))
             translation_source = 'ai'
             print(f"✅ AI翻譯結果: '{translated_name}'")
         except Exception as e:
@@ -1227,7 +1443,7 @@ def translate_store_info_with_db_fallback(store, target_language):
         'store_id': store.store_id,
         'original_name': store.store_name,
         'translated_name': translated_name,
-        'translated_reviews': translate_text_with_fallback(store.review_summary, target_language) if store.review_summary else None,
+        'translated_reviews': translate_text_cached(store.review_summary, normalize_lang(target_language)) if store.review_summary else None,
         'translation_source': translation_source
     }
 
@@ -1689,7 +1905,7 @@ def send_complete_order_notification(order_id, store_name=None):
                             user.line_user_id,
                             AudioSendMessage(
                                 original_content_url=audio_url,
-                                duration=30000  # 預設30秒
+                                duration=get_audio_duration_ms(voice_result)
                             )
                         )
                         print(f"語音檔已發送到 LINE: {audio_url}")
@@ -1829,7 +2045,7 @@ def send_temp_order_notification(temp_order, user_id, user_language):
                     user_id,
                     AudioSendMessage(
                         original_content_url=audio_url,
-                        duration=30000
+                        duration=get_audio_duration_ms(voice_path)
                     )
                 )
         
@@ -1849,48 +2065,55 @@ def send_temp_order_notification(temp_order, user_id, user_language):
 
 # 臨時訂單語速控制卡片相關函數已移除（節省成本）
 
-def get_nearby_stores_with_translations(latitude, longitude, user_language='zh', radius_km=10):
+def get_nearby_stores_with_translations(latitude, longitude, user_language='zh', radius_km=10, limit=20):
     """
     取得附近店家並包含翻譯資訊
+
+    候選店家由空間索引（store_geo.py）取得，只載入半徑內最近的 limit 家店與其翻譯。
     """
+    from ..models import Store, StoreTranslation
+    from ..db_engine import read_query
+    from .store_geo import find_nearby_store_ids
+
     try:
-        # 取得店家翻譯
-        store_translations = get_store_translation_from_db(None, user_language)
-        
-        # 計算距離並篩選
-        stores = Store.query.all()
+        nearby = find_nearby_store_ids(latitude, longitude, radius_km, limit)
+        if not nearby:
+            return []
+
+        store_ids = [store_id for store_id, _ in nearby]
+        stores = {
+            store.store_id: store
+            for store in read_query(Store).filter(Store.store_id.in_(store_ids)).all()
+        }
+        translations = {
+            translation.store_id: translation
+            for translation in read_query(StoreTranslation).filter(
+                StoreTranslation.store_id.in_(store_ids),
+                StoreTranslation.language_code == user_language
+            ).all()
+        }
+
         nearby_stores = []
-        
-        for store in stores:
-            if store.gps_lat and store.gps_lng:
-                distance = calculate_distance(
-                    latitude, longitude, 
-                    store.gps_lat, store.gps_lng
-                )
-                
-                if distance <= radius_km:
-                    # 取得翻譯資訊
-                    translation = store_translations.get(store.store_id, {})
-                    
-                    store_data = {
-                        'store_id': store.store_id,
-                        'store_name': store.store_name,
-                        'distance': round(distance, 2),
-                        'partner_level': store.partner_level,
-                        'description': translation.get('description_trans', ''),
-                        'reviews': translation.get('reviews', ''),
-                        'main_photo_url': store.main_photo_url,
-                        'top_dishes': [
-                            store.top_dish_1, store.top_dish_2, 
-                            store.top_dish_3, store.top_dish_4, store.top_dish_5
-                        ]
-                    }
-                    nearby_stores.append(store_data)
-        
-        # 按距離排序
-        nearby_stores.sort(key=lambda x: x['distance'])
+        for store_id, distance in nearby:
+            store = stores.get(store_id)
+            if store is None:
+                continue
+            translation = translations.get(store_id)
+            nearby_stores.append({
+                'store_id': store.store_id,
+                'store_name': store.store_name,
+                'distance': round(distance, 2),
+                'partner_level': store.partner_level,
+                'description': (translation.description if translation else None) or '',
+                'reviews': (translation.translated_summary if translation else None) or '',
+                'main_photo_url': store.main_photo_url,
+                'top_dishes': [
+                    store.top_dish_1, store.top_dish_2,
+                    store.top_dish_3, store.top_dish_4, store.top_dish_5
+                ]
+            })
         return nearby_stores
-        
+
     except Exception as e:
         print(f"取得附近店家失敗：{e}")
         return []
@@ -2335,15 +2558,9 @@ def send_order_to_line_bot(user_id, order_data):
             audio_url = URLConfig.get_voice_url(fname)
             print(f"[Webhook] Reply with voice URL: {audio_url}")
             
-            # 計算音訊檔案的實際長度（毫秒）
-            duration_ms = 30000  # 預設30秒
-            try:
-                from pydub import AudioSegment
-                audio = AudioSegment.from_file(voice_url)
-                duration_ms = len(audio)  # pydub 回傳的是毫秒
-                print(f"[Webhook] 計算的音訊長度: {duration_ms} ms")
-            except Exception as e:
-                print(f"[Webhook] 無法計算音訊長度，使用預設值: {e}")
+            # 由 MP3 影格標頭取得音訊長度（毫秒）
+            duration_ms = get_audio_duration_ms(voice_url)
+            print(f"[Webhook] 音訊長度: {duration_ms} ms")
             
             messages.append({
                 "type": "audio",
@@ -2444,7 +2661,7 @@ def send_voice_with_rate(user_id, order_id, rate=1.0):
                     user_id,
                     AudioSendMessage(
                         original_content_url=audio_url,
-                        duration=30000
+                        duration=get_audio_duration_ms(voice_path)
                     )
                 )
                 print(f"✅ 成功發送語速語音，使用者: {user_id}, 語速: {rate}")
@@ -2637,10 +2854,7 @@ async def synthesize_azure_tts(text: str) -> tuple[str, int]:
         )
         
         if success and os.path.exists(voice_path) and os.path.getsize(voice_path) > 0:
-            # 估算持續時間（Cloud TTS 沒有提供持續時間，我們根據文字長度估算）
-            # 假設每個中文字符約 0.5 秒
-            estimated_duration_ms = len(text) * 500
-            return voice_path, estimated_duration_ms
+            return voice_path, get_audio_duration_ms(voice_path, default=estimate_tts_duration_ms(text))
         else:
             print(f"語音生成失敗: 檔案不存在或為空")
             return None, 0
@@ -2825,7 +3039,7 @@ def send_complete_order_notification_optimized(order_id):
                             user.line_user_id,
                             AudioSendMessage(
                                 original_content_url=audio_url,
-                                duration=30000
+                                duration=get_audio_duration_ms(voice_result)
                             )
                         )
                         print(f"✅ 語音檔已發送到 LINE: {audio_url}")
@@ -2977,9 +3191,9 @@ def get_language_label(text: str) -> str:
         return "摘要"
 
 def estimate_duration_ms(audio_url: str) -> int:
-    """估算音訊時長（毫秒）"""
-    # 根據檔案大小和內容估算，這裡使用預設值
-    return 30000  # 30秒
+    """取得音訊時長（毫秒）：語音檔由本服務提供，依 URL 檔名讀取 VOICE_DIR 中的檔案"""
+    fname = os.path.basename(audio_url.split('?', 1)[0])
+    return get_audio_duration_ms(os.path.join(VOICE_DIR, fname))
 
 def send_order_to_line_bot_fixed(user_id, order_data):
     """
@@ -3447,6 +3661,64 @@ def create_order_summary(order_id, user_language='zh'):
         "translated": translated_summary
     }
 
+# =============================================================================
+# 訂單記錄查詢
+# 店家與訂單項目（含菜品）以預先載入取得，每頁固定 2 次查詢；
+# 以 (order_time, order_id) 做 keyset 分頁，避免 OFFSET 在訂單變多時越查越慢
+# =============================================================================
+
+ORDER_HISTORY_MAX_LIMIT = 100
+
+def encode_order_cursor(order):
+    """訂單記錄分頁游標：<order_time ISO 格式>,<order_id>"""
+    return f"{order.order_time.isoformat()},{order.order_id}"
+
+def decode_order_cursor(cursor):
+    """
+    解析訂單記錄分頁游標
+
+    Raises:
+        ValueError: 游標格式錯誤
+    """
+    order_time, _, order_id = (cursor or '').rpartition(',')
+    if not order_time:
+        raise ValueError(f"無效的分頁游標: {cursor}")
+    return datetime.datetime.fromisoformat(order_time), int(order_id)
+
+def get_order_history_page(user_id, limit=20, before=None):
+    """
+    取得使用者的訂單記錄（依下單時間由新到舊）
+
+    Args:
+        before: 上一頁最後一筆的游標（encode_order_cursor），None 表示第一頁
+
+    Returns:
+        tuple: (訂單 list，已載入 store 與 items.menu_item, 下一頁游標或 None)
+
+    Raises:
+        ValueError: 游標格式錯誤
+    """
+    from sqlalchemy import and_, or_
+    from sqlalchemy.orm import joinedload, selectinload
+    from ..models import Order, OrderItem
+
+    limit = max(1, min(int(limit), ORDER_HISTORY_MAX_LIMIT))
+    query = Order.query.filter(Order.user_id == user_id).options(
+        joinedload(Order.store),
+        selectinload(Order.items).joinedload(OrderItem.menu_item)
+    )
+    if before:
+        before_time, before_id = decode_order_cursor(before)
+        query = query.filter(or_(
+            Order.order_time < before_time,
+            and_(Order.order_time == before_time, Order.order_id < before_id)
+        ))
+
+    # 多取一筆判斷是否還有下一頁
+    orders = query.order_by(Order.order_time.desc(), Order.order_id.desc()).limit(limit + 1).all()
+    next_cursor = encode_order_cursor(orders[limit - 1]) if len(orders) > limit else None
+    return orders[:limit], next_cursor
+
 def save_ocr_menu_and_summary_to_database(order_id, ocr_items, chinese_summary, user_language_summary, user_language, total_amount, user_id, store_id=None, store_name=None, existing_ocr_menu_id=None):
     """
     將 OCR 菜單和訂單摘要儲存到 Cloud MySQL 資料庫
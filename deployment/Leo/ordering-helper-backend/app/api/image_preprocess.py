@@ -0,0 +1,77 @@
+# =============================================================================
+# 檔案名稱：app/api/image_preprocess.py
+# 功能描述：菜單照片上傳 Gemini 前的前處理
+# 主要職責：
+# - JPEG 以 draft 模式在解碼時直接縮小（DCT 縮放），避免先解碼整張大圖
+# - 依 EXIF 轉正、縮到最大邊長、轉灰階並正規化對比
+# - 以調整過的品質重新壓縮為 JPEG，實際送給 Gemini 的就是處理後的位元組
+# =============================================================================
+
+import io
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+OCR_IMAGE_MAX_DIMENSION = int(os.getenv('OCR_IMAGE_MAX_DIMENSION', '1600'))
+OCR_IMAGE_JPEG_QUALITY = int(os.getenv('OCR_IMAGE_JPEG_QUALITY', '82'))
+OCR_IMAGE_GRAYSCALE = os.getenv('OCR_IMAGE_GRAYSCALE', 'true').lower() == 'true'
+# 自動對比時兩端各忽略的像素百分比（去除反光與陰影的極端值）
+AUTOCONTRAST_CUTOFF = 1
+
+def preprocess_menu_image(image_bytes, max_dimension=OCR_IMAGE_MAX_DIMENSION, quality=OCR_IMAGE_JPEG_QUALITY,
+                          grayscale=OCR_IMAGE_GRAYSCALE):
+    """
+    前處理菜單照片
+
+    Args:
+        image_bytes (bytes): 使用者上傳的原始圖片
+        max_dimension (int): 輸出最大邊長
+        quality (int): JPEG 品質
+        grayscale (bool): 是否轉為灰階（菜單文字辨識不需要色彩，檔案約小三成）
+
+    Returns:
+        tuple: (處理後 bytes, MIME 類型, PIL.Image, 統計 dict)
+    """
+    from PIL import Image, ImageOps
+
+    started = time.perf_counter()
+    image = Image.open(io.BytesIO(image_bytes))
+    original_size = image.size
+    original_format = image.format
+
+    # JPEG draft：解碼時直接以 1/2、1/4、1/8 縮放，只保留不小於目標尺寸的最小比例
+    if image.format == 'JPEG':
+        scale = max_dimension / max(original_size)
+        if scale < 1:
+            image.draft('L' if grayscale else 'RGB', (int(original_size[0] * scale), int(original_size[1] * scale)))
+
+    image = ImageOps.exif_transpose(image)
+
+    if grayscale:
+        image = ImageOps.autocontrast(image.convert('L'), cutoff=AUTOCONTRAST_CUTOFF)
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    if max(image.size) > max_dimension:
+        ratio = max_dimension / max(image.size)
+        image = image.resize(tuple(max(1, int(dim * ratio)) for dim in image.size), Image.Resampling.LANCZOS)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    processed_bytes = buffer.getvalue()
+
+    stats = {
+        'original_bytes': len(image_bytes),
+        'processed_bytes': len(processed_bytes),
+        'original_size': list(original_size),
+        'processed_size': list(image.size),
+        'original_format': original_format,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+    logger.info(
+        f"菜單照片前處理: {original_size} {len(image_bytes) / 1024:.0f}KB -> "
+        f"{image.size} {len(processed_bytes) / 1024:.0f}KB ({stats['elapsed_ms']}ms)"
+    )
+    return processed_bytes, 'image/jpeg', image, stats
@@ -0,0 +1,297 @@
+# =============================================================================
+# 檔案名稱：app/api/ocr_cache.py
+# 功能描述：以感知雜湊（perceptual hash）為鍵的菜單 OCR 結果快取
+# 主要職責：
+# - 將正規化後的菜單照片轉為 256 位元的差異雜湊（dHash）與 64x64 灰階縮圖，對 JPEG 重新壓縮、縮放與小幅裁切不敏感
+# - 依（雜湊, 目標語言）保存解析後的菜單 JSON（ocr_result_cache 表，跨實例共用，有 TTL）
+# - 先以漢明距離篩選候選，再將縮圖切成區塊逐塊比對（每塊容許小幅位移），最差的區塊也超過門檻才直接回傳快取結果，不呼叫 Gemini
+#   （同版型的不同菜單整體很像，差異只在部分品項或價格，整張比對無法區分）
+# - 記錄命中率與比對耗時
+# =============================================================================
+
+import os
+import json
+import time
+import logging
+import datetime
+import threading
+
+import numpy as np
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+
+from ..models import db, OCRResultCacheEntry
+
+logger = logging.getLogger(__name__)
+
+OCR_CACHE_ENABLED = os.getenv('OCR_CACHE_ENABLED', 'true').lower() == 'true'
+OCR_CACHE_TTL = int(os.getenv('OCR_CACHE_TTL', str(7 * 24 * 3600)))
+# 雜湊篩選門檻（1 - 漢明距離 / 位元數）；同版型的不同菜單雜湊也可能相近，因此只用來挑候選
+OCR_CACHE_HASH_SIMILARITY = float(os.getenv('OCR_CACHE_HASH_SIMILARITY', '0.75'))
+# 命中門檻：縮圖各區塊正規化相關係數的最小值（-1~1），越高越嚴格
+OCR_CACHE_SIMILARITY = float(os.getenv('OCR_CACHE_SIMILARITY', '0.45'))
+# 每次查詢最多以縮圖確認的候選數
+OCR_CACHE_MAX_CANDIDATES = 5
+OCR_CACHE_MAX_ENTRIES = int(os.getenv('OCR_CACHE_MAX_ENTRIES', '20000'))
+# 行程內雜湊索引重新從資料庫載入的間隔（秒），讓其他實例寫入的結果也能命中
+OCR_CACHE_INDEX_REFRESH = int(os.getenv('OCR_CACHE_INDEX_REFRESH', '60'))
+
+# dHash 取樣格數：(HASH_SIZE + 1) x HASH_SIZE 的灰階縮圖，比較相鄰像素得到 HASH_SIZE² 位元
+HASH_SIZE = 16
+HASH_BITS = HASH_SIZE * HASH_SIZE
+# 確認用灰階縮圖的邊長、比對區塊的邊長與每個區塊容許的位移（像素）
+THUMBNAIL_SIZE = 64
+THUMBNAIL_TILE = 8
+THUMBNAIL_MAX_SHIFT = 2
+# 標準差低於此值（灰階）的區塊視為空白；兩張都空白的區塊視為相同
+TILE_FLAT_STD = 3.0
+# 計算前先裁掉四周的比例，降低使用者拍照時邊緣裁切不同的影響
+EDGE_TRIM_RATIO = 0.04
+
+def compute_image_signature(image):
+    """
+    計算菜單照片的感知雜湊與確認用縮圖
+
+    正規化步驟：依 EXIF 轉正、轉灰階、自動對比、裁掉邊緣；
+    雜湊由 17x16 縮圖比較水平相鄰像素取得，縮圖為 64x64 灰階。
+
+    Args:
+        image: PIL.Image
+
+    Returns:
+        tuple: (256 位元雜湊 int, 縮圖 bytes)
+    """
+    from PIL import Image, ImageOps
+
+    image = ImageOps.exif_transpose(image)
+    gray = ImageOps.autocontrast(image.convert('L'))
+    width, height = gray.size
+    trim_x, trim_y = int(width * EDGE_TRIM_RATIO), int(height * EDGE_TRIM_RATIO)
+    if width - 2 * trim_x > THUMBNAIL_SIZE and height - 2 * trim_y > THUMBNAIL_SIZE:
+        gray = gray.crop((trim_x, trim_y, width - trim_x, height - trim_y))
+
+    pixels = gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX).tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+
+    thumbnail = gray.resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.BOX).tobytes()
+    return value, thumbnail
+
+def hash_similarity(hash_a, hash_b):
+    """兩個雜湊的相似度（0~1）"""
+    return 1 - bin(hash_a ^ hash_b).count('1') / HASH_BITS
+
+def _centered_tiles(pixels):
+    """將縮圖切成 THUMBNAIL_TILE x THUMBNAIL_TILE 的區塊，返回去平均後的區塊與各區塊的範數"""
+    count = THUMBNAIL_SIZE // THUMBNAIL_TILE
+    tiles = pixels.reshape(count, THUMBNAIL_TILE, count, THUMBNAIL_TILE).swapaxes(1, 2).reshape(count * count, -1)
+    tiles = tiles - tiles.mean(axis=1, keepdims=True)
+    return tiles, np.sqrt((tiles * tiles).sum(axis=1))
+
+def thumbnail_similarity(thumb_a, thumb_b, max_shift=THUMBNAIL_MAX_SHIFT):
+    """
+    兩張縮圖的區塊相似度（-1~1）
+
+    每個區塊在 ±max_shift 像素位移內取最大的正規化相關係數，返回所有區塊中的最小值：
+    裁切與縮放造成的錯位由各區塊各自的位移吸收，只要有一個品項或價格不同就會拉低結果。
+    大小不符的縮圖（例如舊版 32x32 的快取項目）視為不相符。
+    """
+    size = THUMBNAIL_SIZE
+    if len(thumb_a) != size * size or len(thumb_b) != size * size:
+        return -1.0
+    pixels_a = np.frombuffer(thumb_a, dtype=np.uint8).reshape(size, size).astype(np.float64)
+    pixels_b = np.frombuffer(thumb_b, dtype=np.uint8).reshape(size, size).astype(np.float64)
+    tiles_a, norms_a = _centered_tiles(pixels_a)
+    flat_norm = TILE_FLAT_STD * THUMBNAIL_TILE
+    padded = np.pad(pixels_b, max_shift, mode='edge')
+    best = np.full(len(tiles_a), -1.0)
+    for dy in range(2 * max_shift + 1):
+        for dx in range(2 * max_shift + 1):
+            tiles_b, norms_b = _centered_tiles(padded[dy:dy + size, dx:dx + size])
+            denominator = norms_a * norms_b
+            correlation = np.divide((tiles_a * tiles_b).sum(axis=1), denominator,
+                                    out=np.zeros_like(denominator), where=denominator > 0)
+            correlation[(norms_a < flat_norm) & (norms_b < flat_norm)] = 1.0
+            np.maximum(best, correlation, out=best)
+    return float(best.min())
+
+def _hash_to_hex(value):
+    return f"{value:0{HASH_BITS // 4}x}"
+
+class OCRResultCache:
+    """菜單 OCR 結果快取：行程內保存雜湊索引，結果本體存在資料庫"""
+
+    def __init__(self, similarity=OCR_CACHE_SIMILARITY, hash_similarity=OCR_CACHE_HASH_SIMILARITY, ttl=OCR_CACHE_TTL,
+                 max_entries=OCR_CACHE_MAX_ENTRIES, refresh_interval=OCR_CACHE_INDEX_REFRESH):
+        self.similarity = similarity
+        self.hash_similarity = hash_similarity
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        # target_lang -> [(雜湊, cache_id, 到期時間)]
+        self._index = {}
+        self._loaded_at = 0.0
+        self.stats = {'lookups': 0, 'hits': 0, 'misses': 0, 'stores': 0, 'errors': 0, 'lookup_ms': 0.0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _refresh_index(self):
+        """重新載入未過期項目的雜湊（只讀取雜湊欄位，不載入結果本體）"""
+        now = datetime.datetime.utcnow()
+        with Session(db.engine) as session:
+            rows = session.query(
+                OCRResultCacheEntry.cache_id,
+                OCRResultCacheEntry.target_lang,
+                OCRResultCacheEntry.image_hash,
+                OCRResultCacheEntry.expires_at
+            ).filter(OCRResultCacheEntry.expires_at > now).all()
+        index = {}
+        for cache_id, target_lang, image_hash, expires_at in rows:
+            index.setdefault(target_lang, []).append((int(image_hash, 16), cache_id, expires_at))
+        with self._lock:
+            self._index = index
+            self._loaded_at = time.monotonic()
+
+    def _candidates(self, image_hash, target_lang):
+        """雜湊相似度超過篩選門檻的候選 cache_id，依相似度由高到低"""
+        now = datetime.datetime.utcnow()
+        scored = []
+        with self._lock:
+            for candidate_hash, cache_id, expires_at in self._index.get(target_lang, ()):
+                if expires_at <= now:
+                    continue
+                similarity = hash_similarity(image_hash, candidate_hash)
+                if similarity >= self.hash_similarity:
+                    scored.append((similarity, cache_id))
+        scored.sort(reverse=True)
+        return [cache_id for _, cache_id in scored[:OCR_CACHE_MAX_CANDIDATES]]
+
+    def lookup(self, image_hash, thumbnail, target_lang):
+        """
+        尋找相似照片的 OCR 結果
+
+        Returns:
+            tuple: (結果 dict, 縮圖相似度)；未命中時返回 None
+        """
+        started = time.perf_counter()
+        self._count('lookups')
+        match = None
+        try:
+            if time.monotonic() - self._loaded_at > self.refresh_interval:
+                self._refresh_index()
+
+            candidate_ids = self._candidates(image_hash, target_lang)
+            if candidate_ids:
+                with Session(db.engine) as session:
+                    entries = session.query(OCRResultCacheEntry).filter(
+                        OCRResultCacheEntry.cache_id.in_(candidate_ids)
+                    ).all()
+                    for entry in entries:
+                        similarity = thumbnail_similarity(thumbnail, entry.thumbnail)
+                        if similarity >= self.similarity and (match is None or similarity > match[0]):
+                            match = (similarity, entry.cache_id, entry.result)
+                    if match is not None:
+                        session.execute(
+                            update(OCRResultCacheEntry)
+                            .where(OCRResultCacheEntry.cache_id == match[1])
+                            .values(hits=OCRResultCacheEntry.hits + 1)
+                        )
+                        session.commit()
+        except Exception as e:
+            logger.warning(f"OCR 快取查詢失敗: {e}")
+            self._count('errors')
+            return None
+        finally:
+            self._count('lookup_ms', (time.perf_counter() - started) * 1000)
+
+        if match is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        logger.info(f"OCR 快取命中: cache_id={match[1]}, 相似度={match[0]:.3f}, 語言={target_lang}")
+        return json.loads(match[2]), match[0]
+
+    def store(self, image_hash, thumbnail, target_lang, result):
+        """保存成功的 OCR 結果（寫入失敗只記錄警告，不影響主流程）"""
+        try:
+            expires_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=self.ttl)
+            with Session(db.engine) as session:
+                entry = OCRResultCacheEntry(
+                    image_hash=_hash_to_hex(image_hash),
+                    thumbnail=thumbnail,
+                    target_lang=target_lang,
+                    result=json.dumps(result, ensure_ascii=False, separators=(',', ':')),
+                    item_count=len(result.get('menu_items') or []),
+                    expires_at=expires_at
+                )
+                session.add(entry)
+                session.commit()
+                cache_id = entry.cache_id
+                self._trim(session)
+            with self._lock:
+                self._index.setdefault(target_lang, []).append((image_hash, cache_id, expires_at))
+            self._count('stores')
+        except Exception as e:
+            logger.warning(f"OCR 快取寫入失敗: {e}")
+            self._count('errors')
+
+    def _trim(self, session):
+        """刪除過期項目，並只保留最新的 max_entries 筆"""
+        session.execute(delete(OCRResultCacheEntry).where(OCRResultCacheEntry.expires_at <= datetime.datetime.utcnow()))
+        cutoff = session.query(OCRResultCacheEntry.cache_id).order_by(
+            OCRResultCacheEntry.cache_id.desc()
+        ).offset(self.max_entries).limit(1).scalar()
+        if cutoff is not None:
+            session.execute(delete(OCRResultCacheEntry).where(OCRResultCacheEntry.cache_id <= cutoff))
+        session.commit()
+
+    def get_stats(self):
+        """取得命中率、平均比對耗時與索引大小"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['indexed'] = sum(len(entries) for entries in self._index.values())
+        stats['hit_rate'] = round(stats['hits'] / stats['lookups'], 4) if stats['lookups'] else 0.0
+        stats['avg_lookup_ms'] = round(stats.pop('lookup_ms') / stats['lookups'], 3) if stats['lookups'] else 0.0
+        stats['similarity_threshold'] = self.similarity
+        stats['hash_similarity_threshold'] = self.hash_similarity
+        return stats
+
+ocr_result_cache = OCRResultCache()
+
+def get_cached_ocr_result(image, target_lang):
+    """
+    依照片查詢 OCR 快取
+
+    Returns:
+        tuple: (結果 dict 或 None, 照片簽章或 None)；簽章供未命中時寫入快取使用
+    """
+    if not OCR_CACHE_ENABLED:
+        return None, None
+    try:
+        signature = compute_image_signature(image)
+    except Exception as e:
+        logger.warning(f"計算菜單照片雜湊失敗: {e}")
+        return None, None
+
+    cached = ocr_result_cache.lookup(*signature, target_lang)
+    if cached is None:
+        return None, signature
+    result, similarity = cached
+    result['cache'] = {'hit': True, 'similarity': round(similarity, 4)}
+    return result, signature
+
+def store_ocr_result(signature, target_lang, result):
+    """保存 OCR 結果；只保存成功且有菜單項目的結果"""
+    if signature is None or not result.get('success') or not result.get('menu_items'):
+        return
+    ocr_result_cache.store(*signature, target_lang, result)
+
+def get_ocr_cache_stats():
+    """取得 OCR 快取統計"""
+    return ocr_result_cache.get_stats()
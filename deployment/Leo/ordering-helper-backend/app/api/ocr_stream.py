@@ -0,0 +1,78 @@
+# =============================================================================
+# 檔案名稱：app/api/ocr_stream.py
+# 功能描述：串流 OCR 的增量菜品解析與事件格式
+# 主要職責：
+# - 逐段接收 Gemini 串流文字，menu_items 陣列中的每個菜品物件一結束就解析出來並驗證
+# - 只掃描新到的文字，不重複解析整份回應（解析由 app/llm_json.py 負責）
+# - 將事件編碼為 SSE 或 NDJSON
+# =============================================================================
+
+import json
+import logging
+
+from ..llm_json import TolerantJSONParser, validate_schema, LLMJSONError, MENU_ITEM_SCHEMA, MENU_OCR_SCHEMA
+
+logger = logging.getLogger(__name__)
+
+class MenuItemStreamParser:
+    """
+    增量解析 Gemini 回應中的 menu_items 陣列（以 TolerantJSONParser 單次掃描）
+
+    用法：
+        parser = MenuItemStreamParser()
+        for text in chunks:
+            for item in parser.feed(text):
+                ...
+        result = parser.result()
+    """
+
+    def __init__(self, array_key='menu_items'):
+        self._parser = TolerantJSONParser(stream_paths=[(array_key,)], root='{')
+        self.items_parsed = 0
+        self.items_skipped = 0
+
+    @property
+    def finished(self):
+        """整份 JSON 是否已結束"""
+        return self._parser.done
+
+    def feed(self, chunk):
+        """
+        餵入一段串流文字
+
+        Returns:
+            list: 這段文字中完成、且符合菜品 schema 的菜品 dict
+        """
+        if not chunk:
+            return []
+        items = []
+        for _, element in self._parser.feed(chunk):
+            try:
+                item, _ = validate_schema(element, MENU_ITEM_SCHEMA)
+            except LLMJSONError as e:
+                self.items_skipped += 1
+                logger.warning(f"串流菜品不符合格式，略過: {e}")
+                continue
+            self.items_parsed += 1
+            items.append(item)
+        return items
+
+    def result(self):
+        """
+        結束解析並返回完整結果（含店家資訊）；回應被截斷時未完成的菜品不會出現在結果中
+
+        Raises:
+            LLMJSONError: 找不到 JSON 或不符合菜單 schema
+        """
+        value, _ = validate_schema(self._parser.close(), MENU_OCR_SCHEMA)
+        if self._parser.repairs:
+            logger.info(f"串流 OCR 回應已修復: {', '.join(sorted(self._parser.repairs))}")
+        return value
+
+def format_sse(event, data):
+    """編碼為 Server-Sent Events 格式"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def format_ndjson(event, data):
+    """編碼為 NDJSON（每行一個 JSON 物件）"""
+    return json.dumps({'event': event, 'data': data}, ensure_ascii=False) + '\n'
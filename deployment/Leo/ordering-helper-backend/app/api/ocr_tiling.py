@@ -0,0 +1,185 @@
+# =============================================================================
+# 檔案名稱：app/api/ocr_tiling.py
+# 功能描述：長條或多欄菜單照片的分塊並行 OCR
+# 主要職責：
+# - 長寬比過大的照片（菜單看板、長截圖）沿長邊切成互相重疊的區塊，每塊都保有可讀的解析度
+# - 各區塊同時送給 Gemini，總耗時約等於單一區塊
+# - 合併各區塊的菜品，以（菜名, 價格）去除重疊區域的重複項目
+# =============================================================================
+
+import io
+import os
+import math
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# auto：長寬比超過 OCR_TILE_ASPECT 時分塊；off：停用
+OCR_TILING = os.getenv('OCR_TILING', 'auto').lower()
+OCR_TILE_ASPECT = float(os.getenv('OCR_TILE_ASPECT', '1.8'))
+OCR_TILE_OVERLAP = float(os.getenv('OCR_TILE_OVERLAP', '0.15'))
+OCR_TILE_MAX = int(os.getenv('OCR_TILE_MAX', '6'))
+OCR_TILE_WORKERS = int(os.getenv('OCR_TILE_WORKERS', str(OCR_TILE_MAX)))
+# 每個區塊的目標長寬比（接近正方形時 Gemini 的縮放損失最小）
+TILE_TARGET_ASPECT = 1.3
+TILE_JPEG_QUALITY = 85
+
+# EXIF Orientation 5~8 表示照片轉了 90 度，寬高需對調
+_ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+def _oriented_size(image):
+    width, height = image.size
+    try:
+        if image.getexif().get(0x0112) in _ROTATED_ORIENTATIONS:
+            return height, width
+    except Exception:
+        pass
+    return width, height
+
+def tiled_max_dimension(image_bytes, max_dimension):
+    """
+    判斷照片是否需要分塊；需要時回傳前處理應使用的最大邊長
+
+    分塊沿長邊切割，因此整張照片只需把短邊縮到 max_dimension。
+
+    Returns:
+        int: 分塊時的最大邊長；不需分塊時返回 None
+    """
+    if OCR_TILING == 'off':
+        return None
+    from PIL import Image
+
+    width, height = _oriented_size(Image.open(io.BytesIO(image_bytes)))
+    long_edge, short_edge = max(width, height), min(width, height)
+    if short_edge <= 0 or long_edge / short_edge <= OCR_TILE_ASPECT:
+        return None
+    scale = min(1.0, max_dimension / short_edge)
+    return int(math.ceil(long_edge * scale))
+
+def plan_tiles(width, height, overlap=OCR_TILE_OVERLAP, max_tiles=OCR_TILE_MAX):
+    """
+    沿長邊規劃互相重疊的區塊
+
+    Returns:
+        list: [(left, top, right, bottom), ...]，由上到下（或由左到右）
+    """
+    vertical = height >= width
+    long_edge, short_edge = (height, width) if vertical else (width, height)
+    if long_edge / short_edge <= OCR_TILE_ASPECT:
+        return [(0, 0, width, height)]
+
+    # n 塊、每塊長 L、重疊 overlap*L：long_edge = L + (n - 1) * L * (1 - overlap)
+    count = math.ceil((long_edge / (short_edge * TILE_TARGET_ASPECT) - 1) / (1 - overlap)) + 1
+    count = max(2, min(max_tiles, count))
+    tile_length = long_edge / (1 + (count - 1) * (1 - overlap))
+    step = tile_length * (1 - overlap)
+
+    boxes = []
+    for index in range(count):
+        start = int(round(index * step))
+        end = long_edge if index == count - 1 else int(round(index * step + tile_length))
+        boxes.append((0, start, width, end) if vertical else (start, 0, end, height))
+    return boxes
+
+def encode_tiles(image, boxes, quality=TILE_JPEG_QUALITY):
+    """裁切並壓縮各區塊為 JPEG"""
+    tiles = []
+    for box in boxes:
+        buffer = io.BytesIO()
+        image.crop(box).save(buffer, format='JPEG', quality=quality, optimize=True)
+        tiles.append(buffer.getvalue())
+    return tiles
+
+def _normalize_name(name):
+    return ''.join(str(name or '').split()).lower()
+
+def _price_key(price):
+    try:
+        return round(float(price), 2)
+    except (TypeError, ValueError):
+        return None
+
+def merge_tile_results(results):
+    """
+    合併各區塊的辨識結果
+
+    菜品以（正規化菜名, 價格）去重，保留欄位較完整的一筆；店家資訊取第一個有店名的區塊。
+
+    Args:
+        results: 各區塊的解析結果（失敗的區塊為 None），依區塊順序
+
+    Returns:
+        dict: 與單張辨識相同格式的結果
+    """
+    merged = []
+    positions = {}
+    store_info = None
+    notes = []
+
+    for tile_index, result in enumerate(results):
+        if not isinstance(result, dict):
+            notes.append(f"區塊 {tile_index + 1} 辨識失敗")
+            continue
+        info = result.get('store_info') or {}
+        if store_info is None and info.get('name'):
+            store_info = info
+        for item in result.get('menu_items') or []:
+            if not isinstance(item, dict):
+                continue
+            key = (_normalize_name(item.get('original_name')), _price_key(item.get('price')))
+            if not key[0]:
+                continue
+            if key in positions:
+                existing = merged[positions[key]]
+                if sum(1 for v in item.values() if v) > sum(1 for v in existing.values() if v):
+                    merged[positions[key]] = item
+                continue
+            positions[key] = len(merged)
+            merged.append(item)
+
+    succeeded = sum(1 for result in results if isinstance(result, dict))
+    return {
+        'success': bool(merged),
+        'menu_items': merged,
+        'store_info': store_info or {'name': None, 'address': None, 'phone': None},
+        'processing_notes': '; '.join(notes) or None,
+        'tiles': {'count': len(results), 'succeeded': succeeded}
+    }
+
+def process_menu_tiles(image, ocr_tile, timeout=None, workers=OCR_TILE_WORKERS):
+    """
+    分塊並行辨識
+
+    Args:
+        image: 前處理後的 PIL.Image（短邊已縮到單張上限）
+        ocr_tile: callable(tile_bytes) -> 解析結果 dict；拋出例外視為該區塊失敗
+        timeout: 等待所有區塊的秒數上限，逾時的區塊視為失敗
+
+    Returns:
+        dict: 合併後的結果
+    """
+    boxes = plan_tiles(*image.size)
+    tiles = encode_tiles(image, boxes)
+    logger.info(f"菜單分塊辨識: {image.size} 切成 {len(tiles)} 塊")
+
+    executor = ThreadPoolExecutor(max_workers=min(workers, len(tiles)), thread_name_prefix='ocr-tile')
+    try:
+        # 複製 contextvars，讓各區塊沿用請求的 Gemini 期限
+        futures = [executor.submit(contextvars.copy_context().run, ocr_tile, tile) for tile in tiles]
+        wait(futures, timeout=timeout)
+        results = []
+        for index, future in enumerate(futures):
+            if not future.done():
+                logger.warning(f"區塊 {index + 1} 辨識逾時")
+                results.append(None)
+            elif future.exception() is not None:
+                logger.warning(f"區塊 {index + 1} 辨識失敗: {future.exception()}")
+                results.append(None)
+            else:
+                results.append(future.result())
+    finally:
+        # 不等待逾時的區塊，讓請求可以先回應
+        executor.shutdown(wait=False, cancel_futures=True)
+    return merge_tile_results(results)
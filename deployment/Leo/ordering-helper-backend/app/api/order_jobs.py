@@ -0,0 +1,146 @@
+# =============================================================================
+# 檔案名稱：app/api/order_jobs.py
+# 功能描述：訂單建立後的背景處理流程
+# 主要職責：
+# - 訂單提交後以背景工作（background_jobs）執行完整訂單確認、OCR 訂單摘要、語音生成與 LINE 通知
+# - 記錄每個步驟的狀態，供前端輪詢 voice_generated；重試時略過已完成的步驟
+# - 讓 POST /api/orders 只需等待資料庫寫入
+# =============================================================================
+
+import os
+import logging
+
+from ..jobs import job_handler, enqueue_job, get_job
+
+logger = logging.getLogger(__name__)
+
+POST_ORDER_JOB = 'post_order'
+
+STEPS = ('confirmation', 'ocr_summary', 'voice', 'notification')
+
+def _job_key(order_id):
+    return f"{POST_ORDER_JOB}:{order_id}"
+
+def submit_post_order_job(order_id, user_language='zh', store_name=None, guest_mode=False, ocr_context=None):
+    """
+    排入訂單後續處理
+
+    Args:
+        order_id: 已提交的訂單 ID
+        user_language: 使用者語言
+        store_name: 前端傳遞的店家名稱
+        guest_mode: 訪客模式不發送 LINE 通知
+        ocr_context: OCR 訂單摘要所需資料（ocr_items、store_id 等），非 OCR 訂單為 None
+
+    Returns:
+        dict: 初始狀態
+    """
+    enqueue_job(POST_ORDER_JOB, {
+        'order_id': order_id,
+        'user_language': user_language,
+        'store_name': store_name,
+        'guest_mode': guest_mode,
+        'ocr_context': ocr_context
+    }, idempotency_key=_job_key(order_id))
+    return get_post_order_status(order_id)
+
+def get_post_order_status(order_id):
+    """取得訂單後續處理狀態；找不到對應的背景工作時回傳 None"""
+    job = get_job(idempotency_key=_job_key(order_id))
+    if job is None:
+        return None
+    result = job['result'] or {}
+    return {
+        'order_id': order_id,
+        'state': job['status'],
+        'steps': result.get('steps', {step: 'pending' for step in STEPS}),
+        'voice_generated': result.get('voice_generated', False),
+        'voice_url': result.get('voice_url'),
+        'confirmation': result.get('confirmation'),
+        'attempts': job['attempts'],
+        'error': job['last_error'],
+        'updated_at': job['updated_at']
+    }
+
+@job_handler(POST_ORDER_JOB)
+def run_post_order_job(payload, job):
+    """依序執行訂單後續步驟；有步驟失敗時拋出例外以便重試，已完成的步驟不會重做"""
+    from ..models import db
+    from .helpers import create_complete_order_confirmation, generate_voice_order, send_complete_order_notification
+
+    order_id = payload['order_id']
+    store_name = payload.get('store_name')
+    ocr_context = payload.get('ocr_context')
+
+    progress = job.result or {}
+    steps = progress.setdefault('steps', {step: 'pending' for step in STEPS})
+    if not ocr_context:
+        steps['ocr_summary'] = 'skipped'
+    if payload.get('guest_mode'):
+        steps['notification'] = 'skipped'
+
+    def mark(step, state, **fields):
+        steps[step] = state
+        progress.update(fields)
+        job.save_progress(progress)
+
+    # 1. 完整訂單確認（含訂單摘要寫入）
+    confirmation = progress.get('confirmation')
+    if steps['confirmation'] != 'done':
+        try:
+            result = create_complete_order_confirmation(order_id, payload.get('user_language', 'zh'), store_name) or {}
+            db.session.commit()
+            confirmation = {'chinese': result.get('chinese'), 'translated': result.get('translated')}
+            mark('confirmation', 'done', confirmation=confirmation)
+        except Exception as e:
+            db.session.rollback()
+            logger.exception(f"❌ 完整訂單確認生成失敗: order_id={order_id}, error={e}")
+            mark('confirmation', 'failed')
+
+    # 2. OCR 訂單摘要
+    if steps['ocr_summary'] not in ('done', 'skipped'):
+        try:
+            from .helpers import save_ocr_menu_and_summary_to_database
+            confirmation = confirmation or {}
+            save_result = save_ocr_menu_and_summary_to_database(
+                order_id=order_id,
+                chinese_summary=confirmation.get('chinese') or 'OCR訂單摘要',
+                user_language_summary=confirmation.get('translated') or 'OCR訂單摘要',
+                **ocr_context
+            )
+            db.session.commit()
+            mark('ocr_summary', 'done' if save_result.get('success') else 'failed')
+        except Exception as e:
+            db.session.rollback()
+            logger.exception(f"⚠️ 儲存OCR訂單摘要時發生錯誤: order_id={order_id}, error={e}")
+            mark('ocr_summary', 'failed')
+
+    # 3. 中文語音檔
+    if steps['voice'] != 'done':
+        try:
+            voice_path = generate_voice_order(order_id)
+            if isinstance(voice_path, str) and os.path.exists(voice_path):
+                from ..config import URLConfig
+                mark('voice', 'done', voice_generated=True,
+                     voice_url=URLConfig.get_voice_url(os.path.basename(voice_path)))
+            else:
+                mark('voice', 'failed')
+        except Exception as e:
+            logger.exception(f"❌ 語音檔生成失敗: order_id={order_id}, error={e}")
+            mark('voice', 'failed')
+
+    # 4. LINE 通知（訪客模式略過）
+    if steps['notification'] not in ('done', 'skipped'):
+        try:
+            send_complete_order_notification(order_id, store_name)
+            db.session.commit()
+            mark('notification', 'done')
+        except Exception as e:
+            db.session.rollback()
+            logger.exception(f"❌ LINE 通知發送失敗: order_id={order_id}, error={e}")
+            mark('notification', 'failed')
+
+    failed = [step for step, state in steps.items() if state == 'failed']
+    if failed:
+        raise RuntimeError(f"訂單後續處理步驟失敗: {', '.join(failed)}")
+    return progress
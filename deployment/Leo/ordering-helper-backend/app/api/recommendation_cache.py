@@ -0,0 +1,120 @@
+# =============================================================================
+# 檔案名稱：app/api/recommendation_cache.py
+# 功能描述：AI 店家推薦結果快取
+# 主要職責：
+# - 以 (正規化需求文字, 使用者語言, 店家目錄版本, 位置) 為鍵快取 Gemini 推薦結果，
+#   「想吃火鍋」與「推薦火鍋」這類只差在意圖用語的需求共用同一份結果
+# - 店家或翻譯異動後目錄版本遞增，舊版本的結果不再命中，隨 LRU 與 TTL 淘汰
+# - 記錄命中、未命中與淘汰次數
+# =============================================================================
+
+import os
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from .store_search import get_catalog_version
+
+RECOMMENDATION_CACHE_ENABLED = os.getenv('RECOMMENDATION_CACHE_ENABLED', 'true').lower() == 'true'
+RECOMMENDATION_CACHE_TTL = int(os.getenv('RECOMMENDATION_CACHE_TTL', '600'))
+RECOMMENDATION_CACHE_MAX_SIZE = int(os.getenv('RECOMMENDATION_CACHE_MAX_SIZE', '2000'))
+# 位置以約 1 公里的格子計入快取鍵
+LOCATION_PRECISION = 2
+
+# 表達意圖、不影響推薦結果的用語（先比對較長的詞）
+INTENT_PHRASES = sorted([
+    '我想吃', '我想要', '我要吃', '想吃', '想要', '我要', '推薦', '介紹', '請問', '請', '幫我找', '幫我', '尋找',
+    '附近的', '附近', '有沒有', '哪裡有', '哪裡', '好吃的', '一下', '一家', '一間', '店家', '餐廳',
+    'i want to eat', 'i want', 'recommend', 'please', 'find me', 'near me', 'nearby', 'restaurant', 'restaurants'
+], key=len, reverse=True)
+_INTENT_PATTERN = re.compile('|'.join(re.escape(phrase) for phrase in INTENT_PHRASES))
+_NON_WORD = re.compile(r'[\W_]+')
+
+def normalize_food_request(text):
+    """
+    正規化餐飲需求：全形轉半形、轉小寫、移除意圖用語、標點與空白
+
+    例如「想吃火鍋！」、「推薦 火鍋」都會得到「火鍋」。
+    """
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return _NON_WORD.sub('', _INTENT_PATTERN.sub(' ', text))
+
+def make_recommendation_cache_key(food_request, user_language, catalog_version, latitude=None, longitude=None):
+    """推薦快取鍵：(正規化需求, 語言, 目錄版本, 位置格子) 的 SHA-256"""
+    location = ''
+    if latitude is not None and longitude is not None:
+        location = f"{round(float(latitude), LOCATION_PRECISION)},{round(float(longitude), LOCATION_PRECISION)}"
+    raw = '\x1f'.join([
+        normalize_food_request(food_request),
+        user_language or '',
+        str(catalog_version),
+        location
+    ])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+class RecommendationCache:
+    """行程內 LRU 推薦快取（含 TTL，執行緒安全）"""
+
+    def __init__(self, max_size=RECOMMENDATION_CACHE_MAX_SIZE, ttl=RECOMMENDATION_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # cache_key -> (推薦結果, 到期的 monotonic 時間)
+        self._entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'sets': 0}
+
+    def get(self, key):
+        """取得推薦結果，未命中或已過期時返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                self.stats['expired'] += 1
+                entry = None
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return [dict(recommendation) for recommendation in entry[0]]
+
+    def set(self, key, recommendations):
+        """寫入推薦結果（空結果可能是 Gemini 失敗，不快取）"""
+        if not recommendations:
+            return
+        with self._lock:
+            self._entries[key] = ([dict(recommendation) for recommendation in recommendations],
+                                  time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            self.stats['sets'] += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'enabled': RECOMMENDATION_CACHE_ENABLED,
+            'max_size': self.max_size,
+            'ttl_seconds': self.ttl,
+            'hit_rate': round(stats['hits'] / lookups, 4) if lookups else 0.0
+        })
+        return stats
+
+recommendation_cache = RecommendationCache()
+
+def get_recommendation_cache_stats():
+    """取得推薦快取命中率統計"""
+    stats = recommendation_cache.get_stats()
+    stats['catalog_version'] = get_catalog_version()
+    return stats
@@ -15,6 +15,8 @@
 from flask import Blueprint, jsonify, request, send_file, current_app, send_from_directory
 from ..models import db, Store, Menu, MenuItem, MenuTranslation, User, Order, OrderItem, StoreTranslation, OCRMenu, OCRMenuItem, OCRMenuTranslation, VoiceFile, Language
 from .helpers import process_menu_with_gemini, generate_voice_order, create_order_summary, save_uploaded_file, VOICE_DIR
+from ..db_engine import read_query
+from ..temp_store import get_temp_store
 import json
 import os
 from werkzeug.utils import secure_filename
@@ -210,7 +212,7 @@ def get_store(store_id):
         # 取得使用者語言偏好
         user_language = request.args.get('lang', 'zh')
         
-        store = Store.query.get(store_id)
+        store = read_query(Store).get(store_id)
         if not store:
             return jsonify({"error": "找不到店家"}), 404
         
@@ -252,14 +254,14 @@ def get_menu(store_id):
         normalized_lang = normalize_lang(user_language)
         
         # 先檢查店家是否存在
-        store = Store.query.get(store_id)
+        store = read_query(Store).get(store_id)
         if not store:
             return jsonify({"error": "找不到店家"}), 404
         
         # 嘗試查詢菜單項目，透過菜單關聯查詢，過濾掉價格為 0 的商品
         try:
             # 先查詢店家的菜單
-            menus = Menu.query.filter(Menu.store_id == store_id).all()
+            menus = read_query(Menu).filter(Menu.store_id == store_id).all()
             if not menus:
                 return jsonify({
                     "error": "此店家目前沒有菜單",
@@ -270,7 +272,7 @@ def get_menu(store_id):
             
             # 透過菜單查詢菜單項目
             menu_ids = [menu.menu_id for menu in menus]
-            menu_items = MenuItem.query.filter(
+            menu_items = read_query(MenuItem).filter(
                 MenuItem.menu_id.in_(menu_ids),
                 MenuItem.price_small > 0  # 只返回價格大於 0 的商品
             ).all()
@@ -295,22 +297,21 @@ def get_menu(store_id):
         
         # 使用新的 DTO 模型處理雙語菜單項目
         from .dto_models import build_menu_item_dto
+        from .translation_service import translate_menu_items_batch
         translated_items = []
         current_app.logger.info(f"開始處理雙語菜單項目，目標語言: {normalized_lang}")
         
+        # 整份菜單一次批次翻譯（優先使用資料庫翻譯）
+        translated_names = translate_menu_items_batch(menu_items, normalized_lang)
+        
         for item in menu_items:
             # 使用 alias 查詢，將 item_name 作為 name_source
             # 這樣可以保留原文，同時提供翻譯版本
             menu_item_dto = build_menu_item_dto(item, normalized_lang)
             
-            # 如果需要翻譯，使用翻譯服務
+            # 如果需要翻譯，使用批次翻譯結果
             if not normalized_lang.startswith('zh'):
-                from .translation_service import translate_text
-                translated_name = translate_text(menu_item_dto.name_source, normalized_lang)
-                menu_item_dto.name_ui = translated_name
-                
-                # 記錄翻譯結果
-                current_app.logger.info(f"翻譯: '{menu_item_dto.name_source}' -> '{translated_name}' (語言: {normalized_lang})")
+                menu_item_dto.name_ui = translated_names.get(item.menu_item_id, menu_item_dto.name_source)
             
             # 轉換為字典格式，明確分離 native 和 display 欄位
             translated_item = {
@@ -364,14 +365,14 @@ def get_menu_by_place_id(place_id):
         normalized_lang = normalize_lang(user_language)
         
         # 先根據 place_id 找到店家
-        store = Store.query.filter_by(place_id=place_id).first()
+        store = read_query(Store).filter_by(place_id=place_id).first()
         if not store:
             return jsonify({"error": "找不到店家"}), 404
         
         # 嘗試查詢菜單項目，透過菜單關聯查詢，過濾掉價格為 0 的商品
         try:
             # 先查詢店家的菜單
-            menus = Menu.query.filter(Menu.store_id == store.store_id).all()
+            menus = read_query(Menu).filter(Menu.store_id == store.store_id).all()
             if not menus:
                 return jsonify({
                     "error": "此店家目前沒有菜單",
@@ -383,7 +384,7 @@ def get_menu_by_place_id(place_id):
             
             # 透過菜單查詢菜單項目
             menu_ids = [menu.menu_id for menu in menus]
-            menu_items = MenuItem.query.filter(
+            menu_items = read_query(MenuItem).filter(
                 MenuItem.menu_id.in_(menu_ids),
                 MenuItem.price_small > 0  # 只返回價格大於 0 的商品
             ).all()
@@ -406,16 +407,16 @@ def get_menu_by_place_id(place_id):
             "message": "請使用菜單圖片上傳功能來建立菜單"
         }), 404
         
-        # 使用新的翻譯服務翻譯菜單項目
+        # 使用新的翻譯服務翻譯菜單項目（整份菜單一次批次翻譯）
+        from .translation_service import translate_menu_items_batch
         translated_items = []
         current_app.logger.info(f"開始翻譯菜單項目，目標語言: {normalized_lang}")
         
+        translated_names = translate_menu_items_batch(menu_items, normalized_lang)
+        
         for item in menu_items:
             original_name = item.item_name
-            translated_name = translate_text(original_name, normalized_lang)
-            
-            # 記錄翻譯結果
-            current_app.logger.info(f"翻譯: '{original_name}' -> '{translated_name}' (語言: {normalized_lang})")
+            translated_name = translated_names.get(item.menu_item_id, original_name)
             
             translated_item = {
                 "id": item.menu_item_id,
@@ -456,7 +457,7 @@ def check_partner_status():
     lang = request.args.get('lang', 'en')
     
     # 使用新的翻譯服務進行語言碼正規化
-    from .translation_service import normalize_lang, translate_text
+    from .translation_service import normalize_lang, translate_text, translate_store_menu
     normalized_lang = normalize_lang(lang)
     
     try:
@@ -482,50 +483,44 @@ def check_partner_status():
         if store:
             # 找到店家
             original_name = store.store_name
-            translated_name = translate_text(original_name, normalized_lang)
             
             # 合作店家判斷：只要 partner_level > 0 就是合作店家
             is_partner = store.partner_level > 0
             
             # 只有合作店家才檢查菜單
-            has_menu = False
-            translated_menu = []
-            
+            menu_items = []
             if is_partner:
                 # 合作店家：檢查是否有菜單
                 try:
-                    menus = Menu.query.filter(Menu.store_id == store.store_id).all()
-                    
-                    if menus:
-                        menu_ids = [menu.menu_id for menu in menus]
-                        menu_items = MenuItem.query.filter(
-                            MenuItem.menu_id.in_(menu_ids),
-                            MenuItem.price_small > 0
-                        ).all()
-                        has_menu = len(menu_items) > 0
-                        
-                        # 如果有菜單項目，提供翻譯後的菜單
-                        if menu_items:
-                            for item in menu_items:
-                                translated_item = {
-                                    "id": item.menu_item_id,
-                                    "name": translate_text(item.item_name, normalized_lang),
-                                    "translated_name": translate_text(item.item_name, normalized_lang),  # 為了前端兼容性
-                                    "original_name": item.item_name,
-                                    "price_small": item.price_small,
-                                    "price_large": item.price_big,  # 修正：使用 price_big 而不是 price_large
-                                    "category": "",  # 修正：資料庫中沒有 category 欄位
-                                    "original_category": ""
-                                }
-                                translated_menu.append(translated_item)
+                    menu_items = read_query(MenuItem).join(Menu, MenuItem.menu_id == Menu.menu_id).filter(
+                        Menu.store_id == store.store_id,
+                        MenuItem.price_small > 0
+                    ).all()
                 except Exception as e:
                     current_app.logger.warning(f"檢查菜單時發生錯誤: {e}")
-                    has_menu = False
+                    menu_items = []
             else:
                 # 非合作店家：強制沒有菜單，必須使用拍照模式
                 current_app.logger.info(f"非合作店家 {store.store_name} (partner_level={store.partner_level})，強制進入拍照模式")
-                has_menu = False
-                translated_menu = []
+            
+            # 店名與菜名合併成同一個去重批次翻譯
+            translated_name, translated_names = translate_store_menu(original_name, menu_items, normalized_lang)
+            has_menu = len(menu_items) > 0
+            
+            # 如果有菜單項目，提供翻譯後的菜單
+            translated_menu = []
+            for item in menu_items:
+                item_translated_name = translated_names.get(item.menu_item_id, item.item_name)
+                translated_menu.append({
+                    "id": item.menu_item_id,
+                    "name": item_translated_name,
+                    "translated_name": item_translated_name,  # 為了前端兼容性
+                    "original_name": item.item_name,
+                    "price_small": item.price_small,
+                    "price_large": item.price_big,  # 修正：使用 price_big 而不是 price_large
+                    "category": "",  # 修正：資料庫中沒有 category 欄位
+                    "original_category": ""
+                })
             
             response_data = {
                 "store_id": store.store_id,
@@ -1270,7 +1265,8 @@ def create_order():
                 
                 db.session.execute(text(order_item_sql), order_item_params)
             
-            # 不立即 commit，讓外部交易管理
+            # 提交訂單，後續處理在背景執行
+            db.session.commit()
             print(f"✅ 已創建 {len(order_items_to_create)} 個訂單項目")
             
             # 創建Order物件用於後續處理
@@ -1291,10 +1287,18 @@ def create_order():
             print(f"📋 訂單ID: {new_order.order_id}")
             print(f"📋 用戶偏好語言: {user.preferred_lang}")
             
-            # 建立基本的訂單確認內容（不使用 create_complete_order_confirmation）
+            # 建立基本的訂單確認內容（不使用 create_complete_order_confirmation，
+            # 完整的翻譯版確認在背景生成，可由 status_url 取得）
+            created_messages = {
+                "en": f"Order created, total: ${total_amount}",
+                "ja": f"注文が作成されました。合計金額：${total_amount}",
+                "ko": f"주문이 생성되었습니다. 총 금액: ${total_amount}",
+                "zh": f"訂單已建立，總金額：${total_amount}"
+            }
+            user_lang = (user.preferred_lang or 'zh').split('-')[0].lower()
             order_confirmation = {
-                "chinese": f"訂單已建立，總金額：${total_amount}",
-                "translated": f"Order created, total: ${total_amount}",
+                "chinese": created_messages["zh"],
+                "translated": created_messages.get(user_lang, created_messages["en"]),
                 "chinese_voice_text": f"訂單已建立，總金額{total_amount}元"
             }
             
@@ -1319,94 +1323,49 @@ def create_order():
                 }
             }), 500
         
-        # 🔧 交易提交後的操作：完整訂單確認、語音生成和 LINE 通知
-        print(f"✅ 資料庫交易已提交，開始後續處理...")
+        # 🔧 交易提交後的操作：完整訂單確認、OCR 訂單摘要、語音生成和 LINE 通知改在背景執行
+        print(f"✅ 資料庫交易已提交，排入背景後續處理...")
         
-        # 1. 生成完整的訂單確認內容
-        try:
-            from .helpers import create_complete_order_confirmation, send_complete_order_notification, generate_voice_order
-            
-            print(f"🔧 準備生成完整訂單確認...")
-            order_confirmation = create_complete_order_confirmation(new_order.order_id, user.preferred_lang, frontend_store_name)
-            print(f"✅ 完整訂單確認生成成功")
-            print(f"📋 確認內容: {order_confirmation}")
-        except Exception as e:
-            print(f"❌ 完整訂單確認生成失敗: {e}")
-            print(f"錯誤類型: {type(e).__name__}")
-            import traceback
-            traceback.print_exc()
-            # 使用基本確認內容，繼續執行
-        
-        # 2. 如果是OCR菜單訂單，建立訂單摘要並儲存到資料庫
+        ocr_context = None
         if ocr_menu_id:
-            try:
-                from .helpers import save_ocr_menu_and_summary_to_database
-                
-                # 準備OCR項目資料
-                ocr_items = []
-                for item in order_details:
-                    if item.get('is_ocr'):
-                        ocr_items.append({
-                            'name': {
-                                'original': item.get('item_name', ''),
-                                'translated': item.get('translated_name', item.get('item_name', ''))
-                            },
-                            'price': item.get('price', 0),
-                            'item_name': item.get('item_name', ''),
-                            'translated_name': item.get('translated_name', item.get('item_name', ''))
-                        })
-                
-                if ocr_items:
-                    # 儲存到資料庫
-                    save_result = save_ocr_menu_and_summary_to_database(
-                        order_id=new_order.order_id,
-                        ocr_items=ocr_items,
-                        chinese_summary=order_confirmation.get('chinese', 'OCR訂單摘要'),
-                        user_language_summary=order_confirmation.get('translated', 'OCR訂單摘要'),
-                        user_language=data.get('language', 'zh'),
-                        total_amount=total_amount,
-                        user_id=user.user_id if user else None,
-                        store_id=store_db_id,  # 新增 store_id
-                        store_name=data.get('store_name', 'OCR店家'),
-                        existing_ocr_menu_id=ocr_menu_id
-                    )
-                    
-                    if save_result['success']:
-                        print(f"✅ OCR訂單摘要已成功儲存到資料庫")
-                        print(f"   OCR菜單ID: {save_result['ocr_menu_id']}")
-                        print(f"   訂單摘要ID: {save_result['summary_id']}")
-                    else:
-                        print(f"⚠️ OCR訂單摘要儲存失敗: {save_result['message']}")
-            except Exception as e:
-                print(f"⚠️ 儲存OCR訂單摘要時發生錯誤: {e}")
-                # 不影響主要流程，繼續執行
+            # 準備OCR項目資料
+            ocr_items = []
+            for item in order_details:
+                if item.get('is_ocr'):
+                    ocr_items.append({
+                        'name': {
+                            'original': item.get('item_name', ''),
+                            'translated': item.get('translated_name', item.get('item_name', ''))
+                        },
+                        'price': item.get('price', 0),
+                        'item_name': item.get('item_name', ''),
+                        'translated_name': item.get('translated_name', item.get('item_name', ''))
+                    })
+            if ocr_items:
+                ocr_context = {
+                    'ocr_items': ocr_items,
+                    'user_language': data.get('language', 'zh'),
+                    'total_amount': total_amount,
+                    'user_id': user.user_id if user else None,
+                    'store_id': store_db_id,
+                    'store_name': data.get('store_name', 'OCR店家'),
+                    'existing_ocr_menu_id': ocr_menu_id
+                }
         
-        # 3. 生成中文語音檔
-        voice_path = None
+        # 訂單已提交，排入背景工作失敗時仍返回成功，避免前端重試造成重複訂單
+        job_status = None
         try:
-            print(f"🔧 準備生成語音檔...")
-            voice_path = generate_voice_order(new_order.order_id)
-            print(f"✅ 語音檔生成成功: {voice_path}")
+            from .order_jobs import submit_post_order_job
+            job_status = submit_post_order_job(
+                new_order.order_id,
+                user_language=user.preferred_lang,
+                store_name=frontend_store_name,
+                guest_mode=guest_mode,
+                ocr_context=ocr_context
+            )
         except Exception as e:
-            print(f"❌ 語音檔生成失敗: {e}")
-            print(f"錯誤類型: {type(e).__name__}")
-            import traceback
-            traceback.print_exc()
-            # 不拋出異常，繼續執行
-            voice_path = None
-        
-        # 4. 只在非訪客模式下發送 LINE 通知
-        if not guest_mode:
-            try:
-                print(f"📱 準備發送 LINE 通知...")
-                send_complete_order_notification(new_order.order_id, frontend_store_name)
-                print(f"✅ LINE 通知發送完成")
-            except Exception as e:
-                print(f"❌ LINE 通知發送失敗: {e}")
-                print(f"錯誤類型: {type(e).__name__}")
-                import traceback
-                traceback.print_exc()
-                # 不拋出異常，繼續執行
+            db.session.rollback()
+            print(f"⚠️ 訂單 {new_order.order_id} 排入背景後續處理失敗: {e}")
         
         # 返回成功響應
         response_data = {
@@ -1415,7 +1374,9 @@ def create_order():
             "order_details": order_details,
             "total_amount": total_amount,
             "confirmation": order_confirmation,
-            "voice_generated": voice_path is not None
+            "voice_generated": False,  # 語音在背景生成，請輪詢 status_url
+            "processing": job_status,
+            "status_url": f"/api/orders/{new_order.order_id}/status"
         }
         
         # 如果是OCR菜單訂單，添加OCR相關資訊
@@ -1642,6 +1603,22 @@ def create_temp_order():
             "details": str(e)
         }), 500
 
+@api_bp.route('/orders/<int:order_id>/status', methods=['GET', 'OPTIONS'])
+def get_order_processing_status(order_id):
+    """查詢訂單背景處理狀態（語音生成與 LINE 通知）"""
+    if request.method == 'OPTIONS':
+        return handle_cors_preflight()
+    
+    from .order_jobs import get_post_order_status
+    status = get_post_order_status(order_id)
+    if status is None:
+        return jsonify({
+            "order_id": order_id,
+            "state": "unknown",
+            "message": "找不到此訂單的處理狀態（可能已過期）"
+        }), 404
+    return jsonify(status)
+
 @api_bp.route('/orders/<int:order_id>/confirm', methods=['GET'])
 def get_order_confirmation(order_id):
     """取得訂單確認資訊"""
@@ -1721,7 +1698,14 @@ def get_order_voice(order_id):
 
 @api_bp.route('/orders/history', methods=['GET'])
 def get_order_history():
-    """取得使用者訂單記錄"""
+    """
+    取得使用者訂單記錄
+
+    查詢參數：
+    - line_user_id：LINE 使用者 ID
+    - limit：每頁筆數（預設 20，最多 100）
+    - before：上一頁回應的 next_cursor，取得更早的訂單
+    """
     try:
         line_user_id = request.args.get('line_user_id')
         if not line_user_id:
@@ -1732,17 +1716,23 @@ def get_order_history():
         if not user:
             return jsonify({"error": "找不到使用者"}), 404
         
-        # 查詢訂單記錄（最近20筆）
-        orders = Order.query.filter_by(user_id=user.user_id).order_by(Order.order_time.desc()).limit(20).all()
+        # 查詢訂單記錄（店家與訂單項目一併載入）
+        from .helpers import get_order_history_page
+        try:
+            orders, next_cursor = get_order_history_page(
+                user.user_id,
+                limit=request.args.get('limit', 20, type=int),
+                before=request.args.get('before')
+            )
+        except ValueError:
+            return jsonify({"error": "無效的分頁游標"}), 400
         
         order_history = []
         for order in orders:
-            store = Store.query.get(order.store_id)
-            
             # 取得訂單項目
             order_items = []
             for item in order.items:
-                menu_item = MenuItem.query.get(item.menu_item_id)
+                menu_item = item.menu_item
                 if menu_item:
                     order_items.append({
                         'item_name': menu_item.item_name,
@@ -1753,7 +1743,7 @@ def get_order_history():
             
             order_data = {
                 'order_id': order.order_id,
-                'store_name': store.store_name if store else "Unknown Store",
+                'store_name': order.store.store_name if order.store else "Unknown Store",
                 'store_id': order.store_id,
                 'order_time': order.order_time.isoformat(),
                 'total_amount': order.total_amount,
@@ -1768,7 +1758,9 @@ def get_order_history():
             'line_user_id': user.line_user_id,
             'preferred_language': user.preferred_lang,
             'total_orders': len(order_history),
-            'orders': order_history
+            'orders': order_history,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
         })
         
     except Exception as e:
@@ -2250,7 +2242,7 @@ def get_all_stores():
         return handle_cors_preflight()
     
     try:
-        stores = Store.query.all()
+        stores = read_query(Store).all()
         store_list = []
         
         for store in stores:
@@ -4318,8 +4310,82 @@ def get_partner_menu():
         response.headers.add('Access-Control-Allow-Origin', '*')
         return response, 200
 
-# 新增：暫存 OCR 資料的記憶體儲存
-_ocr_temp_storage = {}
+# OCR 暫存資料（TTL 1 小時）；存放在共用的暫存儲存，任何 worker 都能接續處理
+OCR_TEMP_TTL = 3600
+
+def _translate_ocr_store_name(store_info, user_language):
+    """返回 (中文店名, 翻譯店名)"""
+    from .helpers import contains_cjk
+    from .translation_service import translate_text
+    
+    store_name_original = (store_info or {}).get('name', '非合作店家')
+    if store_name_original and contains_cjk(store_name_original):
+        store_name_translated = translate_text(store_name_original, user_language, 'zh')
+    else:
+        store_name_translated = store_name_original or 'Non-partner Store'
+    return store_name_original, store_name_translated
+
+def _normalize_ocr_menu_item(item, user_language, index):
+    """
+    整理單一 OCR 菜品：確保 original_name 為中文、補上翻譯名稱
+    
+    Returns:
+        dict: 暫存用的菜品（id 為 temp_item_<index>）；無法取得中文菜名時返回 None
+    """
+    from .helpers import contains_cjk
+    from .translation_service import translate_text
+    
+    item_name_original = item.get('original_name', '')
+    item_name_translated = item.get('translated_name', '')
+    item_price = item.get('price', 0)
+    
+    # 確保有原始名稱
+    if not item_name_original:
+        return None
+    
+    # 強制確保 original_name 為中文
+    if not contains_cjk(item_name_original):
+        if contains_cjk(item_name_translated):
+            # 如果 translated_name 是中文，則交換
+            item_name_original, item_name_translated = item_name_translated, item_name_original
+            print(f"🔄 交換菜名：original='{item_name_original}', translated='{item_name_translated}'")
+        else:
+            # 如果兩個都是英文，強制翻譯 original_name 為中文
+            try:
+                item_name_original = translate_text(item_name_original, 'zh', user_language)
+                print(f"🔄 強制翻譯為中文：'{item_name_original}'")
+            except Exception as e:
+                print(f"❌ 翻譯失敗：{e}")
+                # 如果翻譯失敗，跳過這個項目
+                return None
+    
+    # 如果沒有翻譯名稱，使用原始名稱
+    if not item_name_translated:
+        item_name_translated = item_name_original
+    
+    # 最終驗證：確保 original_name 包含中日韓字元
+    if not contains_cjk(item_name_original):
+        print(f"⚠️ 警告：original_name 仍不包含中日韓字元：'{item_name_original}'，跳過此項目")
+        return None
+    
+    return {
+        'id': f"temp_item_{index}",
+        'original_name': item_name_original,  # 中文原始名稱
+        'translated_name': item_name_translated,  # 翻譯後名稱
+        'price': item_price
+    }
+
+def _save_ocr_temp_result(user, user_language, store_name_original, store_name_translated, translated_items):
+    """暫存 OCR 結果，返回暫存 ID"""
+    temp_ocr_id = f"temp_ocr_{uuid.uuid4().hex[:8]}"
+    get_temp_store().set(temp_ocr_id, {
+        'user_id': user.user_id,
+        'user_language': user_language,
+        'store_name_original': store_name_original,  # 中文店名
+        'store_name_translated': store_name_translated,  # 翻譯店名
+        'items': translated_items
+    }, ttl=OCR_TEMP_TTL)
+    return temp_ocr_id
 
 @api_bp.route('/menu/process-ocr-optimized', methods=['POST', 'OPTIONS'])
 def process_menu_ocr_optimized():
@@ -4377,74 +4443,20 @@ def process_menu_ocr_optimized():
             return jsonify({"error": error_msg}), 500
         
         # 2. 處理 OCR 結果
-        from .helpers import translate_text_batch, contains_cjk
-        
         # 處理店家名稱
-        store_info = ocr_result.get('store_info', {})
-        store_name_original = store_info.get('name', '非合作店家')
-        if store_name_original and contains_cjk(store_name_original):
-            store_name_translated = translate_text_batch([store_name_original], user_language, 'zh')[0]
-        else:
-            store_name_translated = store_name_original or 'Non-partner Store'
+        store_name_original, store_name_translated = _translate_ocr_store_name(ocr_result.get('store_info', {}), user_language)
         
         # 處理菜品項目
         menu_items = ocr_result.get('menu_items', [])
         translated_items = []
         
         for item in menu_items:
-            item_name_original = item.get('original_name', '')
-            item_name_translated = item.get('translated_name', '')
-            item_price = item.get('price', 0)
-            
-            # 確保有原始名稱
-            if not item_name_original:
-                continue
-            
-            # 強制確保 original_name 為中文
-            if not contains_cjk(item_name_original):
-                if contains_cjk(item_name_translated):
-                    # 如果 translated_name 是中文，則交換
-                    item_name_original, item_name_translated = item_name_translated, item_name_original
-                    print(f"🔄 交換菜名：original='{item_name_original}', translated='{item_name_translated}'")
-                else:
-                    # 如果兩個都是英文，強制翻譯 original_name 為中文
-                    try:
-                        item_name_original = translate_text_batch([item_name_original], 'zh', user_language)[0]
-                        print(f"🔄 強制翻譯為中文：'{item_name_original}'")
-                    except Exception as e:
-                        print(f"❌ 翻譯失敗：{e}")
-                        # 如果翻譯失敗，跳過這個項目
-                        continue
-            
-            # 如果沒有翻譯名稱，使用原始名稱
-            if not item_name_translated:
-                item_name_translated = item_name_original
-            
-            # 最終驗證：確保 original_name 包含中日韓字元
-            if not contains_cjk(item_name_original):
-                print(f"⚠️ 警告：original_name 仍不包含中日韓字元：'{item_name_original}'，跳過此項目")
-                continue
-            
-            translated_items.append({
-                'id': f"temp_item_{len(translated_items) + 1}",
-                'original_name': item_name_original,  # 中文原始名稱
-                'translated_name': item_name_translated,  # 翻譯後名稱
-                'price': item_price
-            })
+            translated_item = _normalize_ocr_menu_item(item, user_language, len(translated_items) + 1)
+            if translated_item:
+                translated_items.append(translated_item)
         
-        # 3. 生成暫存 ID
-        temp_ocr_id = f"temp_ocr_{uuid.uuid4().hex[:8]}"
-        
-        # 4. 暫存結果
-        _ocr_temp_storage[temp_ocr_id] = {
-            'user_id': user.user_id,
-            'user_language': user_language,
-            'store_name_original': store_name_original,  # 中文店名
-            'store_name_translated': store_name_translated,  # 翻譯店名
-            'items': translated_items,
-            'created_at': datetime.datetime.now(),
-            'expires_at': datetime.datetime.now() + datetime.timedelta(hours=1)  # 1小時後過期
-        }
+        # 3. 生成暫存 ID 並暫存結果
+        temp_ocr_id = _save_ocr_temp_result(user, user_language, store_name_original, store_name_translated, translated_items)
         
         print(f"✅ OCR 處理完成，暫存 ID: {temp_ocr_id}")
         print(f"📋 店家: {store_name_original} → {store_name_translated}")
@@ -4466,6 +4478,106 @@ def process_menu_ocr_optimized():
         print(f"❌ OCR 處理錯誤: {e}")
         return jsonify({"error": f"OCR 處理失敗: {str(e)}"}), 500
 
+@api_bp.route('/menu/process-ocr-stream', methods=['POST', 'OPTIONS'])
+def process_menu_ocr_stream():
+    """
+    串流版的優化 OCR 處理流程（與 /menu/process-ocr-optimized 相同的輸入與暫存結果）
+    
+    每辨識完一個菜品（已確認中文菜名並翻譯）就立即送出，不必等整份結果：
+    - event: item   {"id", "original_name", "translated_name", "price"}
+    - event: done   {"ocr_menu_id", "store_name", "item_count", "partial", "elapsed_ms"}
+    - event: error  {"error"}
+    
+    預設為 SSE（text/event-stream）；?format=ndjson 或 Accept: application/x-ndjson 時改為 NDJSON，
+    每行 {"event": ..., "data": ...}。
+    """
+    # 處理 OPTIONS 預檢請求
+    if request.method == 'OPTIONS':
+        return handle_cors_preflight()
+    
+    from flask import Response, stream_with_context
+    from .helpers import stream_menu_with_gemini
+    from .ocr_stream import format_sse, format_ndjson
+    import tempfile
+    
+    if 'image' not in request.files:
+        return jsonify({"error": "沒有上傳圖片"}), 400
+    
+    file = request.files['image']
+    if file.filename == '':
+        return jsonify({"error": "沒有選擇檔案"}), 400
+    
+    line_user_id = request.form.get('line_user_id')
+    user_language = request.form.get('language', 'en')
+    
+    user = User.query.filter_by(line_user_id=line_user_id).first()
+    if not user:
+        return jsonify({"error": "找不到使用者"}), 404
+    
+    use_ndjson = request.args.get('format') == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', '')
+    encode = format_ndjson if use_ndjson else format_sse
+    
+    # 上傳檔案在回應開始前存到臨時檔，串流期間不再讀取請求內容
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
+        file.save(temp_file.name)
+        temp_file_path = temp_file.name
+    
+    print(f"🔍 開始串流 OCR 處理...")
+    print(f"📋 使用者: {user.line_user_id}, 語言: {user_language}")
+    
+    def generate():
+        started = time.time()
+        translated_items = []
+        try:
+            ocr_result = None
+            for kind, payload in stream_menu_with_gemini(temp_file_path, user_language):
+                if kind == 'result':
+                    ocr_result = payload
+                    break
+                translated_item = _normalize_ocr_menu_item(payload, user_language, len(translated_items) + 1)
+                if translated_item:
+                    if not translated_items:
+                        print(f"⏱️ 第一個菜品送出: {(time.time() - started) * 1000:.0f}ms")
+                    translated_items.append(translated_item)
+                    yield encode('item', translated_item)
+            
+            if not translated_items:
+                error_msg = (ocr_result or {}).get('error') or 'OCR 辨識失敗'
+                yield encode('error', {"error": error_msg})
+                return
+            
+            store_name_original, store_name_translated = _translate_ocr_store_name((ocr_result or {}).get('store_info', {}), user_language)
+            temp_ocr_id = _save_ocr_temp_result(user, user_language, store_name_original, store_name_translated, translated_items)
+            
+            print(f"✅ 串流 OCR 處理完成，暫存 ID: {temp_ocr_id}，菜品數量: {len(translated_items)}")
+            yield encode('done', {
+                "success": True,
+                "ocr_menu_id": temp_ocr_id,
+                "store_name": {
+                    "original": store_name_original,
+                    "translated": store_name_translated
+                },
+                "item_count": len(translated_items),
+                "partial": bool((ocr_result or {}).get('partial')),
+                "elapsed_ms": round((time.time() - started) * 1000),
+                "message": "OCR 處理完成，請選擇菜品"
+            })
+        except Exception as e:
+            print(f"❌ 串流 OCR 處理錯誤: {e}")
+            yield encode('error', {"error": f"OCR 處理失敗: {str(e)}"})
+        finally:
+            if os.path.exists(temp_file_path):
+                os.unlink(temp_file_path)
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson' if use_ndjson else 'text/event-stream'
+    )
+    # 避免代理伺服器緩衝，讓每個事件立即送達
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @api_bp.route('/orders/ocr-optimized', methods=['POST', 'OPTIONS'])
 def create_ocr_order_optimized():
     """
@@ -4497,16 +4609,10 @@ def create_ocr_order_optimized():
     try:
         # 獲取暫存的 OCR 資料
         temp_ocr_id = data.get('ocr_menu_id')
-        if temp_ocr_id not in _ocr_temp_storage:
+        ocr_data = get_temp_store().get(temp_ocr_id)
+        if ocr_data is None:
             return jsonify({"error": "OCR 資料已過期或不存在"}), 404
         
-        ocr_data = _ocr_temp_storage[temp_ocr_id]
-        
-        # 檢查是否過期
-        if datetime.datetime.now() > ocr_data['expires_at']:
-            del _ocr_temp_storage[temp_ocr_id]
-            return jsonify({"error": "OCR 資料已過期"}), 410
-        
         print(f"🔍 開始處理優化 OCR 訂單...")
         print(f"📋 暫存 ID: {temp_ocr_id}")
         print(f"📋 使用者 ID: {ocr_data['user_id']}")
@@ -4595,8 +4701,8 @@ def create_ocr_order_optimized():
         print(f"📋 order_items_data 內容: {order_items_data}")
         
         # 暫存儲存資料
-        _ocr_temp_storage[f"{temp_ocr_id}_save_data"] = save_data
-        print(f"✅ 儲存資料已暫存到 _ocr_temp_storage[{temp_ocr_id}_save_data]")
+        get_temp_store().set(f"{temp_ocr_id}_save_data", save_data, ttl=OCR_TEMP_TTL)
+        print(f"✅ 儲存資料已暫存: {temp_ocr_id}_save_data")
         
         print(f"✅ 優化 OCR 訂單處理完成")
         
@@ -4640,11 +4746,10 @@ def save_ocr_data():
     
     try:
         save_data_id = data.get('save_data_id')
-        if save_data_id not in _ocr_temp_storage:
+        save_data = get_temp_store().get(save_data_id)
+        if save_data is None:
             return jsonify({"error": "儲存資料不存在或已過期"}), 404
         
-        save_data = _ocr_temp_storage[save_data_id]
-        
         print(f"🔍 開始儲存 OCR 資料到資料庫...")
         print(f"📋 儲存資料 ID: {save_data_id}")
         print(f"📋 暫存資料內容: {save_data}")
@@ -4717,7 +4822,7 @@ def save_ocr_data():
                 print(f"✅ OrderItem {i+1} 已加入 session")
         
         # 清理暫存資料
-        del _ocr_temp_storage[save_data_id]
+        get_temp_store().delete(save_data_id)
         
         print(f"✅ OCR 資料儲存完成")
         print(f"📋 OCR 菜單 ID: {ocr_menu.ocr_menu_id}")
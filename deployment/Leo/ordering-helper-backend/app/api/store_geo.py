@@ -0,0 +1,202 @@
+# =============================================================================
+# 檔案名稱：app/api/store_geo.py
+# 功能描述：附近店家查詢的空間索引
+# 主要職責：
+# - 在記憶體中以經緯度網格索引所有店家座標，查詢時只取半徑涵蓋的網格作為候選
+# - 以 NumPy 向量化 Haversine 計算候選店家的精確距離
+# - 店家新增、修改、刪除並提交後標記索引過期，下次查詢時重建（另有 TTL 涵蓋其他程序的修改）
+# - 索引停用或建立失敗時，改以 stores(gps_lat, gps_lng) 索引做邊界框 SQL 預篩
+# =============================================================================
+
+import os
+import math
+import time
+import logging
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..models import db, Store
+from .store_index import StoreIndex, watch_model_changes
+
+logger = logging.getLogger(__name__)
+
+GEO_INDEX_ENABLED = os.getenv('GEO_INDEX_ENABLED', 'true').lower() == 'true'
+# 網格大小（度），0.05 度約 5.5 公里
+GEO_INDEX_CELL_DEG = float(os.getenv('GEO_INDEX_CELL_DEG', '0.05'))
+# 索引最長使用時間（秒），涵蓋其他程序（管理腳本、其他 worker）對店家的修改
+GEO_INDEX_TTL = int(os.getenv('GEO_INDEX_TTL', '600'))
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.radians(1) * EARTH_RADIUS_KM
+
+def haversine_km(lat, lng, lats, lngs):
+    """
+    一個點到多個點的 Haversine 距離（公里），lats / lngs 為 NumPy 陣列
+    """
+    lat1 = math.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlng = np.radians(lngs) - math.radians(lng)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def bounding_box(lat, lng, radius_km):
+    """
+    涵蓋半徑的經緯度邊界框
+
+    Returns:
+        tuple: (min_lat, max_lat, min_lng, max_lng)；靠近極點或跨越 ±180 度經線時經度取全範圍
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = lat - dlat, lat + dlat
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if max_lat >= 90 or min_lat <= -90 or cos_lat < 1e-6:
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+    dlng = radius_km / (KM_PER_DEGREE * cos_lat)
+    min_lng, max_lng = lng - dlng, lng + dlng
+    if min_lng < -180 or max_lng > 180:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, min_lng, max_lng
+
+class StoreGeoIndex(StoreIndex):
+    """店家座標的經緯度網格索引（執行緒安全，重建時整份替換）"""
+
+    label = '店家空間索引'
+
+    def __init__(self, cell_deg=GEO_INDEX_CELL_DEG, ttl=GEO_INDEX_TTL):
+        super().__init__(ttl)
+        self.cell_deg = cell_deg
+        self.total_candidates = 0
+
+    def _build_snapshot(self, rows):
+        """
+        由 (store_id, lat, lng) 建立索引
+
+        店家依網格排序後，每個網格對應陣列中連續的一段，查詢時只需切片。
+        """
+        rows = [row for row in rows if row[1] is not None and row[2] is not None]
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        lats = np.array([row[1] for row in rows], dtype=np.float64)
+        lngs = np.array([row[2] for row in rows], dtype=np.float64)
+
+        cell_rows = np.floor(lats / self.cell_deg).astype(np.int64)
+        cell_cols = np.floor(lngs / self.cell_deg).astype(np.int64)
+        order = np.lexsort((cell_cols, cell_rows))
+        ids, lats, lngs = ids[order], lats[order], lngs[order]
+        cell_rows, cell_cols = cell_rows[order], cell_cols[order]
+
+        cells = {}
+        if len(ids):
+            boundaries = np.flatnonzero((np.diff(cell_rows) != 0) | (np.diff(cell_cols) != 0)) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [len(ids)]))
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                cells[(int(cell_rows[start]), int(cell_cols[start]))] = (start, end)
+        return ids, lats, lngs, cells
+
+    def _describe(self, snapshot):
+        return f"{len(snapshot[0])} 家店、{len(snapshot[3])} 個網格"
+
+    def query(self, lat, lng, radius_km, limit=None):
+        """
+        查詢半徑內的店家
+
+        Returns:
+            list: [(store_id, 距離公里), ...] 依距離排序
+        """
+        started = time.perf_counter()
+        ids, lats, lngs, cells = self._snapshot
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+        row_range = range(math.floor(min_lat / self.cell_deg), math.floor(max_lat / self.cell_deg) + 1)
+        col_range = range(math.floor(min_lng / self.cell_deg), math.floor(max_lng / self.cell_deg) + 1)
+
+        if len(row_range) * len(col_range) > len(cells):
+            # 半徑涵蓋的網格比實際有店家的網格還多，直接檢查所有網格
+            slices = [slice(start, end) for (row, col), (start, end) in cells.items()
+                      if row in row_range and col in col_range]
+        else:
+            slices = [slice(*cells[(row, col)]) for row in row_range for col in col_range if (row, col) in cells]
+
+        if slices:
+            candidates = np.concatenate([np.arange(s.start, s.stop) for s in slices])
+        else:
+            candidates = np.empty(0, dtype=np.int64)
+        result = _nearest(ids[candidates], lats[candidates], lngs[candidates], lat, lng, radius_km, limit)
+
+        self._record_query(started)
+        with self._lock:
+            self.total_candidates += len(candidates)
+        return result
+
+    def get_stats(self):
+        stats = super().get_stats()
+        with self._lock:
+            snapshot = self._snapshot
+            stats.update({
+                'enabled': GEO_INDEX_ENABLED,
+                'stores': len(snapshot[0]) if snapshot else 0,
+                'cells': len(snapshot[3]) if snapshot else 0,
+                'cell_deg': self.cell_deg,
+                'avg_candidates': round(self.total_candidates / self.queries, 1) if self.queries else 0.0
+            })
+        return stats
+
+def _nearest(ids, lats, lngs, lat, lng, radius_km, limit):
+    """候選店家中距離在半徑內者，依距離排序"""
+    if not len(ids):
+        return []
+    distances = haversine_km(lat, lng, lats, lngs)
+    inside = np.flatnonzero(distances <= radius_km)
+    order = inside[np.argsort(distances[inside], kind='stable')]
+    if limit is not None:
+        order = order[:limit]
+    return list(zip(ids[order].tolist(), distances[order].tolist()))
+
+store_geo_index = StoreGeoIndex()
+watch_model_changes(store_geo_index, [Store], 'store_geo_changed')
+
+def _load_store_coordinates():
+    # 由主要資料庫讀取：重建通常由剛提交的異動觸發，唯讀副本可能尚未同步，
+    # 以副本重建會把舊資料標記為最新，直到 TTL 才更新
+    with Session(db.engine) as session:
+        return session.query(Store.store_id, Store.gps_lat, Store.gps_lng).filter(
+            Store.gps_lat.isnot(None), Store.gps_lng.isnot(None)
+        ).all()
+
+def _query_bounding_box(lat, lng, radius_km, limit):
+    """不使用記憶體索引：以 stores(gps_lat, gps_lng) 索引做邊界框預篩，再計算精確距離"""
+    from ..db_engine import read_query
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    rows = read_query(Store).with_entities(Store.store_id, Store.gps_lat, Store.gps_lng).filter(
+        Store.gps_lat.between(min_lat, max_lat),
+        Store.gps_lng.between(min_lng, max_lng)
+    ).all()
+    if not rows:
+        return []
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    lats = np.array([row[1] for row in rows], dtype=np.float64)
+    lngs = np.array([row[2] for row in rows], dtype=np.float64)
+    return _nearest(ids, lats, lngs, lat, lng, radius_km, limit)
+
+def find_nearby_store_ids(latitude, longitude, radius_km=10, limit=None):
+    """
+    查詢半徑內的店家
+
+    Returns:
+        list: [(store_id, 距離公里), ...] 依距離排序
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    if not GEO_INDEX_ENABLED:
+        return _query_bounding_box(latitude, longitude, radius_km, limit)
+
+    try:
+        store_geo_index.refresh(_load_store_coordinates)
+    except Exception as e:
+        logger.warning(f"店家空間索引建立失敗，改用邊界框查詢: {e}")
+        return _query_bounding_box(latitude, longitude, radius_km, limit)
+    return store_geo_index.query(latitude, longitude, radius_km, limit)
+
+def get_store_geo_stats():
+    """取得店家空間索引統計"""
+    return store_geo_index.get_stats()
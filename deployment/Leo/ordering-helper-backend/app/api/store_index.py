@@ -0,0 +1,133 @@
+# =============================================================================
+# 檔案名稱：app/api/store_index.py
+# 功能描述：店家資料記憶體索引的共用基底
+# 主要職責：
+# - 過期標記、TTL 與世代計數：重建期間若又有店家異動，重建完成後索引仍維持過期
+# - refresh(loader)：需要時才重建，同一時間只有一個執行緒重建，其他執行緒沿用舊索引或等待
+# - 建立與查詢次數、耗時統計
+# - watch_model_changes：指定的模型新增、修改、刪除並提交後標記索引過期
+# =============================================================================
+
+import time
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+class StoreIndex(ABC):
+    """
+    以整份快照替換的記憶體索引（執行緒安全）
+
+    子類別實作 _build_snapshot(data) 與 _describe(snapshot)，查詢時讀取 self._snapshot，
+    並以 _record_query(started) 記錄耗時。
+    """
+
+    # 日誌中的索引名稱
+    label = '店家索引'
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._snapshot = None
+        self._built_at = 0.0
+        self._dirty = True
+        # 每次標記過期就遞增，重建期間若有變動，重建完成後仍維持過期
+        self._generation = 0
+        self.builds = 0
+        self.last_build_ms = 0.0
+        self.queries = 0
+        self.total_query_ms = 0.0
+
+    @abstractmethod
+    def _build_snapshot(self, data):
+        """由 loader() 取得的資料建立快照"""
+
+    @abstractmethod
+    def _describe(self, snapshot):
+        """日誌用的快照摘要，例如店家數"""
+
+    def mark_dirty(self):
+        """店家資料已變更，下次查詢時重建"""
+        with self._lock:
+            self._generation += 1
+            self._dirty = True
+
+    def needs_refresh(self):
+        return self._dirty or self._snapshot is None or time.monotonic() - self._built_at > self.ttl
+
+    def build(self, data, generation=None):
+        """
+        建立並替換快照
+
+        generation 為讀取資料前的世代；讀取之後若又有 mark_dirty()，索引仍維持過期。
+        """
+        started = time.perf_counter()
+        snapshot = self._build_snapshot(data)
+        with self._lock:
+            self._snapshot = snapshot
+            self._built_at = time.monotonic()
+            self._dirty = generation is not None and generation != self._generation
+            self.builds += 1
+            self.last_build_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"{self.label}已建立: {self._describe(snapshot)}（{self.last_build_ms:.1f}ms）")
+
+    def refresh(self, loader):
+        """索引過期時以 loader() 讀取資料並重建；loader 的例外會往外拋出"""
+        if not self.needs_refresh():
+            return False
+        with self._refresh_lock:
+            if not self.needs_refresh():
+                return False
+            generation = self._generation
+            self.build(loader(), generation)
+            return True
+
+    def _record_query(self, started):
+        with self._lock:
+            self.queries += 1
+            self.total_query_ms += (time.perf_counter() - started) * 1000
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'ttl_seconds': self.ttl,
+                'dirty': self._dirty,
+                'age_seconds': round(time.monotonic() - self._built_at, 1) if self._snapshot else None,
+                'builds': self.builds,
+                'last_build_ms': round(self.last_build_ms, 3),
+                'queries': self.queries,
+                'avg_query_ms': round(self.total_query_ms / self.queries, 3) if self.queries else 0.0
+            }
+
+def watch_model_changes(index, models, info_key, on_commit=None):
+    """
+    models 新增、修改、刪除並提交後標記 index 過期（提交後才標記，避免重建時讀到尚未提交的資料）
+
+    Args:
+        info_key: 記錄在 session.info 的旗標名稱（每個索引各自一個）
+        on_commit: 標記過期之後呼叫的函數（例如遞增目錄版本）
+    """
+    def changed(mapper, connection, target):
+        session = Session.object_session(target)
+        if session is not None:
+            session.info[info_key] = True
+
+    def committed(session):
+        if session.info.pop(info_key, False):
+            index.mark_dirty()
+            if on_commit is not None:
+                on_commit()
+
+    def rolled_back(session):
+        session.info.pop(info_key, None)
+
+    for model in models:
+        for identifier in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, identifier, changed)
+    event.listen(Session, 'after_commit', committed)
+    event.listen(Session, 'after_rollback', rolled_back)
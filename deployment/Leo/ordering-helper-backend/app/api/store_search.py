@@ -0,0 +1,208 @@
+# =============================================================================
+# 檔案名稱：app/api/store_search.py
+# 功能描述：AI 店家推薦前的本地候選檢索
+# 主要職責：
+# - 以店名、評論摘要、熱門菜色與各語言翻譯摘要建立 BM25 倒排索引（中日韓文字切成單字與雙字詞）
+# - 依使用者的餐飲需求取出前 K 家候選店家（可限定距離），再交給 Gemini 排序推薦，
+#   讓提示詞大小不隨店家數成長
+# - 店家或店家翻譯異動並提交後標記索引過期，下次查詢時重建（另有 TTL 涵蓋其他程序的修改）
+# - 同時遞增店家目錄版本，供推薦快取判斷結果是否過時
+# =============================================================================
+
+import os
+import re
+import math
+import time
+import threading
+import logging
+from collections import Counter
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..models import db, Store, StoreTranslation
+from .store_index import StoreIndex, watch_model_changes
+
+logger = logging.getLogger(__name__)
+
+# 交給 Gemini 的候選店家數
+STORE_SEARCH_TOP_K = int(os.getenv('STORE_SEARCH_TOP_K', '30'))
+# 索引最長使用時間（秒）
+STORE_SEARCH_TTL = int(os.getenv('STORE_SEARCH_TTL', '600'))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 店名與熱門菜色比評論摘要更能代表店家，建立索引時重複計入
+NAME_WEIGHT = 2
+DISH_WEIGHT = 2
+
+# 中日韓文字（漢字、假名、韓文）連續片段與其他文字的單字
+_CJK_RUN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+')
+_WORD = re.compile(r'[a-z0-9]+(?:[\'-][a-z0-9]+)*')
+
+# 餐飲需求中表達意圖、不代表口味的詞（只在查詢時略過）
+QUERY_STOPWORDS = {
+    '我', '想', '要', '吃', '找', '的', '有', '請', '幫', '推', '薦', '哪', '裡', '家', '間',
+    '想吃', '想要', '我想', '推薦', '尋找', '附近', '哪裡', '什麼', '一下', '有沒', '沒有', '一家', '一間',
+    'i', 'want', 'to', 'eat', 'some', 'a', 'an', 'the', 'find', 'recommend', 'me', 'near', 'nearby', 'please', 'for'
+}
+
+def tokenize(text):
+    """
+    切詞：英數字以單字為單位（轉小寫），中日韓文字取單字與相鄰雙字詞
+
+    例如「牛肉麵」→ 牛、肉、麵、牛肉、肉麵
+    """
+    if not text:
+        return []
+    text = text.lower()
+    tokens = _WORD.findall(_CJK_RUN.sub(' ', text))
+    for run in _CJK_RUN.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+def store_document_tokens(store, summaries=()):
+    """店家的索引詞：店名與熱門菜色加權，加上評論摘要與翻譯摘要"""
+    dishes = ' '.join(dish for dish in (
+        store.top_dish_1, store.top_dish_2, store.top_dish_3, store.top_dish_4, store.top_dish_5
+    ) if dish)
+    tokens = tokenize(store.store_name) * NAME_WEIGHT + tokenize(dishes) * DISH_WEIGHT
+    tokens += tokenize(store.review_summary)
+    for summary in summaries:
+        tokens += tokenize(summary)
+    return tokens
+
+class StoreSearchIndex(StoreIndex):
+    """店家的 BM25 倒排索引（執行緒安全，重建時整份替換）"""
+
+    label = '店家檢索索引'
+
+    def __init__(self, ttl=STORE_SEARCH_TTL):
+        super().__init__(ttl)
+        self.matched_queries = 0
+
+    def _build_snapshot(self, documents):
+        """
+        由 [(store_id, partner_level, 索引詞 list), ...] 建立索引
+
+        每個詞的倒排串列事先算好 BM25 的詞頻項（不含 IDF），查詢時只需加總。
+        """
+        store_ids = np.array([doc[0] for doc in documents], dtype=np.int64)
+        partner_levels = np.array([doc[1] or 0 for doc in documents], dtype=np.int64)
+        lengths = np.array([len(doc[2]) for doc in documents], dtype=np.float64)
+        average_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+
+        postings = {}
+        for index, (_, _, tokens) in enumerate(documents):
+            for token, tf in Counter(tokens).items():
+                postings.setdefault(token, ([], []))
+                postings[token][0].append(index)
+                postings[token][1].append(tf)
+
+        count = len(documents)
+        index_postings = {}
+        for token, (indexes, tfs) in postings.items():
+            indexes = np.array(indexes, dtype=np.int64)
+            tfs = np.array(tfs, dtype=np.float64)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[indexes] / average_length)
+            idf = math.log(1 + (count - len(indexes) + 0.5) / (len(indexes) + 0.5))
+            index_postings[token] = (indexes, idf * tfs * (BM25_K1 + 1) / (tfs + norm))
+        return store_ids, partner_levels, index_postings
+
+    def _describe(self, snapshot):
+        return f"{len(snapshot[0])} 家店、{len(snapshot[2])} 個詞"
+
+    def search(self, query, top_k=STORE_SEARCH_TOP_K, allowed_ids=None):
+        """
+        依餐飲需求取出候選店家
+
+        符合的店家依分數排序（同分時合作等級高者優先）；不足 top_k 時以合作等級高的店家補滿，
+        讓 Gemini 仍有足夠的選擇。
+
+        Args:
+            allowed_ids: 限定的店家 ID（例如距離內的店家），None 表示不限定
+
+        Returns:
+            list: [(store_id, 分數), ...]
+        """
+        started = time.perf_counter()
+        store_ids, partner_levels, postings = self._snapshot
+        scores = np.zeros(len(store_ids), dtype=np.float64)
+        for token in set(tokenize(query)) - QUERY_STOPWORDS:
+            if token in postings:
+                indexes, weights = postings[token]
+                scores[indexes] += weights
+
+        eligible = np.ones(len(store_ids), dtype=bool)
+        if allowed_ids is not None:
+            eligible = np.isin(store_ids, np.fromiter(allowed_ids, dtype=np.int64))
+        candidates = np.flatnonzero(eligible)
+        # 依分數、合作等級排序（lexsort 以最後一個鍵為主鍵）
+        order = candidates[np.lexsort((-partner_levels[candidates], -scores[candidates]))][:top_k]
+        result = list(zip(store_ids[order].tolist(), scores[order].tolist()))
+
+        self._record_query(started)
+        if result and result[0][1] > 0:
+            with self._lock:
+                self.matched_queries += 1
+        return result
+
+    def get_stats(self):
+        stats = super().get_stats()
+        with self._lock:
+            snapshot = self._snapshot
+            stats.update({
+                'stores': len(snapshot[0]) if snapshot else 0,
+                'terms': len(snapshot[2]) if snapshot else 0,
+                'top_k': STORE_SEARCH_TOP_K,
+                'matched_queries': self.matched_queries
+            })
+        return stats
+
+store_search_index = StoreSearchIndex()
+# 店家目錄版本：店家或翻譯異動提交後遞增
+_catalog_version = 0
+_catalog_version_lock = threading.Lock()
+
+def _bump_catalog_version():
+    global _catalog_version
+    with _catalog_version_lock:
+        _catalog_version += 1
+
+# 先標記索引過期再遞增版本：以新版本為快取鍵的推薦一定會先重建索引
+watch_model_changes(store_search_index, [Store, StoreTranslation], 'store_search_changed',
+                    on_commit=_bump_catalog_version)
+
+def _load_store_documents():
+    # 由主要資料庫讀取：重建通常由剛提交的異動觸發，唯讀副本可能尚未同步
+    summaries = {}
+    with Session(db.engine) as session:
+        for store_id, description, translated_summary in session.query(
+            StoreTranslation.store_id, StoreTranslation.description, StoreTranslation.translated_summary
+        ).all():
+            summaries.setdefault(store_id, []).extend(text for text in (description, translated_summary) if text)
+        return [
+            (store.store_id, store.partner_level, store_document_tokens(store, summaries.get(store.store_id, ())))
+            for store in session.query(Store).all()
+        ]
+
+def search_stores(query, top_k=STORE_SEARCH_TOP_K, allowed_ids=None):
+    """
+    依餐飲需求取出候選店家 ID
+
+    Returns:
+        list: [(store_id, 分數), ...]
+    """
+    store_search_index.refresh(_load_store_documents)
+    return store_search_index.search(query, top_k, allowed_ids)
+
+def get_catalog_version():
+    """取得店家目錄版本"""
+    return _catalog_version
+
+def get_store_search_stats():
+    """取得店家檢索索引統計"""
+    stats = store_search_index.get_stats()
+    stats['catalog_version'] = _catalog_version
+    return stats
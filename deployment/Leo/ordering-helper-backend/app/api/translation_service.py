@@ -4,14 +4,23 @@
 # 主要職責：
 # - 語言碼正規化（BCP-47 到短碼轉換）
 # - 文字翻譯功能
-# - 翻譯結果快取管理
+# - 翻譯結果快取管理（L1 行程內 LRU + L2 translation_cache 資料表）
 # =============================================================================
 
 import os
+import re
+import time
+import hashlib
 import logging
-from typing import List, Optional
+import datetime
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 from flask import current_app
 
+from ..jobs import job_handler, enqueue_job
+
 def normalize_lang(lang: str) -> str:
     """
     語言碼正規化：把 BCP-47 語言碼轉換成支援的短碼
@@ -67,9 +76,219 @@ def normalize_lang(lang: str) -> str:
     # 預設回英文
     return "en"
 
+# =============================================================================
+# 翻譯快取
+# L1：行程內 LRU（含 TTL）；L2：translation_cache 資料表，多個實例共用
+# 失敗的翻譯以較短的 TTL 記在 L1（負向快取），避免 API 故障時每個請求都重試
+# =============================================================================
+
+TRANSLATION_CACHE_TTL = int(os.getenv('TRANSLATION_CACHE_TTL', str(30 * 24 * 3600)))
+TRANSLATION_NEGATIVE_TTL = int(os.getenv('TRANSLATION_NEGATIVE_TTL', '300'))
+TRANSLATION_L1_MAX_SIZE = int(os.getenv('TRANSLATION_L1_MAX_SIZE', '10000'))
+
+# 負向快取的標記值
+_NEGATIVE = object()
+
+def normalize_text(text: str) -> str:
+    """正規化快取用文字：全形轉半形、合併空白"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text)).strip()
+
+def make_cache_key(normalized_text: str, source_lang: str, target_lang: str) -> str:
+    """快取鍵：(正規化文字, 來源語言, 目標語言) 的 SHA-256"""
+    raw = f"{source_lang or ''}\x1f{target_lang}\x1f{normalized_text}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+class TranslationCache:
+    """兩層翻譯快取（執行緒安全）"""
+
+    def __init__(self, max_size: int = TRANSLATION_L1_MAX_SIZE, ttl: int = TRANSLATION_CACHE_TTL,
+                 negative_ttl: int = TRANSLATION_NEGATIVE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        # cache_key -> (翻譯或 _NEGATIVE, 到期的 monotonic 時間)
+        self._l1 = OrderedDict()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {'l1_hits': 0, 'l2_hits': 0, 'negative_hits': 0, 'misses': 0, 'api_texts': 0}
+
+    def _l1_put(self, key, value, ttl):
+        self._l1[key] = (value, time.monotonic() + ttl)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.max_size:
+            self._l1.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, object]:
+        """
+        查詢快取：先查 L1，未命中的再批次查 L2
+        
+        Returns:
+            {cache_key: 翻譯}；負向快取命中時值為 _NEGATIVE，未命中的鍵不會出現
+        """
+        found = {}
+        pending = []
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._l1.get(key)
+                if entry and entry[1] > now:
+                    self._l1.move_to_end(key)
+                    found[key] = entry[0]
+                    if entry[0] is _NEGATIVE:
+                        self.stats['negative_hits'] += 1
+                    else:
+                        self.stats['l1_hits'] += 1
+                else:
+                    if entry:
+                        del self._l1[key]
+                    pending.append(key)
+
+        if pending:
+            for key, value in self._l2_get(pending).items():
+                found[key] = value
+            with self._lock:
+                for key in pending:
+                    if key in found:
+                        self._l1_put(key, found[key], self.ttl)
+                        self.stats['l2_hits'] += 1
+                    else:
+                        self.stats['misses'] += 1
+        return found
+
+    def set_many(self, entries: Dict[str, tuple], source_lang: str, target_lang: str):
+        """寫入成功的翻譯：entries 為 {cache_key: (正規化原文, 翻譯)}"""
+        if not entries:
+            return
+        with self._lock:
+            for key, (_, translated) in entries.items():
+                self._l1_put(key, translated, self.ttl)
+            self.stats['api_texts'] += len(entries)
+        self._l2_set(entries, source_lang, target_lang)
+
+    def set_negative(self, keys: List[str]):
+        """記錄翻譯失敗，短時間內不再呼叫 API"""
+        with self._lock:
+            for key in keys:
+                self._l1_put(key, _NEGATIVE, self.negative_ttl)
+            self.stats['api_texts'] += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['l1_size'] = len(self._l1)
+        lookups = stats['l1_hits'] + stats['l2_hits'] + stats['negative_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['l1_hits'] + stats['l2_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    # L2 使用獨立的 session，避免提交或回滾呼叫端尚未提交的變更
+    def _l2_get(self, keys: List[str]) -> Dict[str, str]:
+        from sqlalchemy.orm import Session
+        from ..models import db, TranslationCacheEntry
+        try:
+            with Session(db.engine) as session:
+                rows = session.query(TranslationCacheEntry.cache_key, TranslationCacheEntry.translated_text).filter(
+                    TranslationCacheEntry.cache_key.in_(keys),
+                    TranslationCacheEntry.expires_at > datetime.datetime.utcnow()
+                ).all()
+            return {row.cache_key: row.translated_text for row in rows}
+        except Exception as e:
+            current_app.logger.warning(f"讀取翻譯快取失敗: {e}")
+            return {}
+
+    def _l2_set(self, entries: Dict[str, tuple], source_lang: str, target_lang: str):
+        from sqlalchemy.orm import Session
+        from ..models import db, TranslationCacheEntry
+        expires_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=self.ttl)
+        try:
+            with Session(db.engine) as session:
+                existing = {
+                    row.cache_key: row for row in session.query(TranslationCacheEntry).filter(
+                        TranslationCacheEntry.cache_key.in_(list(entries))
+                    ).all()
+                }
+                for key, (source_text, translated) in entries.items():
+                    row = existing.get(key)
+                    if row:
+                        row.translated_text = translated
+                        row.expires_at = expires_at
+                    else:
+                        session.add(TranslationCacheEntry(
+                            cache_key=key,
+                            source_lang=source_lang or '',
+                            target_lang=target_lang,
+                            source_text=source_text,
+                            translated_text=translated,
+                            expires_at=expires_at
+                        ))
+                session.commit()
+        except Exception as e:
+            current_app.logger.warning(f"寫入翻譯快取失敗: {e}")
+
+translation_cache = TranslationCache()
+
+def get_translation_cache_stats() -> Dict[str, object]:
+    """取得翻譯快取命中率統計"""
+    return translation_cache.snapshot()
+
+def _translate_with_cache(texts: List[str], target_lang: str, source_lang: str = "zh"):
+    """
+    經由兩層快取批次翻譯，只有未命中的文字（去重後）才呼叫 API，並依 API 上限切塊並行送出
+    
+    Returns:
+        tuple: (翻譯後的文字列表, 是否全部來自 API 或快取的成功翻譯)
+    """
+    from .helpers import translate_text_chunks, translate_text_batch_fallback
+    
+    normalized = [normalize_text(text) if text else '' for text in texts]
+    keys = [make_cache_key(n, source_lang, target_lang) if n else None for n in normalized]
+    unique = {}
+    for key, n in zip(keys, normalized):
+        if key and key not in unique:
+            unique[key] = n
+    
+    results = translation_cache.get_many(list(unique))
+    all_ok = True
+    failed = [key for key, value in results.items() if value is _NEGATIVE]
+    
+    missing = [key for key in unique if key not in results]
+    if missing:
+        current_app.logger.info(
+            f"翻譯快取未命中 {len(missing)}/{len(unique)} 個文字，呼叫翻譯 API ({source_lang}->{target_lang})"
+        )
+        try:
+            # 依 API 上限切塊並行送出，失敗的區塊對應位置為 None
+            translated = translate_text_chunks([unique[key] for key in missing], target_lang, source_lang)
+        except Exception as e:
+            current_app.logger.warning(f"批次翻譯失敗: {e}")
+            translated = [None] * len(missing)
+        
+        succeeded = {key: (unique[key], value) for key, value in zip(missing, translated) if value is not None}
+        translation_cache.set_many(succeeded, source_lang, target_lang)
+        results.update({key: value for key, (_, value) in succeeded.items()})
+        
+        newly_failed = [key for key in missing if key not in succeeded]
+        if newly_failed:
+            current_app.logger.warning(f"{len(newly_failed)} 個文字翻譯失敗，使用 fallback 並記入負向快取")
+            translation_cache.set_negative(newly_failed)
+            failed.extend(newly_failed)
+    
+    if failed:
+        all_ok = False
+        fallback = translate_text_batch_fallback([unique[key] for key in failed], target_lang, source_lang)
+        results.update(zip(failed, fallback))
+    
+    return [results[key] if key else text for key, text in zip(keys, texts)], all_ok
+
 def translate_text(text: str, target_lang: str, source_lang: str = "zh") -> str:
     """
-    翻譯單一文字
+    翻譯單一文字（經由翻譯快取）
     
     Args:
         text: 要翻譯的文字
@@ -79,13 +298,11 @@ def translate_text(text: str, target_lang: str, source_lang: str = "zh") -> str:
     Returns:
         翻譯後的文字
     """
-    if not text or target_lang.startswith("zh"):
+    if not text or (target_lang.startswith("zh") and (source_lang or "zh").startswith("zh")):
         return text
     
     try:
-        # 使用現有的批次翻譯功能
-        from .helpers import translate_text_batch
-        translated_texts = translate_text_batch([text], target_lang, source_lang)
+        translated_texts, _ = _translate_with_cache([text], target_lang, source_lang)
         return translated_texts[0] if translated_texts else text
     except Exception as e:
         current_app.logger.warning(f"翻譯失敗: {e}")
@@ -93,7 +310,7 @@ def translate_text(text: str, target_lang: str, source_lang: str = "zh") -> str:
 
 def translate_texts(texts: List[str], target_lang: str, source_lang: str = "zh") -> List[str]:
     """
-    批次翻譯文字
+    批次翻譯文字（經由翻譯快取）
     
     Args:
         texts: 要翻譯的文字列表
@@ -103,12 +320,146 @@ def translate_texts(texts: List[str], target_lang: str, source_lang: str = "zh")
     Returns:
         翻譯後的文字列表
     """
-    if not texts or target_lang.startswith("zh"):
+    if not texts or (target_lang.startswith("zh") and (source_lang or "zh").startswith("zh")):
         return texts
     
     try:
-        from .helpers import translate_text_batch
-        return translate_text_batch(texts, target_lang, source_lang)
+        translated_texts, _ = _translate_with_cache(texts, target_lang, source_lang)
+        return translated_texts
     except Exception as e:
         current_app.logger.warning(f"批次翻譯失敗: {e}")
         return texts
+
+def translate_menu_items_batch(menu_items, target_lang: str, source_lang: str = "zh") -> Dict[int, str]:
+    """
+    整份菜單批次翻譯：先讀取 menu_translations，未翻譯的菜名去重後每種語言只呼叫一次 API，
+    成功的翻譯會寫回 menu_translations，之後的瀏覽直接命中資料庫
+    
+    Args:
+        menu_items: MenuItem 物件列表
+        target_lang: 目標語言碼（已正規化）
+        source_lang: 來源語言碼（預設中文）
+    
+    Returns:
+        {menu_item_id: 翻譯後名稱}
+    """
+    translated, _ = _translate_menu_items(menu_items, target_lang, source_lang)
+    return translated
+
+def translate_store_menu(store_name: str, menu_items, target_lang: str, source_lang: str = "zh") -> Tuple[str, Dict[int, str]]:
+    """
+    店名與整份菜單一起翻譯：店名併入菜名的同一個去重批次，每個請求最多一次 API 呼叫
+    
+    Args:
+        store_name: 店家名稱
+        menu_items: MenuItem 物件列表（可為空）
+        target_lang: 目標語言碼（已正規化）
+        source_lang: 來源語言碼（預設中文）
+    
+    Returns:
+        (翻譯後店名, {menu_item_id: 翻譯後名稱})
+    """
+    translated, extra = _translate_menu_items(menu_items, target_lang, source_lang, extra_texts=[store_name])
+    return extra[0], translated
+
+def _translate_menu_items(menu_items, target_lang: str, source_lang: str = "zh",
+                          extra_texts: Optional[List[str]] = None) -> Tuple[Dict[int, str], List[str]]:
+    """
+    translate_menu_items_batch 的實作；extra_texts 會與未命中的菜名合併成同一批翻譯
+    
+    Returns:
+        ({menu_item_id: 翻譯後名稱}, extra_texts 的翻譯)
+    """
+    extra_texts = list(extra_texts or [])
+    if target_lang.startswith("zh"):
+        return {item.menu_item_id: item.item_name for item in menu_items or []}, extra_texts
+    if not menu_items:
+        return {}, translate_texts(extra_texts, target_lang, source_lang)
+    
+    from ..models import db, MenuTranslation, Language
+    
+    item_ids = [item.menu_item_id for item in menu_items]
+    translated = {}
+    try:
+        rows = MenuTranslation.query.filter(
+            MenuTranslation.menu_item_id.in_(item_ids),
+            MenuTranslation.lang_code == target_lang
+        ).all()
+        translated = {row.menu_item_id: row.description for row in rows if row.description}
+    except Exception as e:
+        current_app.logger.warning(f"讀取菜單翻譯失敗: {e}")
+    
+    missing_items = [item for item in menu_items if item.menu_item_id not in translated]
+    if not missing_items:
+        current_app.logger.info(f"菜單翻譯全部命中資料庫: {len(item_ids)} 項 ({target_lang})")
+        return translated, translate_texts(extra_texts, target_lang, source_lang)
+    
+    # 去重後經由翻譯快取，未命中的菜名依 API 上限切塊並行送出
+    unique_names = list(dict.fromkeys(item.item_name for item in missing_items if item.item_name))
+    translated_names, write_through = _translate_with_cache(unique_names + extra_texts, target_lang, source_lang)
+    name_map = dict(zip(unique_names, translated_names))
+    extra_translated = translated_names[len(unique_names):]
+    
+    current_app.logger.info(
+        f"菜單批次翻譯: {len(missing_items)} 項未命中，去重後 {len(unique_names)} 個菜名 ({target_lang})"
+    )
+    
+    new_rows = []
+    for item in missing_items:
+        translated_name = name_map.get(item.item_name, item.item_name)
+        translated[item.menu_item_id] = translated_name
+        new_rows.append(MenuTranslation(
+            menu_item_id=item.menu_item_id,
+            lang_code=target_lang,
+            description=translated_name
+        ))
+    
+    # 寫回資料庫（語言代碼必須存在於 languages 表，否則違反外鍵）
+    if write_through and new_rows:
+        try:
+            if db.session.get(Language, target_lang):
+                db.session.add_all(new_rows)
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f"寫回菜單翻譯失敗: {e}")
+    elif not write_through:
+        _enqueue_menu_translation_backfill(missing_items, target_lang, source_lang)
+    
+    return translated, extra_translated
+
+MENU_TRANSLATION_BACKFILL_JOB = 'menu_translation_backfill'
+
+def _enqueue_menu_translation_backfill(menu_items, target_lang: str, source_lang: str):
+    """翻譯 API 失敗時排入背景回填，同一組菜名每小時最多排入一次"""
+    item_ids = sorted(item.menu_item_id for item in menu_items)
+    digest = hashlib.sha256(','.join(map(str, item_ids)).encode('utf-8')).hexdigest()[:16]
+    hour = datetime.datetime.utcnow().strftime('%Y%m%d%H')
+    try:
+        enqueue_job(
+            MENU_TRANSLATION_BACKFILL_JOB,
+            {'menu_item_ids': item_ids, 'target_lang': target_lang, 'source_lang': source_lang},
+            idempotency_key=f"{MENU_TRANSLATION_BACKFILL_JOB}:{target_lang}:{digest}:{hour}"
+        )
+    except Exception as e:
+        current_app.logger.warning(f"排入菜單翻譯回填失敗: {e}")
+
+@job_handler(MENU_TRANSLATION_BACKFILL_JOB)
+def run_menu_translation_backfill(payload, job):
+    """背景工作：重新翻譯並寫回 menu_translations；仍有缺漏時拋出例外以便重試"""
+    from ..models import MenuItem, MenuTranslation, Language, db
+    
+    target_lang = payload['target_lang']
+    if not db.session.get(Language, target_lang):
+        return {'skipped': f'languages 表沒有 {target_lang}'}
+    
+    menu_items = MenuItem.query.filter(MenuItem.menu_item_id.in_(payload['menu_item_ids'])).all()
+    _translate_menu_items(menu_items, target_lang, payload.get('source_lang', 'zh'))
+    
+    stored = MenuTranslation.query.filter(
+        MenuTranslation.menu_item_id.in_(payload['menu_item_ids']),
+        MenuTranslation.lang_code == target_lang
+    ).count()
+    if stored < len(menu_items):
+        raise RuntimeError(f"菜單翻譯回填未完成: {stored}/{len(menu_items)} ({target_lang})")
+    return {'translated': stored}
@@ -0,0 +1,243 @@
+# =============================================================================
+# 檔案名稱：app/api/tts_cache.py
+# 功能描述：以內容雜湊為鍵的 TTS 音訊快取
+# 主要職責：
+# - 依 hash(正規化文字, 語音名稱, 語言代碼, 語速) 儲存 Cloud TTS 產生的 MP3，只合成一次
+# - 寫入時一併計算播放長度並存在快取檔旁（<key>.mp3.json），連同音訊一起提供給輸出檔
+# - 本機快取放在 VOICE_DIR/cache，依 LRU 與總大小淘汰；可選擇以 GCS 作為跨實例的第二層
+# - 記錄命中、未命中與淘汰次數
+# =============================================================================
+
+import os
+import re
+import shutil
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from .audio_meta import mp3_duration_ms, save_audio_meta, remove_audio_meta, meta_path
+
+logger = logging.getLogger(__name__)
+
+TTS_CACHE_MAX_BYTES = int(os.getenv('TTS_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+TTS_CACHE_MAX_FILES = int(os.getenv('TTS_CACHE_MAX_FILES', '5000'))
+# 設定後會把快取同步到 GCS（gs://<bucket>/tts-cache/<key>.mp3），新的實例可直接下載
+TTS_CACHE_GCS_BUCKET = os.getenv('TTS_CACHE_GCS_BUCKET')
+TTS_CACHE_GCS_PREFIX = 'tts-cache'
+
+def normalize_tts_text(text):
+    """正規化語音文字：全形轉半形、合併空白"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text or '')).strip()
+
+def make_tts_cache_key(text, voice_name, language_code, speaking_rate):
+    """TTS 快取鍵：(正規化文字, 語音名稱, 語言代碼, 語速) 的 SHA-256"""
+    raw = '\x1f'.join([
+        normalize_tts_text(text),
+        voice_name or '',
+        language_code or '',
+        f"{float(speaking_rate):.2f}"
+    ])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+class TTSAudioCache:
+    """本機 LRU 音訊快取（執行緒安全），可選擇以 GCS 作為第二層"""
+
+    def __init__(self, cache_dir, max_bytes=TTS_CACHE_MAX_BYTES, max_files=TTS_CACHE_MAX_FILES,
+                 gcs_bucket=TTS_CACHE_GCS_BUCKET):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.gcs_bucket = gcs_bucket
+        self._lock = threading.Lock()
+        # cache_key -> [鎖, 等待中的呼叫數]
+        self._key_locks = {}
+        # cache_key -> 檔案大小，依最近使用排序
+        self._index = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self.stats = {'hits': 0, 'gcs_hits': 0, 'misses': 0, 'evictions': 0, 'errors': 0}
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def _ensure_loaded(self):
+        """第一次使用時依檔案修改時間重建 LRU 索引（容器重啟後沿用既有檔案）"""
+        if self._loaded:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        for fn in os.listdir(self.cache_dir):
+            if not fn.endswith('.mp3'):
+                continue
+            full = os.path.join(self.cache_dir, fn)
+            try:
+                stat = os.stat(full)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, fn[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+        self._loaded = True
+        self._evict()
+
+    def _evict(self):
+        while self._index and (self._total_bytes > self.max_bytes or len(self._index) > self.max_files):
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self.stats['evictions'] += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            remove_audio_meta(self._path(key))
+
+    def _touch(self, key):
+        self._index.move_to_end(key)
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    def _add(self, key, size):
+        if key in self._index:
+            self._total_bytes -= self._index[key]
+        self._index[key] = size
+        self._total_bytes += size
+        self._index.move_to_end(key)
+        self._evict()
+
+    def get_or_create(self, key, output_filename, synthesize, estimated_duration_ms=None):
+        """
+        取得快取音訊並放到 output_filename；未命中時呼叫 synthesize() 取得 MP3 位元組
+
+        Args:
+            key: make_tts_cache_key 產生的鍵
+            output_filename: 呼叫端期望的檔案路徑（複製快取檔，輸出檔有自己的修改時間，由 cleanup_old_voice_files 清理）
+            synthesize: callable() -> bytes 或 None
+            estimated_duration_ms: 無法由 MP3 影格計算播放長度時使用的估計值
+
+        Returns:
+            bool: 是否成功取得音訊
+        """
+        # 同一個鍵同時只合成一次；以引用計數在最後一個使用者離開時釋放鍵鎖
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                return self._get_or_create_locked(key, output_filename, synthesize, estimated_duration_ms)
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._key_locks.pop(key, None)
+
+    def _get_or_create_locked(self, key, output_filename, synthesize, estimated_duration_ms):
+        with self._lock:
+            self._ensure_loaded()
+            hit = key in self._index and os.path.exists(self._path(key))
+            if hit:
+                self._touch(key)
+                self.stats['hits'] += 1
+            elif key in self._index:
+                # 檔案已被外部刪除
+                self._total_bytes -= self._index.pop(key)
+
+        if not hit:
+            audio_content = self._download_from_gcs(key)
+            if audio_content is not None:
+                with self._lock:
+                    self.stats['gcs_hits'] += 1
+            else:
+                with self._lock:
+                    self.stats['misses'] += 1
+                audio_content = synthesize()
+                if not audio_content:
+                    with self._lock:
+                        self.stats['errors'] += 1
+                    return False
+                self._upload_to_gcs(key, audio_content)
+            self._write(key, audio_content, estimated_duration_ms)
+
+        return self._export(key, output_filename)
+
+    def _write(self, key, audio_content, estimated_duration_ms=None):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as out:
+            out.write(audio_content)
+        os.replace(tmp_path, path)
+        duration_ms = mp3_duration_ms(audio_content) or estimated_duration_ms
+        if duration_ms:
+            save_audio_meta(path, duration_ms)
+        with self._lock:
+            self._add(key, len(audio_content))
+
+    def _export(self, key, output_filename):
+        source = self._path(key)
+        if os.path.abspath(source) == os.path.abspath(output_filename):
+            return True
+        if not self._copy_file(source, output_filename):
+            logger.error(f"複製快取語音檔失敗: {output_filename}")
+            return False
+        if os.path.exists(meta_path(source)):
+            self._copy_file(meta_path(source), meta_path(output_filename))
+        return True
+
+    @staticmethod
+    def _copy_file(source, target):
+        """
+        複製而不使用硬連結：硬連結與快取檔共用修改時間，命中時更新快取檔的時間會讓
+        舊的輸出檔永遠不被清理，新的輸出檔也可能沿用快取檔的舊時間而被提早刪除
+        """
+        try:
+            # 先刪除再寫入，避免寫穿舊版留下的硬連結而改到快取檔
+            if os.path.exists(target):
+                os.remove(target)
+            shutil.copyfile(source, target)
+        except OSError:
+            return False
+        return True
+
+    def _gcs_blob(self, key):
+        from ..clients import get_client
+        storage_client = get_client('storage')
+        if storage_client is None:
+            return None
+        return storage_client.bucket(self.gcs_bucket).blob(f"{TTS_CACHE_GCS_PREFIX}/{key}.mp3")
+
+    def _download_from_gcs(self, key):
+        if not self.gcs_bucket:
+            return None
+        try:
+            blob = self._gcs_blob(key)
+            if blob is None or not blob.exists():
+                return None
+            return blob.download_as_bytes()
+        except Exception as e:
+            logger.warning(f"讀取 GCS 語音快取失敗: {e}")
+            return None
+
+    def _upload_to_gcs(self, key, audio_content):
+        if not self.gcs_bucket:
+            return
+        try:
+            blob = self._gcs_blob(key)
+            if blob is not None:
+                blob.upload_from_string(audio_content, content_type='audio/mpeg')
+        except Exception as e:
+            logger.warning(f"上傳 GCS 語音快取失敗: {e}")
+
+    def get_stats(self):
+        """取得快取命中率與使用量"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['files'] = len(self._index)
+            stats['bytes'] = self._total_bytes
+            stats['max_bytes'] = self.max_bytes
+        lookups = stats['hits'] + stats['gcs_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['gcs_hits']) / lookups, 4) if lookups else 0.0
+        return stats
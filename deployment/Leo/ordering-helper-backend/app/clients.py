@@ -0,0 +1,203 @@
+# =============================================================================
+# 檔案名稱：app/clients.py
+# 功能描述：外部 API 客戶端註冊表（Cloud Translation、Gemini、Cloud TTS、Cloud Storage、LINE）
+# 主要職責：
+# - 每個行程延遲建立一次客戶端並重複使用，省去每次呼叫的通道建立、憑證載入與 TLS 交握
+# - 執行緒安全；gunicorn --preload fork 出 worker 後自動丟棄父行程建立的客戶端
+# - 記錄各客戶端的建立耗時與呼叫延遲
+# =============================================================================
+
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 這些型別的屬性值直接回傳，其餘物件（例如 client.models）會包裝以記錄其方法呼叫
+_PLAIN_TYPES = (str, bytes, int, float, bool, list, tuple, dict, set, type(None))
+
+class ClientMetrics:
+    """單一客戶端的呼叫統計（執行緒安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.created = 0
+            self.create_ms = 0.0
+            self.calls = 0
+            self.errors = 0
+            self.total_ms = 0.0
+            self.max_ms = 0.0
+
+    def record_create(self, elapsed_ms):
+        with self._lock:
+            self.created += 1
+            self.create_ms += elapsed_ms
+
+    def record_call(self, elapsed_ms, failed=False):
+        with self._lock:
+            self.calls += 1
+            if failed:
+                self.errors += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'created': self.created,
+                'create_ms': round(self.create_ms, 3),
+                'calls': self.calls,
+                'errors': self.errors,
+                'avg_ms': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+                'max_ms': round(self.max_ms, 3)
+            }
+
+class _TimedProxy:
+    """轉送屬性存取，並記錄方法呼叫的延遲"""
+
+    __slots__ = ('_target', '_metrics')
+
+    def __init__(self, target, metrics):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_metrics', metrics)
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if name.startswith('_') or isinstance(value, _PLAIN_TYPES):
+            return value
+        if callable(value):
+            metrics = self._metrics
+
+            def timed_call(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    result = value(*args, **kwargs)
+                except Exception:
+                    metrics.record_call((time.perf_counter() - started) * 1000, failed=True)
+                    raise
+                metrics.record_call((time.perf_counter() - started) * 1000)
+                return result
+
+            return timed_call
+        return _TimedProxy(value, self._metrics)
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+    def __bool__(self):
+        return True
+
+    def __repr__(self):
+        return f"<TimedProxy {self._target!r}>"
+
+class ClientRegistry:
+    """行程內共用的外部 API 客戶端"""
+
+    def __init__(self):
+        self._factories = {}
+        self._clients = {}
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def register(self, name, factory):
+        """註冊客戶端工廠；factory 回傳 None 表示目前無法建立（例如缺少環境變數），不會被快取"""
+        self._factories[name] = factory
+        self.metrics.setdefault(name, ClientMetrics())
+
+    def get(self, name):
+        """取得（必要時建立）客戶端"""
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+
+        with self._lock:
+            client = self._clients.get(name)
+            if client is not None:
+                return client
+            started = time.perf_counter()
+            raw_client = self._factories[name]()
+            if raw_client is None:
+                return None
+            self.metrics[name].record_create((time.perf_counter() - started) * 1000)
+            client = _TimedProxy(raw_client, self.metrics[name])
+            self._clients[name] = client
+            logger.info(f"已建立共用客戶端: {name}")
+            return client
+
+    def _reset_after_fork(self):
+        # gRPC 通道與 HTTP 連線不能跨 fork 共用，子行程必須重新建立
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._pid = os.getpid()
+
+    def clear(self, name=None):
+        """丟棄已建立的客戶端（例如更新憑證後）"""
+        with self._lock:
+            if name is None:
+                self._clients.clear()
+            else:
+                self._clients.pop(name, None)
+
+    def get_stats(self):
+        """取得各客戶端的建立與呼叫統計"""
+        return {
+            name: {'active': name in self._clients, **metrics.snapshot()}
+            for name, metrics in self.metrics.items()
+        }
+
+def _create_translate_client():
+    from google.cloud import translate_v3 as translate
+    return translate.TranslationServiceClient()
+
+def _create_gemini_client():
+    api_key = os.getenv('GEMINI_API_KEY')
+    if not api_key:
+        logger.warning("GEMINI_API_KEY 環境變數未設定")
+        return None
+    from google import genai
+    # HTTP 層的逾時上限：gemini_gateway 逾時後不再等待，但底層請求仍會在此時間內結束並釋放並行名額
+    timeout_ms = int(os.getenv('GEMINI_HTTP_TIMEOUT_MS', '250000'))
+    return genai.Client(api_key=api_key, http_options={'timeout': timeout_ms})
+
+def _create_tts_client():
+    from google.cloud import texttospeech
+    return texttospeech.TextToSpeechClient()
+
+def _create_storage_client():
+    from google.cloud import storage
+    return storage.Client()
+
+def _create_line_bot_api():
+    channel_access_token = os.getenv('LINE_CHANNEL_ACCESS_TOKEN')
+    if not channel_access_token:
+        logger.warning("LINE_CHANNEL_ACCESS_TOKEN 環境變數未設定")
+        return None
+    from linebot import LineBotApi
+    return LineBotApi(channel_access_token)
+
+client_registry = ClientRegistry()
+client_registry.register('translate', _create_translate_client)
+client_registry.register('gemini', _create_gemini_client)
+client_registry.register('tts', _create_tts_client)
+client_registry.register('storage', _create_storage_client)
+client_registry.register('line', _create_line_bot_api)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=client_registry._reset_after_fork)
+
+def get_client(name):
+    """取得共用客戶端：'translate'、'gemini'、'tts'、'storage' 或 'line'"""
+    return client_registry.get(name)
+
+def get_client_stats():
+    """取得各客戶端的呼叫延遲統計"""
+    return client_registry.get_stats()
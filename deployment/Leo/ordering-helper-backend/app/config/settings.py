@@ -24,6 +24,9 @@ class AppConfig:
     DB_DATABASE = os.getenv('DB_DATABASE')
     DB_PORT = os.getenv('DB_PORT', '3306')
     
+    # 唯讀副本（選用）：設定後菜單、店家等唯讀查詢會導向副本
+    DB_REPLICA_HOST = os.getenv('DB_REPLICA_HOST')
+    
     # 資料庫 SSL 設定
     DB_SSL_CA = os.getenv('DB_SSL_CA')
     DB_SSL_CERT = os.getenv('DB_SSL_CERT')
@@ -134,7 +137,10 @@ class AppConfig:
                 'host': cls.DB_HOST,
                 'database': cls.DB_DATABASE,
                 'port': cls.DB_PORT,
-                'pool_size': cls.DB_POOL_SIZE
+                'pool_size': cls.DB_POOL_SIZE,
+                'max_overflow': cls.DB_MAX_OVERFLOW,
+                'pool_recycle': cls.DB_POOL_RECYCLE,
+                'replica_host': cls.DB_REPLICA_HOST
             },
             'services': {
                 'line_bot': bool(cls.LINE_CHANNEL_ACCESS_TOKEN),
@@ -0,0 +1,182 @@
+# =============================================================================
+# 檔案名稱：app/db_engine.py
+# 功能描述：SQLAlchemy 引擎工廠與連線池監控
+# 主要職責：
+# - 依 AppConfig 的連線池與超時設定建立引擎選項（含 pre-ping）
+# - 選擇性將菜單、店家等唯讀查詢導向唯讀副本（DB_REPLICA_HOST）
+# - 記錄連線池借用等待時間與使用中連線數，供調整連線池大小
+# =============================================================================
+
+import os
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from .config.settings import AppConfig
+from .models import db
+
+REPLICA_BIND = 'replica'
+
+class PoolMetrics:
+    """連線池借用統計（執行緒安全）"""
+
+    # 等待時間分布的上界（毫秒）
+    WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.total_wait_ms = 0.0
+            self.max_wait_ms = 0.0
+            self.wait_buckets = {bucket: 0 for bucket in self.WAIT_BUCKETS_MS + ('inf',)}
+
+    def record_wait(self, wait_ms, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            bucket = next((b for b in self.WAIT_BUCKETS_MS if wait_ms <= b), 'inf')
+            self.wait_buckets[bucket] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait_ms, 3),
+                'wait_buckets_ms': {str(k): v for k, v in self.wait_buckets.items()}
+            }
+
+# 每個引擎（primary / replica）各自一份統計
+pool_metrics = {}
+
+def _instrumented_pool_class(name):
+    """建立會記錄借用等待時間的 QueuePool 子類別"""
+    metrics = pool_metrics.setdefault(name, PoolMetrics())
+
+    class InstrumentedQueuePool(QueuePool):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except Exception:
+                metrics.record_wait((time.perf_counter() - started) * 1000, timed_out=True)
+                raise
+            metrics.record_wait((time.perf_counter() - started) * 1000)
+            return connection
+
+    InstrumentedQueuePool.__name__ = f"InstrumentedQueuePool_{name}"
+    return InstrumentedQueuePool
+
+def build_mysql_url(host):
+    """依環境變數組出 MySQL 連線 URL（與 Cloud SQL 相同的 SSL 參數）"""
+    db_username = os.getenv('DB_USER')
+    db_password = os.getenv('DB_PASSWORD')
+    db_name = os.getenv('DB_DATABASE')
+    if not all([db_username, db_password, host, db_name]):
+        return None
+    return f"mysql+pymysql://{db_username}:{db_password}@{host}/{db_name}?ssl={{'ssl': {{}}}}&ssl_verify_cert=false"
+
+def build_engine_options(name='primary'):
+    """依 AppConfig 建立 MySQL 引擎選項"""
+    return {
+        'poolclass': _instrumented_pool_class(name),
+        'pool_size': AppConfig.DB_POOL_SIZE,
+        'max_overflow': AppConfig.DB_MAX_OVERFLOW,
+        'pool_timeout': AppConfig.DB_POOL_TIMEOUT,
+        'pool_recycle': AppConfig.DB_POOL_RECYCLE,
+        # Cloud SQL 會中斷閒置連線，借出前先 ping 避免閒置後第一個請求失敗或重試
+        'pool_pre_ping': True,
+        'connect_args': {
+            'connect_timeout': AppConfig.DB_CONNECT_TIMEOUT,
+            'read_timeout': AppConfig.DB_READ_TIMEOUT,
+            'write_timeout': AppConfig.DB_WRITE_TIMEOUT
+        }
+    }
+
+def configure_database(app):
+    """
+    設定 Flask-SQLAlchemy 的連線 URI、引擎選項與唯讀副本
+
+    Returns:
+        bool: 是否使用 MySQL（False 表示回退到 SQLite）
+    """
+    database_url = build_mysql_url(os.getenv('DB_HOST'))
+    if not database_url:
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
+        return False
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = build_engine_options('primary')
+
+    replica_url = build_mysql_url(os.getenv('DB_REPLICA_HOST'))
+    if replica_url:
+        app.config['SQLALCHEMY_BINDS'] = {
+            REPLICA_BIND: {'url': replica_url, **build_engine_options(REPLICA_BIND)}
+        }
+    return True
+
+# 唯讀副本的 session，生命週期與 app context 相同
+_replica_session = None
+
+def init_replica_session(app):
+    """建立唯讀副本的 scoped session，並在 app context 結束時釋放"""
+    global _replica_session
+    if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+
+    from flask.globals import app_ctx
+
+    with app.app_context():
+        engine = db.engines[REPLICA_BIND]
+    _replica_session = scoped_session(sessionmaker(bind=engine), scopefunc=lambda: id(app_ctx._get_current_object()))
+
+    @app.teardown_appcontext
+    def remove_replica_session(exception=None):
+        _replica_session.remove()
+
+def read_query(model):
+    """
+    取得唯讀查詢：有設定唯讀副本時使用副本，否則使用主要資料庫
+
+    只應用於不需要讀取剛寫入資料的查詢（例如菜單、店家資訊）。
+    """
+    if _replica_session is None:
+        return model.query
+    return _replica_session.query(model)
+
+def get_pool_stats():
+    """取得各引擎的連線池使用狀況與借用等待時間統計"""
+    engines = [('primary', db.engine)]
+    if _replica_session is not None:
+        engines.append((REPLICA_BIND, db.engines[REPLICA_BIND]))
+
+    stats = {}
+    for name, engine in engines:
+        pool = engine.pool
+        entry = {'pool_class': type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update({
+                'size': pool.size(),
+                'checked_in': pool.checkedin(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow(),
+                'max_overflow': AppConfig.DB_MAX_OVERFLOW
+            })
+        if name in pool_metrics:
+            entry.update(pool_metrics[name].snapshot())
+        stats[name] = entry
+    current_app.logger.debug(f"連線池統計: {stats}")
+    return stats
@@ -0,0 +1,334 @@
+# =============================================================================
+# 檔案名稱：app/gemini_gateway.py
+# 功能描述：所有 Gemini 呼叫的統一入口
+# 主要職責：
+# - 每次呼叫都有期限：取呼叫端指定的逾時與請求剩餘時間（contextvars 傳遞）中較短者
+# - 不使用 signal.SIGALRM，在任何執行緒（gunicorn 執行緒 worker、背景工作、分塊 OCR）都能使用
+# - 全域並行上限（semaphore），避免瞬間大量請求耗盡配額或記憶體
+# - 可選的對沖請求（hedged request）：第一個請求過慢時再送一個，取先完成者，降低尾端延遲
+# - 串流生成：逐塊回傳，每一塊的等待同樣受期限限制
+# - 依操作名稱記錄延遲、錯誤、逾時與對沖統計
+# =============================================================================
+
+import os
+import time
+import queue
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'models/gemini-2.5-flash-lite')
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '8'))
+GEMINI_DEFAULT_TIMEOUT = float(os.getenv('GEMINI_DEFAULT_TIMEOUT', '60'))
+# 對沖請求：第一個請求超過此秒數仍未完成時送出第二個（0 表示停用）
+GEMINI_HEDGE_AFTER = float(os.getenv('GEMINI_HEDGE_AFTER', '4'))
+# 每個 HTTP 請求預設的整體期限（Cloud Run 請求逾時為 300 秒）
+REQUEST_DEADLINE_SECONDS = float(os.getenv('REQUEST_DEADLINE_SECONDS', '280'))
+
+class GeminiTimeoutError(TimeoutError):
+    """Gemini 呼叫超過期限（含排隊等待並行名額的時間）"""
+
+class GeminiUnavailableError(RuntimeError):
+    """Gemini 客戶端無法建立（例如未設定 GEMINI_API_KEY）"""
+
+# 目前請求（或背景工作）的截止時間（time.monotonic()），None 表示沒有整體期限
+_deadline = contextvars.ContextVar('gemini_deadline', default=None)
+
+def set_deadline(seconds):
+    """設定目前執行脈絡的截止時間，回傳可交給 reset_deadline 的 token"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    return _deadline.set(deadline)
+
+def reset_deadline(token):
+    _deadline.reset(token)
+
+@contextmanager
+def deadline(seconds):
+    """在區塊內套用期限（不會延長外層已有的期限）"""
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        reset_deadline(token)
+
+def remaining_seconds():
+    """目前執行脈絡剩餘的秒數；沒有期限時返回 None"""
+    current = _deadline.get()
+    if current is None:
+        return None
+    return max(0.0, current - time.monotonic())
+
+def init_request_deadline(app):
+    """為每個 HTTP 請求設定整體期限，讓下游的 Gemini 呼叫不會超過請求本身的逾時"""
+    from flask import g
+
+    @app.before_request
+    def start_request_deadline():
+        g.gemini_deadline_token = set_deadline(REQUEST_DEADLINE_SECONDS)
+
+    @app.teardown_request
+    def end_request_deadline(exception=None):
+        token = g.pop('gemini_deadline_token', None)
+        if token is not None:
+            try:
+                reset_deadline(token)
+            except ValueError:
+                # token 在其他 context 建立（例如串流回應），略過
+                pass
+
+class GatewayMetrics:
+    """單一操作的呼叫統計（執行緒安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.queue_ms = 0.0
+
+    def record(self, elapsed_ms, queue_ms, error=False, timeout=False, hedged=False, hedge_won=False):
+        with self._lock:
+            self.calls += 1
+            self.errors += int(error)
+            self.timeouts += int(timeout)
+            self.hedges += int(hedged)
+            self.hedge_wins += int(hedge_won)
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            self.queue_ms += queue_ms
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'errors': self.errors,
+                'timeouts': self.timeouts,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'avg_ms': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+                'max_ms': round(self.max_ms, 3),
+                'avg_queue_ms': round(self.queue_ms / self.calls, 3) if self.calls else 0.0
+            }
+
+class GeminiGateway:
+    """以期限、並行上限與對沖請求包裝 Gemini generate_content"""
+
+    def __init__(self, max_concurrency=GEMINI_MAX_CONCURRENCY, hedge_after=GEMINI_HEDGE_AFTER):
+        self.max_concurrency = max_concurrency
+        self.hedge_after = hedge_after
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        # 呼叫本身在執行緒池中執行，呼叫端只等待到期限為止；對沖請求需要額外的執行緒
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency * 2, thread_name_prefix='gemini')
+        self._metrics_lock = threading.Lock()
+        self.metrics = {}
+        self._in_flight = 0
+
+    def _metrics(self, operation):
+        with self._metrics_lock:
+            return self.metrics.setdefault(operation, GatewayMetrics())
+
+    def _budget(self, timeout):
+        budget = timeout if timeout is not None else GEMINI_DEFAULT_TIMEOUT
+        remaining = remaining_seconds()
+        if remaining is not None:
+            budget = min(budget, remaining)
+        return budget
+
+    def _request(self, model, contents, config):
+        from .clients import get_client
+        client = get_client('gemini')
+        if client is None:
+            raise GeminiUnavailableError('Gemini API 客戶端初始化失敗，請檢查 GEMINI_API_KEY 環境變數')
+        kwargs = {'model': model, 'contents': contents}
+        if config is not None:
+            kwargs['config'] = config
+        return client, kwargs
+
+    def _call(self, model, contents, config):
+        client, kwargs = self._request(model, contents, config)
+        return client.models.generate_content(**kwargs)
+
+    def _pump_stream(self, model, contents, config, chunks, stop):
+        """在執行緒池中讀取串流，逐塊放入佇列；呼叫端離開後停止讀取"""
+        try:
+            client, kwargs = self._request(model, contents, config)
+            for chunk in client.models.generate_content_stream(**kwargs):
+                if stop.is_set():
+                    return
+                chunks.put(('chunk', chunk))
+            chunks.put(('end', None))
+        except Exception as e:
+            chunks.put(('error', e))
+
+    def _release_when_done(self, future):
+        def release(_):
+            with self._metrics_lock:
+                self._in_flight -= 1
+            self._semaphore.release()
+        future.add_done_callback(release)
+
+    def _submit(self, model, contents, config, wait_seconds, target=None, *args):
+        """取得並行名額後送出請求；名額在請求真正結束時才釋放（即使呼叫端已逾時離開）"""
+        if not self._semaphore.acquire(timeout=max(0.0, wait_seconds)):
+            return None
+        with self._metrics_lock:
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(target or self._call, model, contents, config, *args)
+        except Exception:
+            with self._metrics_lock:
+                self._in_flight -= 1
+            self._semaphore.release()
+            raise
+        self._release_when_done(future)
+        return future
+
+    def generate_content(self, contents, operation='default', config=None, model=None, timeout=None, hedge=False):
+        """
+        呼叫 Gemini generate_content
+
+        Args:
+            contents: 與 SDK 相同的 contents
+            operation: 統計用的操作名稱（例如 'menu_ocr'、'translate_text'）
+            config: 與 SDK 相同的 config
+            model: 模型名稱（預設 GEMINI_MODEL）
+            timeout: 本次呼叫的逾時秒數（預設 GEMINI_DEFAULT_TIMEOUT），會再受請求剩餘時間限制
+            hedge: 是否允許對沖請求（只適合冪等、較短的呼叫）
+
+        Returns:
+            SDK 的回應物件
+
+        Raises:
+            GeminiTimeoutError: 超過期限
+            GeminiUnavailableError: 無法建立客戶端
+        """
+        model = model or GEMINI_MODEL
+        metrics = self._metrics(operation)
+        started = time.monotonic()
+        budget = self._budget(timeout)
+        end = started + budget
+
+        primary = self._submit(model, contents, config, budget)
+        queue_ms = (time.monotonic() - started) * 1000
+        if primary is None:
+            metrics.record((time.monotonic() - started) * 1000, queue_ms, timeout=True)
+            raise GeminiTimeoutError(f"Gemini 並行名額等待逾時: {operation}")
+
+        futures = [primary]
+        hedged = False
+        try:
+            while True:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+                wait_for = remaining
+                if hedge and not hedged and self.hedge_after > 0:
+                    wait_for = min(remaining, max(0.0, started + self.hedge_after - time.monotonic()))
+                done, _ = wait(futures, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    if future.exception() is None:
+                        hedge_won = hedged and future is not primary
+                        metrics.record((time.monotonic() - started) * 1000, queue_ms, hedged=hedged, hedge_won=hedge_won)
+                        return future.result()
+                    futures.remove(future)
+                    if not futures:
+                        raise future.exception()
+
+                if hedge and not hedged and self.hedge_after > 0 and time.monotonic() - started >= self.hedge_after:
+                    # 只在有空閒名額時對沖，不與其他請求搶名額
+                    secondary = self._submit(model, contents, config, 0)
+                    hedged = True
+                    if secondary is not None:
+                        futures.append(secondary)
+                        logger.info(f"Gemini 對沖請求已送出: {operation}")
+        except Exception:
+            metrics.record((time.monotonic() - started) * 1000, queue_ms, error=True, hedged=hedged)
+            raise
+
+        metrics.record((time.monotonic() - started) * 1000, queue_ms, timeout=True, hedged=hedged)
+        raise GeminiTimeoutError(f"Gemini 呼叫逾時（{budget:.1f} 秒）: {operation}")
+
+    def generate_content_stream(self, contents, operation='default', config=None, model=None, timeout=None):
+        """
+        以串流方式呼叫 Gemini，逐塊產生 SDK 的回應物件
+
+        timeout 是整個串流的期限（同樣受請求剩餘時間限制）；串流不做對沖。
+        呼叫端提早結束迭代（例如客戶端斷線）時停止讀取，並行名額在底層請求結束後釋放。
+
+        Raises:
+            GeminiTimeoutError: 超過期限
+            GeminiUnavailableError: 無法建立客戶端
+        """
+        model = model or GEMINI_MODEL
+        metrics = self._metrics(operation)
+        started = time.monotonic()
+        budget = self._budget(timeout)
+        end = started + budget
+
+        chunks = queue.Queue()
+        stop = threading.Event()
+        future = self._submit(model, contents, config, budget, self._pump_stream, chunks, stop)
+        queue_ms = (time.monotonic() - started) * 1000
+        if future is None:
+            metrics.record((time.monotonic() - started) * 1000, queue_ms, timeout=True)
+            raise GeminiTimeoutError(f"Gemini 並行名額等待逾時: {operation}")
+
+        error = timed_out = False
+        try:
+            while True:
+                try:
+                    kind, value = chunks.get(timeout=max(0.0, end - time.monotonic()))
+                except queue.Empty:
+                    timed_out = True
+                    raise GeminiTimeoutError(f"Gemini 串流逾時（{budget:.1f} 秒）: {operation}")
+                if kind == 'end':
+                    return
+                if kind == 'error':
+                    raise value
+                yield value
+        except GeminiTimeoutError:
+            raise
+        except Exception:
+            error = True
+            raise
+        finally:
+            stop.set()
+            metrics.record((time.monotonic() - started) * 1000, queue_ms, error=error, timeout=timed_out)
+
+    def get_stats(self):
+        """取得各操作的延遲與錯誤統計"""
+        with self._metrics_lock:
+            in_flight = self._in_flight
+            operations = dict(self.metrics)
+        return {
+            'max_concurrency': self.max_concurrency,
+            'in_flight': in_flight,
+            'hedge_after_seconds': self.hedge_after,
+            'operations': {name: metrics.snapshot() for name, metrics in operations.items()}
+        }
+
+gemini_gateway = GeminiGateway()
+
+def generate_content(contents, operation='default', **kwargs):
+    """透過共用的 GeminiGateway 呼叫 Gemini（參數見 GeminiGateway.generate_content）"""
+    return gemini_gateway.generate_content(contents, operation=operation, **kwargs)
+
+def generate_content_stream(contents, operation='default', **kwargs):
+    """透過共用的 GeminiGateway 串流呼叫 Gemini（參數見 GeminiGateway.generate_content_stream）"""
+    return gemini_gateway.generate_content_stream(contents, operation=operation, **kwargs)
+
+def get_gemini_stats():
+    """取得 Gemini 呼叫統計"""
+    return gemini_gateway.get_stats()
@@ -0,0 +1,371 @@
+# =============================================================================
+# 檔案名稱：app/jobs.py
+# 功能描述：以資料庫為佇列的背景工作子系統
+# 主要職責：
+# - 將語音生成、LINE 推播、翻譯回填等工作寫入 background_jobs 表，容器重啟後不會遺失
+# - 固定數量的工作執行緒依序領取工作（並行數上限），失敗以指數退避重試
+# - 以冪等鍵避免同一工作重複排入
+# - 收到 SIGTERM 時停止領取新工作，等待執行中的工作完成（逾時則交由下次啟動回收）
+# =============================================================================
+
+import os
+import json
+import time
+import random
+import signal
+import atexit
+import socket
+import logging
+import datetime
+import threading
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .models import db, BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '2'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+JOB_BACKOFF_BASE = float(os.getenv('JOB_BACKOFF_BASE', '5'))
+JOB_BACKOFF_MAX = float(os.getenv('JOB_BACKOFF_MAX', '600'))
+# 執行中超過此時間的工作視為執行者已消失，重新排入
+JOB_LOCK_TIMEOUT = int(os.getenv('JOB_LOCK_TIMEOUT', '600'))
+# Cloud Run 在 SIGTERM 後約 10 秒強制結束
+JOB_DRAIN_TIMEOUT = float(os.getenv('JOB_DRAIN_TIMEOUT', '8'))
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+_handlers = {}
+
+def job_handler(job_type):
+    """
+    註冊工作處理函數的裝飾器
+
+    處理函數以 payload（dict）與 job（JobContext）呼叫，在 app context 中執行；
+    拋出例外即視為失敗並依退避重試，回傳值（可 JSON 序列化）會存入 result。
+    """
+    def decorator(func):
+        _handlers[job_type] = func
+        return func
+    return decorator
+
+class JobContext:
+    """傳給處理函數的工作資訊，可用於保存中間進度"""
+
+    def __init__(self, job_id, attempts, result):
+        self.job_id = job_id
+        self.attempts = attempts
+        self.result = result or {}
+
+    def save_progress(self, result):
+        """保存中間進度（重試時可由 job.result 取回，避免重複執行已完成的步驟）"""
+        self.result = result
+        with Session(db.engine) as session:
+            session.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.job_id == self.job_id)
+                .values(result=json.dumps(result, ensure_ascii=False), updated_at=_now())
+            )
+            session.commit()
+
+def _now():
+    return datetime.datetime.utcnow()
+
+def _backoff_seconds(attempts):
+    delay = min(JOB_BACKOFF_MAX, JOB_BACKOFF_BASE * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+def enqueue_job(job_type, payload, idempotency_key=None, max_attempts=None, delay_seconds=0):
+    """
+    排入背景工作
+
+    Args:
+        job_type: 已以 @job_handler 註冊的工作類型
+        payload: 可 JSON 序列化的參數
+        idempotency_key: 冪等鍵；已有相同鍵的工作時直接回傳該工作，不重複排入
+        max_attempts: 最多嘗試次數（預設 JOB_MAX_ATTEMPTS）
+        delay_seconds: 延後執行秒數
+
+    Returns:
+        int: job_id
+    """
+    job = BackgroundJob(
+        job_type=job_type,
+        payload=json.dumps(payload, ensure_ascii=False),
+        idempotency_key=idempotency_key,
+        status=STATUS_QUEUED,
+        attempts=0,
+        max_attempts=max_attempts or JOB_MAX_ATTEMPTS,
+        run_after=_now() + datetime.timedelta(seconds=delay_seconds)
+    )
+    with Session(db.engine) as session:
+        try:
+            session.add(job)
+            session.commit()
+            job_id = job.job_id
+        except IntegrityError:
+            session.rollback()
+            existing = session.query(BackgroundJob.job_id).filter_by(idempotency_key=idempotency_key).first()
+            if existing is None:
+                raise
+            logger.info(f"工作已存在，略過重複排入: {idempotency_key} -> job_id={existing.job_id}")
+            return existing.job_id
+
+    logger.info(f"📥 已排入背景工作: job_id={job_id}, type={job_type}, key={idempotency_key}")
+    if _worker_pool is not None:
+        _worker_pool.wake()
+    return job_id
+
+def get_job(job_id=None, idempotency_key=None):
+    """取得工作狀態（dict）；找不到時回傳 None"""
+    with Session(db.engine) as session:
+        if job_id is not None:
+            job = session.get(BackgroundJob, job_id)
+        else:
+            job = session.query(BackgroundJob).filter_by(idempotency_key=idempotency_key).first()
+        if job is None:
+            return None
+        return {
+            'job_id': job.job_id,
+            'job_type': job.job_type,
+            'status': job.status,
+            'attempts': job.attempts,
+            'max_attempts': job.max_attempts,
+            'run_after': job.run_after.isoformat() if job.run_after else None,
+            'last_error': job.last_error,
+            'result': json.loads(job.result) if job.result else None,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'updated_at': job.updated_at.isoformat() if job.updated_at else None
+        }
+
+class WorkerPool:
+    """固定數量的工作執行緒，從 background_jobs 表領取並執行工作"""
+
+    def __init__(self, app, workers=JOB_WORKERS, poll_interval=JOB_POLL_INTERVAL):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = threading.Event()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._active = 0
+        self._active_lock = threading.Lock()
+        self._last_recovery = 0.0
+        self.stats = {'claimed': 0, 'succeeded': 0, 'retried': 0, 'failed': 0, 'recovered': 0}
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"✅ 背景工作執行緒已啟動: {self.workers} 個 ({self.worker_id})")
+
+    def wake(self):
+        self._wakeup.set()
+
+    def drain(self, timeout=JOB_DRAIN_TIMEOUT):
+        """停止領取新工作並等待執行中的工作完成"""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        with self._active_lock:
+            remaining = self._active
+        if remaining:
+            logger.warning(f"⚠️ 仍有 {remaining} 個工作未完成，將在逾時後由下次啟動重新排入")
+        else:
+            logger.info("✅ 背景工作已全部完成")
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    self._recover_stale()
+                    claimed = self._claim()
+                if claimed is None:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+                self._execute(*claimed)
+            except Exception as e:
+                logger.exception(f"❌ 背景工作執行緒錯誤: {e}")
+                self._stopping.wait(self.poll_interval)
+
+    def _recover_stale(self):
+        # 每個行程每 30 秒檢查一次即可
+        with self._active_lock:
+            if time.monotonic() - self._last_recovery < 30:
+                return
+            self._last_recovery = time.monotonic()
+        cutoff = _now() - datetime.timedelta(seconds=JOB_LOCK_TIMEOUT)
+        with Session(db.engine) as session:
+            recovered = session.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.status == STATUS_RUNNING, BackgroundJob.locked_at < cutoff)
+                .values(status=STATUS_QUEUED, locked_by=None, locked_at=None, updated_at=_now())
+            ).rowcount
+            session.commit()
+        if recovered:
+            self.stats['recovered'] += recovered
+            logger.warning(f"♻️ 重新排入 {recovered} 個逾時的工作")
+
+    def _claim(self):
+        """以條件式 UPDATE 領取一個工作（多個實例同時領取時只有一個會成功）"""
+        with Session(db.engine) as session:
+            candidates = session.query(BackgroundJob.job_id).filter(
+                BackgroundJob.status == STATUS_QUEUED,
+                BackgroundJob.run_after <= _now()
+            ).order_by(BackgroundJob.run_after, BackgroundJob.job_id).limit(self.workers * 2).all()
+
+            for (job_id,) in candidates:
+                claimed = session.execute(
+                    update(BackgroundJob)
+                    .where(BackgroundJob.job_id == job_id, BackgroundJob.status == STATUS_QUEUED)
+                    .values(status=STATUS_RUNNING, locked_by=self.worker_id, locked_at=_now(),
+                            attempts=BackgroundJob.attempts + 1, updated_at=_now())
+                ).rowcount
+                session.commit()
+                if claimed:
+                    job = session.get(BackgroundJob, job_id)
+                    self.stats['claimed'] += 1
+                    return (job.job_id, job.job_type, job.payload, job.attempts, job.max_attempts, job.result)
+        return None
+
+    def _execute(self, job_id, job_type, payload, attempts, max_attempts, result):
+        with self._active_lock:
+            self._active += 1
+        try:
+            handler = _handlers.get(job_type)
+            context = JobContext(job_id, attempts, json.loads(result) if result else None)
+            with self.app.app_context():
+                try:
+                    if handler is None:
+                        raise RuntimeError(f"未註冊的工作類型: {job_type}")
+                    logger.info(f"▶️ 執行背景工作: job_id={job_id}, type={job_type}, attempt={attempts}/{max_attempts}")
+                    outcome = handler(json.loads(payload) if payload else {}, context)
+                    if outcome is None:
+                        outcome = context.result or None
+                    self._finish(job_id, STATUS_DONE, result=outcome)
+                    self.stats['succeeded'] += 1
+                    logger.info(f"✅ 背景工作完成: job_id={job_id}, type={job_type}")
+                except Exception as e:
+                    db.session.rollback()
+                    error = f"{type(e).__name__}: {e}"
+                    if attempts < max_attempts:
+                        delay = _backoff_seconds(attempts)
+                        self._finish(job_id, STATUS_QUEUED, error=error, run_after=_now() + datetime.timedelta(seconds=delay))
+                        self.stats['retried'] += 1
+                        logger.warning(f"🔁 背景工作失敗，{delay:.1f} 秒後重試: job_id={job_id}, type={job_type}, error={error}")
+                    else:
+                        self._finish(job_id, STATUS_FAILED, error=error)
+                        self.stats['failed'] += 1
+                        logger.error(f"❌ 背景工作重試次數用盡: job_id={job_id}, type={job_type}, error={error}")
+                finally:
+                    db.session.remove()
+        finally:
+            with self._active_lock:
+                self._active -= 1
+
+    def _finish(self, job_id, status, result=None, error=None, run_after=None):
+        values = {'status': status, 'locked_by': None, 'locked_at': None, 'updated_at': _now()}
+        if result is not None:
+            values['result'] = json.dumps(result, ensure_ascii=False)
+        if error is not None:
+            values['last_error'] = error[:2000]
+        if run_after is not None:
+            values['run_after'] = run_after
+        with Session(db.engine) as session:
+            session.execute(update(BackgroundJob).where(BackgroundJob.job_id == job_id).values(**values))
+            session.commit()
+
+    def get_stats(self):
+        with self._active_lock:
+            active = self._active
+        return {
+            'worker_id': self.worker_id,
+            'workers': self.workers,
+            'active': active,
+            'stopping': self._stopping.is_set(),
+            **self.stats
+        }
+
+_worker_pool = None
+_worker_pid = None
+_start_lock = threading.Lock()
+
+def _install_sigterm_handler():
+    """SIGTERM 時先排空背景工作，再交給原本的處理函數（例如 gunicorn）"""
+    if threading.current_thread() is not threading.main_thread():
+        return
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handle_sigterm(signum, frame):
+        logger.info("🛑 收到 SIGTERM，停止領取新的背景工作")
+        shutdown_job_queue()
+        if callable(previous):
+            previous(signum, frame)
+        elif previous == signal.SIG_DFL:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+def start_job_workers(app):
+    """在目前行程啟動工作執行緒（fork 後的每個 worker 各自啟動一次）"""
+    global _worker_pool, _worker_pid
+    with _start_lock:
+        if _worker_pool is not None and _worker_pid == os.getpid():
+            return _worker_pool
+        _worker_pool = WorkerPool(app)
+        _worker_pid = os.getpid()
+        _worker_pool.start()
+        _install_sigterm_handler()
+        return _worker_pool
+
+def shutdown_job_queue():
+    """排空並停止工作執行緒"""
+    if _worker_pool is not None and _worker_pid == os.getpid():
+        _worker_pool.drain()
+
+def init_job_queue(app):
+    """
+    註冊背景工作處理函數，並在第一個請求時於 worker 行程中啟動工作執行緒
+
+    gunicorn --preload 會在 master 建立 app 後才 fork，因此不在 create_app 中直接啟動執行緒。
+    設定 JOB_WORKERS=0 可停用（例如只負責網頁請求的實例）。
+    """
+    # 匯入各模組以註冊處理函數
+    from .api import order_jobs, translation_service  # noqa: F401
+    from . import order_rollups  # noqa: F401
+    from .webhook import routes as webhook_routes  # noqa: F401
+
+    if JOB_WORKERS <= 0:
+        return
+
+    @app.before_request
+    def ensure_job_workers():
+        if _worker_pid != os.getpid():
+            start_job_workers(app)
+
+    atexit.register(shutdown_job_queue)
+
+def get_job_queue_stats():
+    """取得佇列各狀態數量與本行程工作執行緒統計"""
+    with Session(db.engine) as session:
+        rows = session.query(BackgroundJob.status, db.func.count(BackgroundJob.job_id)).group_by(BackgroundJob.status).all()
+    return {
+        'queue': {status: count for status, count in rows},
+        'workers': _worker_pool.get_stats() if _worker_pool is not None and _worker_pid == os.getpid() else None,
+        'handlers': sorted(_handlers)
+    }
@@ -0,0 +1,599 @@
+# =============================================================================
+# 檔案名稱：app/llm_json.py
+# 功能描述：LLM（Gemini）回應的單次掃描、增量、容錯 JSON 解析
+# 主要職責：
+# - 逐段餵入文字，每個字元只掃描一次；指定路徑下的陣列元素一完成就回傳（串流 OCR 使用）
+# - 容忍程式碼區塊與前後說明文字、尾隨逗號、缺少逗號或冒號、未跳脫的引號、單引號、
+#   Python 字面值（True/False/None）以及回應被截斷
+# - 依 schema（菜單 OCR、店家推薦）驗證並轉換欄位型別，不合格的陣列元素直接略過
+# =============================================================================
+
+import re
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+class LLMJSONError(json.JSONDecodeError):
+    """無法從 LLM 回應中取得符合預期的 JSON（沿用 JSONDecodeError，既有的 except 仍適用）"""
+
+    def __init__(self, msg, doc='', pos=0):
+        super().__init__(msg, doc, pos)
+
+# 解析狀態
+(_PREAMBLE, _EXPECT_VALUE, _EXPECT_KEY, _EXPECT_COLON, _AFTER_VALUE, _STRING, _ESCAPE,
+ _UNICODE, _QUOTE_PENDING, _NUMBER, _WORD, _DONE) = range(12)
+
+_NON_SPACE = re.compile(r'\S')
+_NUMBER_CHARS = re.compile(r'[-+0-9.eE]*')
+_WORD_CHARS = re.compile(r'[\w$.\-]*')
+_STRING_STOP = {'"': re.compile(r'["\\]'), "'": re.compile(r"['\\]")}
+_SURROGATE = re.compile('[\ud800-\udfff]')
+_INTEGER = re.compile(r'-?\d+')
+_ESCAPES = {'"': '"', "'": "'", '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+_HEX_DIGITS = set('0123456789abcdefABCDEF')
+# 不加引號的字面值（含 Python 寫法）
+_WORDS = {'true': True, 'false': False, 'null': None, 'True': True, 'False': False, 'None': None}
+
+def _to_number(raw):
+    """轉換數字字串；無法轉換時嘗試去掉結尾雜訊，最後保留原字串"""
+    for candidate in (raw, raw.rstrip('.eE+-')):
+        try:
+            return int(candidate) if _INTEGER.fullmatch(candidate) else float(candidate)
+        except ValueError:
+            continue
+    return raw
+
+class TolerantJSONParser:
+    """
+    增量容錯 JSON 解析器
+
+    用法：
+        parser = TolerantJSONParser(stream_paths=[('menu_items',)])
+        for chunk in chunks:
+            for path, element in parser.feed(chunk):
+                ...  # menu_items 陣列中已完成的元素
+        value = parser.close()
+
+    路徑以物件鍵名組成，陣列內層以 '*' 表示，例如 ('menu_items',)、('a', '*', 'b')。
+    回應被截斷時，未完成的陣列元素會被捨棄（不會以缺欄位的狀態出現），未完成的物件則保留已解析的欄位。
+    repairs 記錄實際套用過的修復，方便統計模型輸出的品質。
+    """
+
+    def __init__(self, stream_paths=(), root='{['):
+        self._stream_paths = {tuple(path) for path in stream_paths}
+        self._root_chars = re.compile('[' + re.escape(root) + ']')
+        self._mode = _PREAMBLE
+        self._stack = []
+        self._root = None
+        self._has_root = False
+        self._closed = False
+        self._events = []
+        self._comma = False
+        # 字串與記號的暫存
+        self._quote = '"'
+        self._buffer = []
+        self._is_key = False
+        self._hex = ''
+        self._pending_space = ''
+        self.repairs = set()
+
+    @property
+    def done(self):
+        """最外層的值是否已完整結束"""
+        return self._mode == _DONE
+
+    def feed(self, chunk):
+        """
+        餵入一段文字
+
+        Returns:
+            list: [(path, element), ...] 這段文字中完成的串流路徑陣列元素
+        """
+        if self._closed:
+            raise LLMJSONError('解析器已關閉')
+        events = self._events = []
+        if not chunk:
+            return events
+        text = chunk
+        index = 0
+        length = len(text)
+        while index < length:
+            mode = self._mode
+            if mode == _STRING:
+                index = self._scan_string(text, index)
+            elif mode == _NUMBER or mode == _WORD:
+                index = self._scan_token(text, index)
+            elif mode == _ESCAPE:
+                index = self._scan_escape(text, index)
+            elif mode == _UNICODE:
+                index = self._scan_unicode(text, index)
+            elif mode == _QUOTE_PENDING:
+                index = self._scan_quote_pending(text, index)
+            elif mode == _PREAMBLE:
+                index = self._scan_preamble(text, index)
+            elif mode == _DONE:
+                if text[index:].strip():
+                    self.repairs.add('trailing_text')
+                break
+            else:
+                match = _NON_SPACE.search(text, index)
+                if not match:
+                    break
+                index = self._structural(text[match.start()], match.start())
+        return events
+
+    def close(self):
+        """
+        結束輸入並返回解析結果；回應被截斷時補齊未關閉的字串與容器
+
+        Raises:
+            LLMJSONError: 文字中沒有任何 JSON 結構
+        """
+        if self._closed:
+            return self._root
+        self._events = []
+        mode = self._mode
+        if mode in (_STRING, _ESCAPE, _UNICODE):
+            self.repairs.add('truncated')
+            if mode == _UNICODE:
+                self._buffer.append('\\u' + self._hex)
+            self._finish_string()
+        elif mode == _QUOTE_PENDING:
+            self._finish_string()
+        elif mode in (_NUMBER, _WORD):
+            self._finish_token()
+
+        while self._stack:
+            self.repairs.add('truncated')
+            container = self._stack.pop()[0]
+            if not self._stack:
+                self._root = container
+            elif self._stack[-1][1]:
+                parent = self._stack[-1]
+                if parent[3] is not None:
+                    parent[0][parent[3]] = container
+                parent[3] = None
+            # 父層是陣列：未完成的元素直接捨棄
+
+        self._closed = True
+        if not self._has_root:
+            raise LLMJSONError('回應中沒有找到有效的 JSON 結構')
+        self._mode = _DONE
+        return self._root
+
+    # ------------------------------------------------------------------
+    # 結構字元
+    # ------------------------------------------------------------------
+
+    def _scan_preamble(self, text, index):
+        match = self._root_chars.search(text, index)
+        if not match:
+            if text[index:].strip():
+                self.repairs.add('preamble')
+            return len(text)
+        if text[index:match.start()].strip():
+            # 程式碼區塊標記（```json）或模型的說明文字
+            self.repairs.add('preamble')
+        self._has_root = True
+        self._push(text[match.start()] == '{')
+        return match.end()
+
+    def _structural(self, char, index):
+        mode = self._mode
+        if mode == _AFTER_VALUE:
+            if char == ',':
+                self._comma = True
+                self._mode = _EXPECT_KEY if self._stack[-1][1] else _EXPECT_VALUE
+                return index + 1
+            if char in '}]':
+                self._close_container(char == '}')
+                return index + 1
+            if char in '{["\'':
+                # 兩個值之間缺少逗號：補上後重新處理這個字元
+                self.repairs.add('missing_comma')
+                self._mode = _EXPECT_KEY if self._stack[-1][1] else _EXPECT_VALUE
+                return index
+            return index + 1
+
+        if mode == _EXPECT_KEY:
+            if char in '"\'':
+                return self._start_string(char, index, is_key=True)
+            if char in '}]':
+                self._close_empty_or_trailing(char == '}')
+                return index + 1
+            if char.isalpha() or char == '_':
+                self.repairs.add('bare_key')
+                return self._start_token(_WORD, index, is_key=True)
+            if char in '{[':
+                # 沒有鍵名的值：照常解析以維持巢狀層級，完成後捨棄
+                self._stack[-1][3] = None
+                self._mode = _EXPECT_VALUE
+                return index
+            return index + 1
+
+        if mode == _EXPECT_COLON:
+            if char == ':':
+                self._mode = _EXPECT_VALUE
+                return index + 1
+            if char == '}':
+                # 只有鍵名沒有值
+                self._stack[-1][3] = None
+                self._close_container(True)
+                return index + 1
+            if char == ',':
+                self._stack[-1][3] = None
+                self._mode = _EXPECT_KEY
+                return index + 1
+            if char in '{["\'-' or char.isalnum():
+                self.repairs.add('missing_colon')
+                self._mode = _EXPECT_VALUE
+                return index
+            return index + 1
+
+        # _EXPECT_VALUE
+        if char == '{' or char == '[':
+            self._comma = False
+            self._push(char == '{')
+            return index + 1
+        if char in '"\'':
+            return self._start_string(char, index, is_key=False)
+        if char in '-+.' or char.isdigit():
+            return self._start_token(_NUMBER, index, is_key=False)
+        if char.isalpha() or char == '_':
+            return self._start_token(_WORD, index, is_key=False)
+        if char in '}]':
+            self._close_empty_or_trailing(char == '}')
+        return index + 1
+
+    def _push(self, is_object):
+        container = {} if is_object else []
+        if self._stack:
+            parent = self._stack[-1]
+            path = parent[2] + ((parent[3] if parent[1] else '*'),)
+        else:
+            path = ()
+        # [容器, 是否為物件, 路徑, 目前的鍵名]
+        self._stack.append([container, is_object, path, None])
+        self._mode = _EXPECT_KEY if is_object else _EXPECT_VALUE
+
+    def _close_empty_or_trailing(self, is_object):
+        if self._comma:
+            self.repairs.add('trailing_comma')
+        self._close_container(is_object)
+
+    def _close_container(self, is_object):
+        self._comma = False
+        stack = self._stack
+        for depth in range(len(stack) - 1, -1, -1):
+            if stack[depth][1] == is_object:
+                if depth != len(stack) - 1:
+                    self.repairs.add('mismatched_bracket')
+                while len(stack) > depth:
+                    self._emit(stack.pop()[0])
+                return
+        # 沒有對應的左括號：忽略
+
+    def _emit(self, value):
+        """一個值完成：放入父層容器；父層是串流路徑的陣列時記錄事件"""
+        stack = self._stack
+        if not stack:
+            self._root = value
+            self._mode = _DONE
+            return
+        parent = stack[-1]
+        if parent[1]:
+            if parent[3] is not None:
+                parent[0][parent[3]] = value
+            parent[3] = None
+        else:
+            parent[0].append(value)
+            if parent[2] in self._stream_paths:
+                self._events.append((parent[2], value))
+        self._mode = _AFTER_VALUE
+
+    # ------------------------------------------------------------------
+    # 字串
+    # ------------------------------------------------------------------
+
+    def _start_string(self, quote, index, is_key):
+        if quote == "'":
+            self.repairs.add('single_quote')
+        self._comma = False
+        self._quote = quote
+        self._buffer = []
+        self._is_key = is_key
+        self._mode = _STRING
+        return index + 1
+
+    def _scan_string(self, text, index):
+        match = _STRING_STOP[self._quote].search(text, index)
+        if not match:
+            self._buffer.append(text[index:])
+            return len(text)
+        stop = match.start()
+        if stop > index:
+            self._buffer.append(text[index:stop])
+        if text[stop] == '\\':
+            self._mode = _ESCAPE
+        else:
+            # 引號可能是字串結尾，也可能是模型沒有跳脫的引號，看下一個非空白字元再決定
+            self._pending_space = ''
+            self._mode = _QUOTE_PENDING
+        return stop + 1
+
+    def _scan_escape(self, text, index):
+        char = text[index]
+        if char == 'u':
+            self._hex = ''
+            self._mode = _UNICODE
+        elif char in _ESCAPES:
+            self._buffer.append(_ESCAPES[char])
+            self._mode = _STRING
+        else:
+            self.repairs.add('invalid_escape')
+            self._buffer.append('\\' + char)
+            self._mode = _STRING
+        return index + 1
+
+    def _scan_unicode(self, text, index):
+        length = len(text)
+        while len(self._hex) < 4 and index < length and text[index] in _HEX_DIGITS:
+            self._hex += text[index]
+            index += 1
+        if len(self._hex) == 4:
+            self._buffer.append(chr(int(self._hex, 16)))
+            self._mode = _STRING
+        elif index < length:
+            self.repairs.add('invalid_escape')
+            self._buffer.append('\\u' + self._hex)
+            self._mode = _STRING
+        return index
+
+    def _scan_quote_pending(self, text, index):
+        match = _NON_SPACE.search(text, index)
+        if not match:
+            self._pending_space += text[index:]
+            return len(text)
+        char = text[match.start()]
+        closers = ':,}' if self._is_key else ',}]' + self._quote
+        if char in closers:
+            self._finish_string()
+        else:
+            self.repairs.add('unescaped_quote')
+            self._buffer.append(self._quote + self._pending_space + text[index:match.start()])
+            self._mode = _STRING
+        return match.start()
+
+    def _finish_string(self):
+        value = ''.join(self._buffer)
+        self._buffer = []
+        if _SURROGATE.search(value):
+            value = value.encode('utf-16', 'surrogatepass').decode('utf-16', 'replace')
+        if self._is_key:
+            if self._stack and self._stack[-1][1]:
+                self._stack[-1][3] = value
+            self._mode = _EXPECT_COLON
+        else:
+            self._emit(value)
+
+    # ------------------------------------------------------------------
+    # 數字與不加引號的字面值
+    # ------------------------------------------------------------------
+
+    def _start_token(self, mode, index, is_key):
+        self._comma = False
+        self._buffer = []
+        self._is_key = is_key
+        self._mode = mode
+        return index
+
+    def _scan_token(self, text, index):
+        pattern = _NUMBER_CHARS if self._mode == _NUMBER else _WORD_CHARS
+        end = pattern.match(text, index).end()
+        self._buffer.append(text[index:end])
+        if end < len(text):
+            self._finish_token()
+        return end
+
+    def _finish_token(self):
+        raw = ''.join(self._buffer)
+        self._buffer = []
+        if self._mode == _NUMBER:
+            self._emit(_to_number(raw))
+        elif self._is_key:
+            self._stack[-1][3] = raw
+            self._mode = _EXPECT_COLON
+        else:
+            if raw not in _WORDS:
+                self.repairs.add('bare_word')
+            self._emit(_WORDS.get(raw, raw))
+
+# =============================================================================
+# Schema 驗證（JSON Schema 的小子集：type / properties / required / items / nullable / default）
+# =============================================================================
+
+_INVALID = object()
+_NUMBER_IN_TEXT = re.compile(r'-?\d[\d,]*(?:\.\d+)?')
+
+def _coerce(value, schema, path, errors):
+    expected = schema.get('type')
+    if value is None:
+        if 'default' in schema:
+            return schema['default']
+        if schema.get('nullable') or expected is None:
+            return None
+        errors.append(f"{path}: 不可為 null")
+        return _INVALID
+
+    if expected == 'object':
+        if not isinstance(value, dict):
+            errors.append(f"{path}: 應為物件")
+            return _INVALID
+        result = dict(value)
+        for key, field_schema in schema.get('properties', {}).items():
+            if key not in result:
+                if 'default' in field_schema:
+                    result[key] = field_schema['default']
+                continue
+            coerced = _coerce(result[key], field_schema, f"{path}.{key}", errors)
+            if coerced is _INVALID:
+                del result[key]
+            else:
+                result[key] = coerced
+        missing = [key for key in schema.get('required', ()) if key not in result]
+        if missing:
+            errors.append(f"{path}: 缺少必要欄位 {', '.join(missing)}")
+            return _INVALID
+        return result
+
+    if expected == 'array':
+        if not isinstance(value, list):
+            errors.append(f"{path}: 應為陣列")
+            return _INVALID
+        item_schema = schema.get('items')
+        if not item_schema:
+            return value
+        result = []
+        for position, element in enumerate(value):
+            coerced = _coerce(element, item_schema, f"{path}[{position}]", errors)
+            if coerced is not _INVALID:
+                result.append(coerced)
+        return result
+
+    if expected == 'string':
+        if isinstance(value, str):
+            return value
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        errors.append(f"{path}: 應為字串")
+        return _INVALID
+
+    if expected in ('number', 'integer'):
+        number = value
+        if isinstance(value, str):
+            # 「$68」「NT$1,200」「68元」
+            match = _NUMBER_IN_TEXT.search(value)
+            number = _to_number(match.group(0).replace(',', '')) if match else None
+        if isinstance(number, bool) or not isinstance(number, (int, float)):
+            if 'default' in schema:
+                return schema['default']
+            errors.append(f"{path}: 應為數字")
+            return _INVALID
+        if expected == 'integer' or (isinstance(number, float) and number.is_integer()):
+            return int(round(number))
+        return number
+
+    if expected == 'boolean':
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.lower() in ('true', 'false'):
+            return value.lower() == 'true'
+        errors.append(f"{path}: 應為布林值")
+        return _INVALID
+
+    return value
+
+def validate_schema(value, schema, path='$'):
+    """
+    依 schema 驗證並轉換型別
+
+    不合格的欄位會被移除（有 default 時改用預設值），不合格的陣列元素會被略過。
+
+    Returns:
+        tuple: (轉換後的值, 錯誤訊息 list)
+
+    Raises:
+        LLMJSONError: 最外層的值不符合 schema
+    """
+    errors = []
+    result = _coerce(value, schema, path, errors)
+    if result is _INVALID:
+        raise LLMJSONError(f"JSON 不符合預期格式: {'; '.join(errors)}")
+    return result, errors
+
+MENU_ITEM_SCHEMA = {
+    'type': 'object',
+    'required': ['original_name'],
+    'properties': {
+        'original_name': {'type': 'string'},
+        'translated_name': {'type': 'string', 'nullable': True},
+        'price': {'type': 'number', 'default': 0},
+        'description': {'type': 'string', 'nullable': True},
+        'category': {'type': 'string', 'nullable': True}
+    }
+}
+
+MENU_OCR_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'success': {'type': 'boolean', 'nullable': True},
+        'menu_items': {'type': 'array', 'items': MENU_ITEM_SCHEMA, 'default': []},
+        'store_info': {
+            'type': 'object',
+            'nullable': True,
+            'properties': {
+                'name': {'type': 'string', 'nullable': True},
+                'address': {'type': 'string', 'nullable': True},
+                'phone': {'type': 'string', 'nullable': True}
+            }
+        },
+        'processing_notes': {'type': 'string', 'nullable': True}
+    }
+}
+
+RECOMMENDATION_SCHEMA = {
+    'type': 'object',
+    'required': ['recommendations'],
+    'properties': {
+        'recommendations': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'required': ['store_name'],
+                'properties': {
+                    'store_id': {'type': 'integer', 'nullable': True},
+                    'store_name': {'type': 'string'},
+                    'partner_level': {'type': 'integer', 'default': 0},
+                    'reason': {'type': 'string', 'default': ''},
+                    'matched_keywords': {'type': 'array', 'items': {'type': 'string'}, 'default': []},
+                    'estimated_rating': {'type': 'string', 'nullable': True}
+                }
+            }
+        },
+        'analysis': {'type': 'object', 'nullable': True}
+    }
+}
+
+_DECODER = json.JSONDecoder()
+
+def parse_llm_json(text, schema=None):
+    """
+    解析 LLM 回應中的 JSON，有 schema 時一併驗證
+
+    格式正確的回應（大多數情況）直接以 C 實作的 json 解碼；失敗時才以容錯解析器單次掃描。
+
+    Raises:
+        LLMJSONError: 找不到 JSON 或不符合 schema
+    """
+    text = text or ''
+    root = {'object': '{', 'array': '['}.get((schema or {}).get('type'), '{[')
+    value = _INVALID
+    start = re.search('[' + re.escape(root) + ']', text)
+    if start:
+        try:
+            value, _ = _DECODER.raw_decode(text, start.start())
+        except json.JSONDecodeError:
+            pass
+    if value is _INVALID:
+        parser = TolerantJSONParser(root=root)
+        parser.feed(text)
+        value = parser.close()
+        if parser.repairs:
+            logger.info(f"LLM JSON 已修復: {', '.join(sorted(parser.repairs))}")
+    if schema is None:
+        return value
+    value, errors = validate_schema(value, schema)
+    if errors:
+        logger.info(f"LLM JSON 略過不合格欄位 {len(errors)} 個: {errors[:3]}")
+    return value
@@ -12,6 +12,11 @@
 # - 訂單管理：Order, OrderItem
 # - 語音檔案：VoiceFile
 # - AI 處理：GeminiProcessing
+# - 翻譯快取：TranslationCacheEntry
+# - 背景工作：BackgroundJob
+# - 暫存狀態：TempState
+# - OCR 快取：OCRResultCacheEntry
+# - 訂單統計：OrderDailyRollup
 # =============================================================================
 
 from flask_sqlalchemy import SQLAlchemy
@@ -97,6 +102,10 @@ class Store(db.Model):
     longitude = db.Column(db.Numeric(11,8))  # 店家經度（向後相容）
     menus = db.relationship('Menu', backref='store', lazy=True)
 
+    __table_args__ = (
+        db.Index('idx_stores_gps', 'gps_lat', 'gps_lng'),  # 附近店家的邊界框查詢
+    )
+
 class StoreTranslation(db.Model):
     __tablename__ = 'store_translations'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -142,6 +151,12 @@ class Order(db.Model):
     status = db.Column(db.String(20), default='pending')  # pending, completed, cancelled
     items = db.relationship('OrderItem', backref='order', lazy=True, cascade="all, delete-orphan")
     voice_files = db.relationship('VoiceFile', backref='order', lazy=True, cascade="all, delete-orphan")
+    store = db.relationship('Store', lazy=True)
+
+    __table_args__ = (
+        db.Index('idx_orders_user_time', 'user_id', 'order_time', 'order_id'),  # 訂單記錄的 keyset 分頁
+        db.Index('idx_orders_order_time', 'order_time'),  # 每日彙總與後台最近訂單
+    )
 
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
@@ -156,6 +171,7 @@ class OrderItem(db.Model):
     translated_name = db.Column(db.String(100), nullable=True)  # 翻譯菜名（使用者語言）
     
     created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+    menu_item = db.relationship('MenuItem', lazy=True)
 
 class VoiceFile(db.Model):
     __tablename__ = 'voice_files'
@@ -246,3 +262,142 @@ class OrderSummary(db.Model):
     
     def __repr__(self):
         return f'<OrderSummary {self.summary_id}>'
+
+# =============================================================================
+# 翻譯快取模型區塊
+# 功能：跨實例共用的翻譯結果快取（translation_service 的第二層快取）
+# 欄位：
+# - cache_key：正規化文字 + 來源語言 + 目標語言的 SHA-256
+# - expires_at：到期時間，過期後視為未命中並重新翻譯
+# =============================================================================
+class TranslationCacheEntry(db.Model):
+    """翻譯結果快取模型"""
+    __tablename__ = 'translation_cache'
+    
+    cache_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    cache_key = db.Column(db.String(64), nullable=False, unique=True)
+    source_lang = db.Column(db.String(10), nullable=False)
+    target_lang = db.Column(db.String(10), nullable=False)
+    source_text = db.Column(db.Text, nullable=False)
+    translated_text = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+    
+    def __repr__(self):
+        return f'<TranslationCacheEntry {self.cache_key[:8]} {self.source_lang}->{self.target_lang}>'
+
+# =============================================================================
+# 背景工作模型區塊
+# 功能：持久化的背景工作佇列（語音生成、LINE 推播、翻譯回填）
+# 欄位：
+# - idempotency_key：冪等鍵，同一鍵只會排入一次
+# - status：queued / running / done / failed
+# - run_after：最早可執行時間（重試退避）
+# - locked_by / locked_at：領取工作的行程與時間，逾時視為執行者已消失
+# =============================================================================
+class BackgroundJob(db.Model):
+    """背景工作模型"""
+    __tablename__ = 'background_jobs'
+    
+    job_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    job_type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    idempotency_key = db.Column(db.String(128), unique=True, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, nullable=False)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    result = db.Column(db.Text)  # JSON
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+    updated_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+    
+    __table_args__ = (
+        db.Index('idx_background_jobs_status_run_after', 'status', 'run_after'),
+    )
+    
+    def __repr__(self):
+        return f'<BackgroundJob {self.job_id} {self.job_type} {self.status}>'
+
+# =============================================================================
+# 暫存狀態模型區塊
+# 功能：跨 worker / 實例共用的 OCR 暫存結果與待儲存資料（由 app/temp_store.py 管理）
+# 欄位：
+# - state_key：暫存鍵（例如 temp_ocr_xxxxxxxx）
+# - value：序列化後的內容（JSON，可能以 zlib 壓縮）
+# - size_bytes：value 大小，用於總容量限制
+# - expires_at：到期時間（UTC）
+# =============================================================================
+class TempState(db.Model):
+    """暫存狀態模型"""
+    __tablename__ = 'temp_states'
+    
+    state_key = db.Column(db.String(128), primary_key=True)
+    value = db.Column(db.LargeBinary(length=16777215), nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+    
+    def __repr__(self):
+        return f'<TempState {self.state_key}>'
+
+# =============================================================================
+# OCR 結果快取模型區塊
+# 功能：重複拍攝的同一份菜單直接使用先前的 Gemini 解析結果（由 app/api/ocr_cache.py 管理）
+# 欄位：
+# - image_hash：正規化照片的 256 位元差異雜湊（十六進位），以漢明距離篩選候選
+# - thumbnail：64x64 灰階縮圖，確認候選是否為同一份菜單
+# - target_lang：翻譯目標語言，不同語言各自快取
+# - result：process_menu_with_gemini 的解析結果（JSON）
+# - hits：命中次數
+# =============================================================================
+class OCRResultCacheEntry(db.Model):
+    """OCR 結果快取模型"""
+    __tablename__ = 'ocr_result_cache'
+    
+    cache_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    image_hash = db.Column(db.String(64), nullable=False)
+    thumbnail = db.Column(db.LargeBinary, nullable=False)
+    target_lang = db.Column(db.String(10), nullable=False)
+    result = db.Column(db.Text(length=16777215), nullable=False)  # JSON
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+    
+    __table_args__ = (
+        db.Index('idx_ocr_result_cache_lang_expires', 'target_lang', 'expires_at'),
+    )
+    
+    def __repr__(self):
+        return f'<OCRResultCacheEntry {self.cache_id} {self.target_lang}>'
+
+# =============================================================================
+# 訂單每日彙總模型區塊
+# 功能：後台訂單統計與報表的彙總資料（由 app/order_rollups.py 維護），查詢成本與天數成正比
+# 欄位：
+# - rollup_date / store_id / language_code：彙總維度（日期、店家、使用者語言）
+# - order_count / revenue：訂單數與營收（total_amount 加總）
+# - last_order_id：此列已計入的最大訂單 ID，用來找出尚未彙總的新訂單
+# =============================================================================
+class OrderDailyRollup(db.Model):
+    """訂單每日彙總模型"""
+    __tablename__ = 'order_daily_rollups'
+    
+    rollup_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    rollup_date = db.Column(db.Date, nullable=False)
+    store_id = db.Column(db.Integer, nullable=False)
+    language_code = db.Column(db.String(10), nullable=False, default='')
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.BigInteger, nullable=False, default=0)
+    last_order_id = db.Column(db.BigInteger, nullable=False, default=0, index=True)
+    updated_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+    
+    __table_args__ = (
+        db.UniqueConstraint('rollup_date', 'store_id', 'language_code', name='uk_order_daily_rollups'),
+    )
+    
+    def __repr__(self):
+        return f'<OrderDailyRollup {self.rollup_date} store={self.store_id} {self.language_code}>'
@@ -0,0 +1,234 @@
+# =============================================================================
+# 檔案名稱：app/order_rollups.py
+# 功能描述：訂單每日彙總（order_daily_rollups）的維護與查詢
+# 主要職責：
+# - 以 (日期, 店家, 使用者語言) 彙總訂單數與營收，後台統計只需讀取彙總表，成本與天數成正比
+# - ORM 新增、修改、刪除訂單並提交後，以背景工作重新彙總受影響的日期（同一時間窗內合併為一個工作）
+# - 讀取統計前掃描尚未彙總的新訂單（例如以原生 SQL 建立的訂單），只重新彙總這些訂單所在的日期
+# - 每一天的彙總都是由訂單重新計算後整批替換，重複執行結果相同
+# =============================================================================
+
+import os
+import time
+import logging
+import datetime
+import threading
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from .models import db, Order, User, Store, OrderDailyRollup
+from .jobs import job_handler, enqueue_job
+
+logger = logging.getLogger(__name__)
+
+# 讀取統計前掃描新訂單的最短間隔（秒）
+ORDER_ROLLUP_SWEEP_INTERVAL = int(os.getenv('ORDER_ROLLUP_SWEEP_INTERVAL', '30'))
+# 掃描時往回多看的訂單 ID 數，涵蓋較早取得 ID 但較晚提交的交易
+ORDER_ROLLUP_SWEEP_LOOKBACK = int(os.getenv('ORDER_ROLLUP_SWEEP_LOOKBACK', '200'))
+# ORM 訂單異動後延後彙總的秒數，同一時間窗內的異動合併為一個背景工作
+ORDER_ROLLUP_JOB_DELAY = int(os.getenv('ORDER_ROLLUP_JOB_DELAY', '30'))
+
+ORDER_ROLLUP_JOB = 'order_rollup_refresh'
+
+_sweep_lock = threading.Lock()
+_last_sweep = 0.0
+
+def _as_date(value):
+    """資料庫的 DATE() 在 SQLite 返回字串、在 MySQL 返回 date"""
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value[:10])
+    return value
+
+def refresh_days(days):
+    """
+    由訂單重新計算指定日期的彙總並替換
+
+    Args:
+        days: 可迭代的 datetime.date
+
+    Returns:
+        int: 寫入的彙總列數
+    """
+    days = sorted({_as_date(day) for day in days if day is not None})
+    if not days:
+        return 0
+    language = func.coalesce(User.preferred_lang, '')
+    written = 0
+    with Session(db.engine) as session:
+        for day in days:
+            start = datetime.datetime.combine(day, datetime.time.min)
+            end = start + datetime.timedelta(days=1)
+            rows = session.query(
+                Order.store_id,
+                language,
+                func.count(Order.order_id),
+                func.coalesce(func.sum(Order.total_amount), 0),
+                func.max(Order.order_id)
+            ).outerjoin(User, User.user_id == Order.user_id).filter(
+                Order.order_time >= start,
+                Order.order_time < end
+            ).group_by(Order.store_id, language).all()
+
+            session.query(OrderDailyRollup).filter(OrderDailyRollup.rollup_date == day).delete(synchronize_session=False)
+            session.add_all([
+                OrderDailyRollup(
+                    rollup_date=day,
+                    store_id=store_id,
+                    language_code=language_code,
+                    order_count=order_count,
+                    revenue=int(revenue),
+                    last_order_id=last_order_id
+                )
+                for store_id, language_code, order_count, revenue, last_order_id in rows
+            ])
+            written += len(rows)
+        session.commit()
+    logger.info(f"訂單每日彙總已更新: {', '.join(day.isoformat() for day in days)}（{written} 列）")
+    return written
+
+def sweep_new_orders(force=False):
+    """
+    重新彙總尚未計入彙總表的訂單所在日期
+
+    以彙總表的最大 last_order_id 為水位，只查詢 ID 在水位附近之後的訂單；
+    第一次執行（彙總表為空）時會彙總所有既有訂單。
+
+    Returns:
+        list: 重新彙總的日期
+    """
+    global _last_sweep
+    with _sweep_lock:
+        if not force and time.monotonic() - _last_sweep < ORDER_ROLLUP_SWEEP_INTERVAL:
+            return []
+        with Session(db.engine) as session:
+            watermark = session.query(func.max(OrderDailyRollup.last_order_id)).scalar()
+            query = session.query(func.date(Order.order_time)).filter(Order.order_time.isnot(None))
+            if watermark is not None:
+                query = query.filter(Order.order_id > watermark - ORDER_ROLLUP_SWEEP_LOOKBACK)
+            days = [_as_date(day) for day, in query.distinct().all()]
+        refresh_days(days)
+        _last_sweep = time.monotonic()
+        return days
+
+@job_handler(ORDER_ROLLUP_JOB)
+def run_order_rollup_refresh(payload, job):
+    """背景工作：重新彙總 ORM 訂單異動影響的日期"""
+    days = [datetime.date.fromisoformat(day) for day in payload['days']]
+    return {'rows': refresh_days(days)}
+
+def _schedule_refresh(days):
+    """排入彙總工作；冪等鍵含時間窗，同一時間窗內同一天只排入一次，於時間窗結束後執行"""
+    delay = max(1, ORDER_ROLLUP_JOB_DELAY)
+    now = time.time()
+    window = int(now // delay)
+    for day in sorted(days):
+        enqueue_job(
+            ORDER_ROLLUP_JOB,
+            {'days': [day.isoformat()]},
+            idempotency_key=f"{ORDER_ROLLUP_JOB}:{day.isoformat()}:{window}",
+            delay_seconds=(window + 1) * delay - now
+        )
+
+# =============================================================================
+# 後台統計查詢（只讀取彙總表）
+# =============================================================================
+
+def _rollup_query(session, start=None, end=None):
+    query = session.query(OrderDailyRollup)
+    if start is not None:
+        query = query.filter(OrderDailyRollup.rollup_date >= start)
+    if end is not None:
+        query = query.filter(OrderDailyRollup.rollup_date <= end)
+    return query
+
+def get_order_totals(start=None, end=None):
+    """
+    期間內的訂單數與營收
+
+    Args:
+        start / end: datetime.date（含），None 表示不限
+
+    Returns:
+        dict: {'orders', 'revenue'}
+    """
+    sweep_new_orders()
+    with Session(db.engine) as session:
+        orders, revenue = _rollup_query(session, start, end).with_entities(
+            func.coalesce(func.sum(OrderDailyRollup.order_count), 0),
+            func.coalesce(func.sum(OrderDailyRollup.revenue), 0)
+        ).one()
+    return {'orders': int(orders), 'revenue': int(revenue)}
+
+def get_order_breakdown(start=None, end=None, store_limit=10):
+    """
+    期間內依日期、店家、語言的訂單數與營收
+
+    Returns:
+        dict: {'daily': [...], 'by_store': [...], 'by_language': [...]}
+    """
+    sweep_new_orders()
+    orders = func.sum(OrderDailyRollup.order_count)
+    revenue = func.sum(OrderDailyRollup.revenue)
+    with Session(db.engine) as session:
+        daily = _rollup_query(session, start, end).with_entities(
+            OrderDailyRollup.rollup_date, orders, revenue
+        ).group_by(OrderDailyRollup.rollup_date).order_by(OrderDailyRollup.rollup_date).all()
+        by_store = _rollup_query(session, start, end).with_entities(
+            OrderDailyRollup.store_id, Store.store_name, orders, revenue
+        ).outerjoin(Store, Store.store_id == OrderDailyRollup.store_id).group_by(
+            OrderDailyRollup.store_id, Store.store_name
+        ).order_by(revenue.desc()).limit(store_limit).all()
+        by_language = _rollup_query(session, start, end).with_entities(
+            OrderDailyRollup.language_code, orders, revenue
+        ).group_by(OrderDailyRollup.language_code).order_by(orders.desc()).all()
+    return {
+        'daily': [
+            {'date': _as_date(day).isoformat(), 'orders': int(count), 'revenue': int(amount)}
+            for day, count, amount in daily
+        ],
+        'by_store': [
+            {'store_id': store_id, 'store_name': store_name, 'orders': int(count), 'revenue': int(amount)}
+            for store_id, store_name, count, amount in by_store
+        ],
+        'by_language': [
+            {'language': language or None, 'orders': int(count), 'revenue': int(amount)}
+            for language, count, amount in by_language
+        ]
+    }
+
+# ORM 訂單異動在提交後才排入彙總工作，避免彙總時讀到尚未提交的資料
+@event.listens_for(Order, 'after_insert')
+@event.listens_for(Order, 'after_update')
+@event.listens_for(Order, 'after_delete')
+def _order_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is None:
+        return
+    days = session.info.setdefault('order_rollup_days', set())
+    # 只讀取已載入的值，不在 flush 中觸發查詢
+    state = db.inspect(target)
+    order_time = state.dict.get('order_time')
+    for value in (order_time, *(state.attrs.order_time.history.deleted or ())):
+        if value is not None:
+            days.add(_as_date(value))
+    if order_time is None:
+        # 下單時間由資料庫預設值（CURRENT_TIMESTAMP）填入，以今天為準
+        days.add(datetime.date.today())
+
+@event.listens_for(Session, 'after_commit')
+def _order_changes_committed(session):
+    days = session.info.pop('order_rollup_days', None)
+    if not days:
+        return
+    try:
+        _schedule_refresh(days)
+    except Exception as e:
+        # 新訂單仍會在下次讀取統計時由 sweep_new_orders 補上
+        logger.warning(f"排入訂單彙總工作失敗: {e}")
+
+@event.listens_for(Session, 'after_rollback')
+def _order_changes_rolled_back(session):
+    session.info.pop('order_rollup_days', None)
@@ -0,0 +1,260 @@
+# =============================================================================
+# 檔案名稱：app/temp_store.py
+# 功能描述：有存活時間（TTL）的暫存狀態儲存
+# 主要職責：
+# - 暫存 OCR 辨識結果與待儲存的訂單資料，跨 worker、跨實例共用（temp_states 表）
+# - 過期自動淘汰，並限制總容量（超過時先淘汰最早到期的項目）
+# - 以精簡 JSON 序列化，較大的值再以 zlib 壓縮
+# - 提供記憶體後端供測試或單一行程使用（TEMP_STATE_BACKEND=memory）
+# =============================================================================
+
+import os
+import json
+import time
+import zlib
+import logging
+import datetime
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from .models import db, TempState
+
+logger = logging.getLogger(__name__)
+
+TEMP_STATE_BACKEND = os.getenv('TEMP_STATE_BACKEND', 'database')
+TEMP_STATE_TTL = int(os.getenv('TEMP_STATE_TTL', '3600'))
+TEMP_STATE_MAX_BYTES = int(os.getenv('TEMP_STATE_MAX_BYTES', str(64 * 1024 * 1024)))
+TEMP_STATE_MAX_VALUE_BYTES = int(os.getenv('TEMP_STATE_MAX_VALUE_BYTES', str(1024 * 1024)))
+# 資料庫後端清理過期項目的最短間隔（秒）
+TEMP_STATE_PURGE_INTERVAL = 60
+
+# 序列化後超過此大小才壓縮（小資料壓縮反而變大）
+_COMPRESS_THRESHOLD = 512
+_FORMAT_JSON = b'j'
+_FORMAT_ZLIB = b'z'
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"無法序列化的型別: {type(value).__name__}")
+
+def dumps_state(value):
+    """將暫存值序列化為 bytes（精簡 JSON，較大時以 zlib 壓縮）"""
+    raw = json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=_json_default).encode('utf-8')
+    if len(raw) > _COMPRESS_THRESHOLD:
+        return _FORMAT_ZLIB + zlib.compress(raw, 6)
+    return _FORMAT_JSON + raw
+
+def loads_state(blob):
+    """還原 dumps_state 產生的 bytes"""
+    blob = bytes(blob)
+    if blob[:1] == _FORMAT_ZLIB:
+        return json.loads(zlib.decompress(blob[1:]).decode('utf-8'))
+    return json.loads(blob[1:].decode('utf-8'))
+
+class TempStateStore(ABC):
+    """暫存狀態儲存的共同介面（後端須實作 set / get / delete）"""
+
+    def __init__(self, default_ttl=TEMP_STATE_TTL, max_bytes=TEMP_STATE_MAX_BYTES,
+                 max_value_bytes=TEMP_STATE_MAX_VALUE_BYTES):
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.max_value_bytes = max_value_bytes
+        self._stats_lock = threading.Lock()
+        self.stats = {'sets': 0, 'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def _encode(self, key, value):
+        blob = dumps_state(value)
+        if len(blob) > self.max_value_bytes:
+            raise ValueError(f"暫存資料過大: {key} ({len(blob)} bytes > {self.max_value_bytes})")
+        return blob
+
+    @abstractmethod
+    def set(self, key, value, ttl=None):
+        """寫入暫存值；ttl 為存活秒數（預設 TEMP_STATE_TTL）"""
+
+    @abstractmethod
+    def get(self, key):
+        """讀取暫存值；不存在或已過期時返回 None"""
+
+    @abstractmethod
+    def delete(self, key):
+        """刪除暫存值"""
+
+    def pop(self, key):
+        """讀取並刪除暫存值"""
+        value = self.get(key)
+        if value is not None:
+            self.delete(key)
+        return value
+
+    def get_stats(self):
+        with self._stats_lock:
+            return dict(self.stats)
+
+class MemoryTempStore(TempStateStore):
+    """行程內的暫存儲存（執行緒安全），只適合測試或單一 worker"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        # key -> (到期時間 monotonic, blob)，依寫入順序排列
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+
+    def _remove(self, key):
+        _, blob = self._entries.pop(key)
+        self._total_bytes -= len(blob)
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            self._remove(key)
+            self._count('expired')
+        while self._entries and self._total_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._count('evictions')
+
+    def set(self, key, value, ttl=None):
+        blob = self._encode(key, value)
+        expires_at = time.monotonic() + (ttl or self.default_ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, blob)
+            self._total_bytes += len(blob)
+            self._evict()
+        self._count('sets')
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                self._count('expired')
+                entry = None
+        if entry is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return loads_state(entry[1])
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def get_stats(self):
+        stats = super().get_stats()
+        with self._lock:
+            stats.update({'backend': 'memory', 'entries': len(self._entries), 'bytes': self._total_bytes})
+        stats['max_bytes'] = self.max_bytes
+        return stats
+
+class DatabaseTempStore(TempStateStore):
+    """以 temp_states 表共用的暫存儲存，多個 worker 或實例都能讀到同一份資料"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._purge_lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def set(self, key, value, ttl=None):
+        blob = self._encode(key, value)
+        expires_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=ttl or self.default_ttl)
+        # 使用獨立 session，不影響呼叫端尚未提交的交易
+        with Session(db.engine) as session:
+            session.merge(TempState(state_key=key, value=blob, size_bytes=len(blob), expires_at=expires_at))
+            session.commit()
+        self._count('sets')
+        self._maybe_purge()
+
+    def get(self, key):
+        with Session(db.engine) as session:
+            entry = session.get(TempState, key)
+            if entry is not None and entry.expires_at <= datetime.datetime.utcnow():
+                session.delete(entry)
+                session.commit()
+                self._count('expired')
+                entry = None
+            if entry is None:
+                self._count('misses')
+                return None
+            self._count('hits')
+            return loads_state(entry.value)
+
+    def delete(self, key):
+        with Session(db.engine) as session:
+            session.execute(delete(TempState).where(TempState.state_key == key))
+            session.commit()
+
+    def _maybe_purge(self):
+        now = time.monotonic()
+        if now - self._last_purge < TEMP_STATE_PURGE_INTERVAL or not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_purge = now
+            self.purge()
+        except Exception as e:
+            logger.warning(f"清理暫存狀態失敗: {e}")
+        finally:
+            self._purge_lock.release()
+
+    def purge(self):
+        """刪除過期項目；總容量超過上限時再淘汰最早到期的項目"""
+        with Session(db.engine) as session:
+            expired = session.execute(
+                delete(TempState).where(TempState.expires_at <= datetime.datetime.utcnow())
+            ).rowcount
+            rows = session.query(TempState.state_key, TempState.size_bytes).order_by(TempState.expires_at.desc()).all()
+            kept_bytes = 0
+            overflow = []
+            for state_key, size_bytes in rows:
+                kept_bytes += size_bytes
+                if kept_bytes > self.max_bytes:
+                    overflow.append(state_key)
+            if overflow:
+                session.execute(delete(TempState).where(TempState.state_key.in_(overflow)))
+            session.commit()
+        self._count('expired', expired or 0)
+        self._count('evictions', len(overflow))
+
+    def get_stats(self):
+        stats = super().get_stats()
+        with Session(db.engine) as session:
+            entries, total_bytes = session.query(
+                db.func.count(TempState.state_key), db.func.coalesce(db.func.sum(TempState.size_bytes), 0)
+            ).one()
+        stats.update({'backend': 'database', 'entries': entries, 'bytes': int(total_bytes), 'max_bytes': self.max_bytes})
+        return stats
+
+_BACKENDS = {
+    'memory': MemoryTempStore,
+    'database': DatabaseTempStore
+}
+
+_temp_store = None
+_temp_store_lock = threading.Lock()
+
+def get_temp_store():
+    """取得依 TEMP_STATE_BACKEND 設定的暫存儲存（行程內共用）"""
+    global _temp_store
+    if _temp_store is None:
+        with _temp_store_lock:
+            if _temp_store is None:
+                if TEMP_STATE_BACKEND not in _BACKENDS:
+                    raise ValueError(f"不支援的 TEMP_STATE_BACKEND: {TEMP_STATE_BACKEND}")
+                _temp_store = _BACKENDS[TEMP_STATE_BACKEND]()
+    return _temp_store
+
+def get_temp_store_stats():
+    """取得暫存儲存的命中、淘汰與容量統計"""
+    return get_temp_store().get_stats()
@@ -18,9 +18,9 @@
 
 from flask import request, abort, Blueprint, jsonify
 from ..models import db, User, Store, Order, VoiceFile
+from ..jobs import job_handler, enqueue_job
 import os
 import json
-import threading
 import logging
 from linebot import LineBotApi, WebhookHandler
 from linebot.exceptions import InvalidSignatureError, LineBotApiError
@@ -42,13 +42,10 @@ logger = logging.getLogger(__name__)
 
 # LINE Bot 設定（延遲初始化）
 def get_line_bot_api():
-    """取得 LINE Bot API 實例"""
+    """取得 LINE Bot API 實例（行程內共用）"""
     try:
-        channel_access_token = os.getenv('LINE_CHANNEL_ACCESS_TOKEN')
-        if not channel_access_token:
-            logger.warning("LINE_CHANNEL_ACCESS_TOKEN 環境變數未設定")
-            return None
-        return LineBotApi(channel_access_token)
+        from ..clients import get_client
+        return get_client('line')
     except Exception as e:
         logger.error(f"LINE Bot API 初始化失敗: {e}")
         return None
@@ -73,57 +70,51 @@ def get_line_bot_handler():
 def process_voice_order_background(order_id, user_id):
     """
     背景處理語音訂單生成和推送
-    避免 webhook 超時和容器重啟中斷
+    由背景工作佇列執行，失敗時拋出例外以便重試
     """
+    logger.info(f"🎵 開始背景處理語音訂單: {order_id}")
+    
+    # 1. 生成語音檔案
+    from ..api.helpers import generate_voice_order
+    voice_file_path = generate_voice_order(order_id)
+    
+    if not (isinstance(voice_file_path, str) and os.path.exists(voice_file_path)):
+        raise RuntimeError(f"語音檔案生成失敗: order_id={order_id}")
+    logger.info(f"✅ 語音檔案生成成功: {voice_file_path}")
+    
+    # 2. 構建語音檔 URL
+    fname = os.path.basename(voice_file_path)
+    from ..config import URLConfig
+    base_url = URLConfig.get_base_url()
+    audio_url = f"{base_url}/api/voices/{fname}"
+    
+    # 3. 發送語音訊息到 LINE
+    line_bot_api = get_line_bot_api()
+    if not line_bot_api:
+        raise RuntimeError("LINE Bot API 不可用")
+    
+    # 由 MP3 影格標頭取得音訊長度（毫秒），不需解碼整個檔案
+    from ..api.audio_meta import get_audio_duration_ms
+    duration_ms = get_audio_duration_ms(voice_file_path)
+    
     try:
-        logger.info(f"🎵 開始背景處理語音訂單: {order_id}")
-        
-        # 1. 生成語音檔案
-        from ..api.helpers import generate_voice_order
-        voice_file_path = generate_voice_order(order_id)
-        
-        if voice_file_path and os.path.exists(voice_file_path):
-            logger.info(f"✅ 語音檔案生成成功: {voice_file_path}")
-            
-            # 2. 構建語音檔 URL
-            fname = os.path.basename(voice_file_path)
-            from ..config import URLConfig
-            base_url = URLConfig.get_base_url()
-            audio_url = f"{base_url}/api/voices/{fname}"
-            
-            # 3. 發送語音訊息到 LINE
-            line_bot_api = get_line_bot_api()
-            if line_bot_api:
-                try:
-                    # 計算音訊檔案的實際長度（毫秒）
-                    duration_ms = 30000  # 預設30秒
-                    try:
-                        from pydub import AudioSegment
-                        audio = AudioSegment.from_file(voice_file_path)
-                        duration_ms = len(audio)  # pydub 回傳的是毫秒
-                        logger.info(f"✅ 計算的音訊長度: {duration_ms} ms")
-                    except Exception as e:
-                        logger.warning(f"⚠️ 無法計算音訊長度，使用預設值: {e}")
-                    
-                    line_bot_api.push_message(
-                        user_id,
-                        AudioSendMessage(
-                            original_content_url=audio_url,
-                            duration=duration_ms
-                        )
-                    )
-                    logger.info(f"✅ 語音訊息推送成功: user={user_id}, audio_url={audio_url}, duration={duration_ms}ms")
-                except LineBotApiError as e:
-                    logger.exception(f"❌ LINE 語音推送失敗: status={getattr(e, 'status_code', None)}, error={getattr(e, 'error', None)}")
-                except Exception as e:
-                    logger.exception(f"❌ 語音推送異常: {e}")
-            else:
-                logger.error("❌ LINE Bot API 不可用")
-        else:
-            logger.warning(f"⚠️ 語音檔案生成失敗: {order_id}")
-            
-    except Exception as e:
-        logger.exception(f"❌ 背景語音處理失敗: order_id={order_id}, error={e}")
+        line_bot_api.push_message(
+            user_id,
+            AudioSendMessage(
+                original_content_url=audio_url,
+                duration=duration_ms
+            )
+        )
+    except LineBotApiError as e:
+        logger.error(f"❌ LINE 語音推送失敗: status={getattr(e, 'status_code', None)}, error={getattr(e, 'error', None)}")
+        raise
+    logger.info(f"✅ 語音訊息推送成功: user={user_id}, audio_url={audio_url}, duration={duration_ms}ms")
+    return {'audio_url': audio_url, 'duration_ms': duration_ms}
+
+@job_handler('voice_order')
+def run_voice_order_job(payload, job):
+    """背景工作：生成語音訂單並推送到 LINE"""
+    return process_voice_order_background(payload['order_id'], payload['user_id'])
 
 def send_processing_message(event, user_language='zh'):
     """
@@ -164,9 +155,10 @@ def get_gemini_model():
             print("警告: GEMINI_API_KEY 環境變數未設定")
             return None
         from google import genai
-        genai.Client(api_key=api_key)
-        return genai.Client().models.generate_content(
-            model="models/gemini-2.5-flash-lite",
+        from ..gemini_gateway import generate_content
+        return generate_content(
+            operation='health_check',
+            timeout=15,
             contents=["測試訊息"],
             config={
                 "thinking_config": genai.types.ThinkingConfig(thinking_budget=512)
@@ -409,23 +401,71 @@ def handle_food_request(event, user, text):
             TextSendMessage(text=message)
         )
 
-def get_ai_recommendations(food_request, user_language='zh'):
-    """使用 Gemini API 分析餐飲需求並推薦店家"""
+# 提示詞中每家店評論摘要的字數上限
+RECOMMENDATION_SUMMARY_MAX_CHARS = int(os.getenv('RECOMMENDATION_SUMMARY_MAX_CHARS', '300'))
+
+def get_ai_recommendations(food_request, user_language='zh', latitude=None, longitude=None, radius_km=10):
+    """
+    取得餐飲需求的推薦店家
+
+    先查推薦快取（鍵為正規化需求、語言、店家目錄版本與位置），命中時不呼叫 Gemini，
+    能在 LINE reply token 的有效時間內回覆。
+    """
+    from ..api.recommendation_cache import (
+        recommendation_cache, make_recommendation_cache_key, RECOMMENDATION_CACHE_ENABLED
+    )
+    from ..api.store_search import get_catalog_version
+    
+    if not RECOMMENDATION_CACHE_ENABLED:
+        return _generate_ai_recommendations(food_request, user_language, latitude, longitude, radius_km)
+    
+    cache_key = make_recommendation_cache_key(food_request, user_language, get_catalog_version(), latitude, longitude)
+    recommendations = recommendation_cache.get(cache_key)
+    if recommendations is not None:
+        logger.info(f"推薦快取命中: {food_request}")
+        return recommendations
+    
+    recommendations = _generate_ai_recommendations(food_request, user_language, latitude, longitude, radius_km)
+    recommendation_cache.set(cache_key, recommendations)
+    return recommendations
+
+def _generate_ai_recommendations(food_request, user_language='zh', latitude=None, longitude=None, radius_km=10):
+    """
+    使用 Gemini API 分析餐飲需求並推薦店家
+
+    先以本地 BM25 索引取出前 K 家候選店家（有提供位置時只取半徑內的店家），
+    只把候選店家放進提示詞，提示詞大小不隨店家數成長。
+    """
     try:
-        # 取得所有店家資料
-        stores = Store.query.all()
+        from ..db_engine import read_query
+        from ..api.store_search import search_stores
+
+        allowed_ids = None
+        if latitude is not None and longitude is not None:
+            from ..api.store_geo import find_nearby_store_ids
+            allowed_ids = [store_id for store_id, _ in find_nearby_store_ids(latitude, longitude, radius_km)]
         
-        if not stores:
+        candidates = search_stores(food_request, allowed_ids=allowed_ids)
+        if not candidates:
             return []
         
-        # 建立店家資料列表
+        candidate_ids = [store_id for store_id, _ in candidates]
+        stores = {
+            store.store_id: store
+            for store in read_query(Store).filter(Store.store_id.in_(candidate_ids)).all()
+        }
+        
+        # 建立店家資料列表（依檢索分數排序）
         store_data = []
-        for store in stores:
+        for store_id in candidate_ids:
+            store = stores.get(store_id)
+            if store is None:
+                continue
             store_info = {
                 'store_id': store.store_id,
                 'store_name': store.store_name,
                 'partner_level': store.partner_level,
-                'review_summary': store.review_summary or '',
+                'review_summary': (store.review_summary or '')[:RECOMMENDATION_SUMMARY_MAX_CHARS],
                 'top_dishes': [
                     store.top_dish_1, store.top_dish_2, store.top_dish_3,
                     store.top_dish_4, store.top_dish_5
@@ -444,7 +484,7 @@ def get_ai_recommendations(food_request, user_language='zh'):
 {food_request}
 
 ## 可用店家列表：
-{json.dumps(store_data, ensure_ascii=False, indent=2)}
+{json.dumps(store_data, ensure_ascii=False, separators=(',', ':'))}
 
 ## 推薦規則：
 1. **優先順序**：VIP店家 (partner_level=2) > 合作店家 (partner_level=1) > 非合作店家 (partner_level=0)
@@ -483,8 +523,10 @@ def get_ai_recommendations(food_request, user_language='zh'):
 
         # 調用 Gemini 2.5 Flash Lite API
         from google import genai
-        response = genai.Client().models.generate_content(
-            model="models/gemini-2.5-flash-lite",
+        from ..gemini_gateway import generate_content
+        response = generate_content(
+            operation='recommendation',
+            timeout=30,
             contents=[prompt],
             config={
                 "response_mime_type": "application/json",  # 新版 JSON Mode
@@ -492,9 +534,10 @@ def get_ai_recommendations(food_request, user_language='zh'):
             }
         )
         
-        # 解析回應
+        # 解析回應（容錯解析並依推薦格式驗證，缺少店名的推薦會被略過）
         try:
-            result = json.loads(response.text)
+            from ..llm_json import parse_llm_json, RECOMMENDATION_SCHEMA
+            result = parse_llm_json(response.text, RECOMMENDATION_SCHEMA)
             
             if 'recommendations' in result and result['recommendations']:
                 # 按照合作等級排序
@@ -647,8 +690,9 @@ def handle_find_restaurants(event, user):
 def handle_order_history(event, user):
     """處理查詢訂單記錄"""
     try:
-        # 查詢使用者的訂單記錄（最近10筆）
-        orders = Order.query.filter_by(user_id=user.user_id).order_by(Order.order_time.desc()).limit(10).all()
+        # 查詢使用者的訂單記錄（最近10筆，店家一併載入）
+        from ..api.helpers import get_order_history_page
+        orders, _ = get_order_history_page(user.user_id, limit=10)
         
         if not orders:
             # 沒有訂單記錄
@@ -671,8 +715,7 @@ def handle_order_history(event, user):
             message = order_summary_messages.get(user.preferred_lang, order_summary_messages["zh"]) + "\n\n"
             
             for i, order in enumerate(orders, 1):
-                store = Store.query.get(order.store_id)
-                store_name = store.store_name if store else "Unknown Store"
+                store_name = order.store.store_name if order.store else "Unknown Store"
                 
                 # 格式化訂單時間
                 order_time = order.order_time.strftime("%Y-%m-%d %H:%M")
@@ -997,15 +1040,14 @@ def send_voice_order(order_id, user_id=None):
     這個函數會在訂單建立後被呼叫
     """
     if user_id:
-        # 使用背景處理，避免 webhook 超時
-        logger.info(f"🎵 啟動背景語音處理: order_id={order_id}, user_id={user_id}")
-        thread = threading.Thread(
-            target=process_voice_order_background,
-            args=(order_id, user_id),
-            daemon=True
+        # 排入背景工作佇列，避免 webhook 超時；同一訂單與使用者只會排入一次
+        logger.info(f"🎵 排入背景語音處理: order_id={order_id}, user_id={user_id}")
+        job_id = enqueue_job(
+            'voice_order',
+            {'order_id': order_id, 'user_id': user_id},
+            idempotency_key=f"voice_order:{order_id}:{user_id}"
         )
-        thread.start()
-        logger.info(f"✅ 背景語音處理已啟動: order_id={order_id}")
+        logger.info(f"✅ 背景語音處理已排入: order_id={order_id}, job_id={job_id}")
     else:
         # 備用方案：使用舊的同步處理
         logger.warning(f"⚠️ 未提供 user_id，使用同步處理: order_id={order_id}")
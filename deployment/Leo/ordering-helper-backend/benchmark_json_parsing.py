@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+LLM JSON 解析效能比較
+
+比較原本的多段式解析（直接解析 → 正則修復 → 正則擷取 menu_items → ast.literal_eval → 最長片段）
+與單次掃描的容錯解析器（app/llm_json.py）：
+- 一次解析整份回應的耗時與救回的菜品數
+- 串流情境：每收到一段就重新解析累積文字 vs. 增量解析，總耗時與第一個菜品出現的位置
+
+測試資料：fixtures/llm_json 語料，加上不同大小、不同瑕疵的合成菜單回應。
+
+用法：
+    python benchmark_json_parsing.py
+    python benchmark_json_parsing.py --items 20 100 400 --repeat 20 --chunk 64
+"""
+
+import io
+import os
+import re
+import sys
+import ast
+import json
+import time
+import argparse
+import statistics
+from contextlib import redirect_stdout
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.llm_json import TolerantJSONParser, parse_llm_json, LLMJSONError, MENU_OCR_SCHEMA
+from test_json_parsing import load_corpus
+
+def legacy_parse(response_text):
+    """原本的 parse_gemini_json_response（僅供比較）"""
+    result_text = response_text.strip()
+    if '{' in result_text and '}' in result_text:
+        start = result_text.find('{')
+        end = result_text.rfind('}') + 1
+        json_text = result_text[start:end]
+        try:
+            return json.loads(json_text)
+        except json.JSONDecodeError as e:
+            try:
+                json_text = re.sub(r',(\s*[}\]])', r'\1', json_text)
+                json_text = re.sub(r'([^\\])"([^"]*?)([^\\])"', r'\1"\2\3"', json_text)
+                json_text = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', json_text)
+                json_text = re.sub(r',\s*}', '}', json_text)
+                json_text = re.sub(r',\s*]', ']', json_text)
+                return json.loads(json_text)
+            except json.JSONDecodeError:
+                try:
+                    menu_items_match = re.search(r'"menu_items"\s*:\s*\[(.*?)\]', json_text, re.DOTALL)
+                    if menu_items_match:
+                        items = []
+                        for item_match in re.findall(r'\{[^}]*\}', menu_items_match.group(1)):
+                            try:
+                                clean_item = re.sub(r',\s*}', '}', item_match)
+                                clean_item = re.sub(r',\s*]', ']', clean_item)
+                                items.append(json.loads(clean_item))
+                            except Exception:
+                                continue
+                        if items:
+                            return {
+                                'success': True,
+                                'menu_items': items,
+                                'store_info': {'name': 'Unknown Store'},
+                                'processing_notes': 'JSON 解析修復成功'
+                            }
+                except Exception:
+                    pass
+                try:
+                    return ast.literal_eval(json_text)
+                except Exception:
+                    try:
+                        matches = re.findall(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', json_text)
+                        if matches:
+                            return json.loads(max(matches, key=len))
+                    except Exception:
+                        pass
+                    raise e
+    raise ValueError("回應中沒有找到有效的 JSON 結構")
+
+def synthetic_menu(count, defect):
+    """產生 count 個菜品的 Gemini 回應；defect 為 clean / trailing_comma / unescaped_quote / truncated"""
+    items = []
+    for index in range(count):
+        items.append({
+            'original_name': f"招牌料理{index}號",
+            'translated_name': f"Signature Dish No.{index}",
+            'price': 50 + index % 200,
+            'description': "以慢火燉煮，附白飯與小菜" if index % 3 == 0 else None,
+            'category': ['主食', '湯品', '小菜', '飲料'][index % 4]
+        })
+    text = json.dumps({
+        'success': True,
+        'menu_items': items,
+        'store_info': {'name': '測試小館', 'address': None, 'phone': None},
+        'processing_notes': None
+    }, ensure_ascii=False, indent=2)
+    if defect == 'trailing_comma':
+        text = re.sub(r'(["\d}l])(\s*)([}\]])', r'\1,\2\3', text)
+    elif defect == 'unescaped_quote':
+        text = text.replace('Signature Dish No.1"', 'Signature "Chef" Dish No.1"', 1)
+    elif defect == 'truncated':
+        text = text[:int(len(text) * 0.8)]
+    return text
+
+def _count_items(parse, text):
+    try:
+        with redirect_stdout(io.StringIO()):
+            result = parse(text)
+        return len(result.get('menu_items') or []) if isinstance(result, dict) else 0
+    except Exception:
+        return None
+
+def _median_ms(parse, text, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        try:
+            with redirect_stdout(io.StringIO()):
+                parse(text)
+        except Exception:
+            pass
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def new_parse(text):
+    return parse_llm_json(text, MENU_OCR_SCHEMA)
+
+def stream_reparse(text, chunk):
+    """每收到一段就用原本的解析器重新解析累積文字，返回 (總耗時 ms, 第一個菜品出現時已收到的字元數)"""
+    started = time.perf_counter()
+    first_item_at = None
+    for end in range(chunk, len(text) + chunk, chunk):
+        try:
+            with redirect_stdout(io.StringIO()):
+                result = legacy_parse(text[:end])
+            if first_item_at is None and isinstance(result, dict) and result.get('menu_items'):
+                first_item_at = min(end, len(text))
+        except Exception:
+            pass
+    return (time.perf_counter() - started) * 1000, first_item_at
+
+def stream_incremental(text, chunk):
+    """增量解析，返回 (總耗時 ms, 第一個菜品出現時已收到的字元數)"""
+    started = time.perf_counter()
+    parser = TolerantJSONParser(stream_paths=[('menu_items',)])
+    first_item_at = None
+    for start in range(0, len(text), chunk):
+        if parser.feed(text[start:start + chunk]) and first_item_at is None:
+            first_item_at = min(start + chunk, len(text))
+    try:
+        parser.close()
+    except LLMJSONError:
+        pass
+    return (time.perf_counter() - started) * 1000, first_item_at
+
+def main():
+    parser = argparse.ArgumentParser(description='LLM JSON 解析效能比較')
+    parser.add_argument('--items', type=int, nargs='+', default=[20, 100, 400], help='合成菜單的菜品數')
+    parser.add_argument('--repeat', type=int, default=20, help='每個案例重複次數（取中位數）')
+    parser.add_argument('--chunk', type=int, default=64, help='串流情境每段的字元數')
+    args = parser.parse_args()
+
+    cases = [(name, text) for name, text, expected in load_corpus() if expected['schema'] == 'menu']
+    for count in args.items:
+        for defect in ('clean', 'trailing_comma', 'unescaped_quote', 'truncated'):
+            cases.append((f"synthetic_{count}_{defect}", synthetic_menu(count, defect)))
+
+    print(f"🧪 一次解析：{len(cases)} 個案例，每個重複 {args.repeat} 次")
+    print(f"  {'案例':<34}{'大小':>8}{'原本(ms)':>12}{'新版(ms)':>12}{'原本菜品':>10}{'新版菜品':>10}")
+    for name, text in cases:
+        legacy_ms = _median_ms(legacy_parse, text, args.repeat)
+        new_ms = _median_ms(new_parse, text, args.repeat)
+        legacy_items = _count_items(legacy_parse, text)
+        new_items = _count_items(new_parse, text)
+        print(f"  {name:<34}{len(text):>8}{legacy_ms:>12.3f}{new_ms:>12.3f}"
+              f"{'失敗' if legacy_items is None else legacy_items:>10}{'失敗' if new_items is None else new_items:>10}")
+
+    print(f"\n🧪 串流情境：每段 {args.chunk} 字元")
+    print(f"  {'案例':<34}{'重新解析(ms)':>14}{'增量(ms)':>12}{'首項位置(重新)':>16}{'首項位置(增量)':>16}")
+    for count in args.items:
+        name = f"synthetic_{count}_clean"
+        text = synthetic_menu(count, 'clean')
+        reparse_ms, reparse_first = stream_reparse(text, args.chunk)
+        incremental_ms, incremental_first = stream_incremental(text, args.chunk)
+        print(f"  {name:<34}{reparse_ms:>14.1f}{incremental_ms:>12.1f}"
+              f"{str(reparse_first):>16}{str(incremental_first):>16}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
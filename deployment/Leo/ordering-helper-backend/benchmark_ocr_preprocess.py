@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+菜單照片前處理效能比較
+
+比較「上傳原始照片」與「前處理後上傳」的：
+- 上傳大小與前處理耗時
+- Gemini 回應時間（--gemini）
+- 菜品辨識召回率（--gemini，需要標準答案）
+
+測試資料：--fixtures 目錄下的菜單照片（.jpg/.jpeg/.png/.webp），
+同名的 <檔名>.expected.json 為標準答案（中文菜名陣列，或 {"items": [...]}）。
+
+用法：
+    python benchmark_ocr_preprocess.py --fixtures fixtures/menu_photos
+    python benchmark_ocr_preprocess.py --fixtures fixtures/menu_photos --gemini --lang en
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# 比較的是 Gemini 本身，不使用 OCR 結果快取
+os.environ['OCR_CACHE_ENABLED'] = 'false'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+def load_fixtures(fixture_dir):
+    """載入照片與標準答案"""
+    fixtures = []
+    for fn in sorted(os.listdir(fixture_dir)):
+        if not fn.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        path = os.path.join(fixture_dir, fn)
+        expected_path = os.path.splitext(path)[0] + '.expected.json'
+        expected = None
+        if os.path.exists(expected_path):
+            with open(expected_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            expected = data.get('items', []) if isinstance(data, dict) else data
+        fixtures.append((fn, path, expected))
+    return fixtures
+
+def _normalize_name(name):
+    return ''.join((name or '').split()).lower()
+
+def item_recall(result, expected):
+    """標準答案中被辨識出的菜名比例（互相包含即視為命中）"""
+    if not expected:
+        return None
+    found = [_normalize_name(item.get('original_name')) for item in (result or {}).get('menu_items', [])]
+    hits = 0
+    for name in expected:
+        target = _normalize_name(name)
+        if any(target and (target in candidate or candidate in target) for candidate in found if candidate):
+            hits += 1
+    return hits / len(expected)
+
+def run_gemini(path, lang, preprocess):
+    from app.api.helpers import process_menu_with_gemini
+    started = time.perf_counter()
+    result = process_menu_with_gemini(path, lang, preprocess=preprocess)
+    return result, (time.perf_counter() - started) * 1000
+
+def _summary(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return '-'
+    return f"平均 {statistics.mean(values):.2f} / 中位數 {statistics.median(values):.2f}"
+
+def main():
+    parser = argparse.ArgumentParser(description='菜單照片前處理效能比較')
+    parser.add_argument('--fixtures', default='fixtures/menu_photos', help='菜單照片目錄')
+    parser.add_argument('--lang', default='en', help='翻譯目標語言')
+    parser.add_argument('--gemini', action='store_true', help='實際呼叫 Gemini 比較回應時間與召回率')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.fixtures):
+        print(f"❌ 找不到測試照片目錄: {args.fixtures}")
+        return 1
+
+    from app.api.image_preprocess import preprocess_menu_image
+
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        print(f"❌ {args.fixtures} 中沒有菜單照片")
+        return 1
+
+    print(f"🧪 菜單照片前處理比較：{len(fixtures)} 張照片")
+    rows = []
+    for fn, path, expected in fixtures:
+        with open(path, 'rb') as f:
+            image_bytes = f.read()
+        processed_bytes, _, _, stats = preprocess_menu_image(image_bytes)
+        row = {
+            'name': fn,
+            'original_kb': len(image_bytes) / 1024,
+            'processed_kb': len(processed_bytes) / 1024,
+            'preprocess_ms': stats['elapsed_ms']
+        }
+        if args.gemini:
+            for variant, preprocess in (('original', False), ('processed', True)):
+                result, elapsed_ms = run_gemini(path, args.lang, preprocess)
+                row[f'{variant}_ms'] = elapsed_ms
+                row[f'{variant}_items'] = len((result or {}).get('menu_items', []))
+                row[f'{variant}_recall'] = item_recall(result, expected)
+        rows.append(row)
+
+        line = f"  {fn}: {row['original_kb']:.0f}KB → {row['processed_kb']:.0f}KB（前處理 {row['preprocess_ms']}ms）"
+        if args.gemini:
+            line += (f" | Gemini {row['original_ms']:.0f}ms → {row['processed_ms']:.0f}ms"
+                     f" | 菜品 {row['original_items']} → {row['processed_items']}")
+            if expected:
+                line += f" | 召回率 {row['original_recall']:.2f} → {row['processed_recall']:.2f}"
+        print(line)
+
+    original_total = sum(row['original_kb'] for row in rows)
+    processed_total = sum(row['processed_kb'] for row in rows)
+    print("\n📊 總結")
+    print(f"  上傳大小: {original_total:.0f}KB → {processed_total:.0f}KB（{processed_total / original_total:.0%}）")
+    print(f"  前處理耗時(ms): {_summary([row['preprocess_ms'] for row in rows])}")
+    if args.gemini:
+        print(f"  Gemini 原始(ms): {_summary([row['original_ms'] for row in rows])}")
+        print(f"  Gemini 前處理(ms): {_summary([row['processed_ms'] for row in rows])}")
+        print(f"  召回率 原始: {_summary([row['original_recall'] for row in rows])}")
+        print(f"  召回率 前處理: {_summary([row['processed_recall'] for row in rows])}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
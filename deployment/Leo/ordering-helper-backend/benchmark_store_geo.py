@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+附近店家查詢效能比較
+
+比較原本的逐店計算（載入所有店家、逐一以 calculate_distance 計算距離）
+與空間索引（app/api/store_geo.py：經緯度網格取候選 + NumPy 向量化 Haversine）：
+- 索引建立耗時
+- 每次查詢的 p50 / p99 耗時
+- 兩者返回的店家與距離是否一致
+
+測試資料：以台北、台中、高雄為中心隨機產生的店家座標（不需要資料庫）。
+
+用法：
+    python benchmark_store_geo.py
+    python benchmark_store_geo.py --stores 1000 10000 100000 --queries 200 --radius 10
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import argparse
+import statistics
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.api.store_geo import StoreGeoIndex
+
+CITY_CENTERS = [(25.0330, 121.5654), (24.1477, 120.6736), (22.6273, 120.3014)]
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """原本的 helpers.calculate_distance（僅供比較）"""
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
+    return 2 * math.asin(math.sqrt(a)) * 6371
+
+def linear_scan(rows, lat, lng, radius_km, limit):
+    """原本的做法：逐店計算距離後排序"""
+    nearby = []
+    for store_id, store_lat, store_lng in rows:
+        distance = calculate_distance(lat, lng, store_lat, store_lng)
+        if distance <= radius_km:
+            nearby.append((store_id, distance))
+    nearby.sort(key=lambda x: x[1])
+    return nearby[:limit]
+
+def synthetic_stores(count, rng):
+    """產生 count 家店的 (store_id, lat, lng)，集中在三個城市周圍"""
+    rows = []
+    for store_id in range(1, count + 1):
+        center_lat, center_lng = rng.choice(CITY_CENTERS)
+        rows.append((store_id, rng.gauss(center_lat, 0.15), rng.gauss(center_lng, 0.15)))
+    return rows
+
+def _percentiles(timings):
+    timings = sorted(timings)
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+
+def main():
+    parser = argparse.ArgumentParser(description='附近店家查詢效能比較')
+    parser.add_argument('--stores', type=int, nargs='+', default=[1000, 10000, 100000], help='店家數')
+    parser.add_argument('--queries', type=int, default=200, help='每個規模的查詢次數')
+    parser.add_argument('--radius', type=float, default=10, help='查詢半徑（公里）')
+    parser.add_argument('--limit', type=int, default=20, help='每次查詢返回的店家數')
+    parser.add_argument('--seed', type=int, default=20250820, help='亂數種子')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"🧪 半徑 {args.radius} 公里、最多 {args.limit} 家店，每個規模查詢 {args.queries} 次")
+    print(f"  {'店家數':>8}{'建立(ms)':>12}{'逐店 p50':>12}{'逐店 p99':>12}{'索引 p50':>12}{'索引 p99':>12}{'一致':>6}")
+    for count in args.stores:
+        rows = synthetic_stores(count, rng)
+        points = [(rng.gauss(lat, 0.1), rng.gauss(lng, 0.1)) for lat, lng in
+                  (rng.choice(CITY_CENTERS) for _ in range(args.queries))]
+
+        index = StoreGeoIndex()
+        index.build(rows)
+
+        scan_timings, index_timings = [], []
+        consistent = True
+        for lat, lng in points:
+            started = time.perf_counter()
+            expected = linear_scan(rows, lat, lng, args.radius, args.limit)
+            scan_timings.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            result = index.query(lat, lng, args.radius, args.limit)
+            index_timings.append((time.perf_counter() - started) * 1000)
+
+            if [store_id for store_id, _ in result] != [store_id for store_id, _ in expected] or \
+                    any(abs(a[1] - b[1]) > 1e-6 for a, b in zip(result, expected)):
+                consistent = False
+
+        scan_p50, scan_p99 = _percentiles(scan_timings)
+        index_p50, index_p99 = _percentiles(index_timings)
+        print(f"  {count:>8}{index.last_build_ms:>12.1f}{scan_p50:>12.3f}{scan_p99:>12.3f}"
+              f"{index_p50:>12.3f}{index_p99:>12.3f}{'✅' if consistent else '❌':>6}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
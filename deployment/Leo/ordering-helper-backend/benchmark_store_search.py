@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AI 店家推薦提示詞大小比較
+
+比較原本把所有店家放進 Gemini 提示詞（json.dumps(..., indent=2)）
+與先以本地 BM25 索引（app/api/store_search.py）取出前 K 家候選店家：
+- 提示詞中店家列表的字元數
+- 索引建立與每次檢索的耗時
+- 熱門菜色含有查詢菜名的店家，是否都排在候選名單中（召回）
+
+測試資料：隨機組合的店名、熱門菜色與評論摘要（不需要資料庫）。
+
+用法：
+    python benchmark_store_search.py
+    python benchmark_store_search.py --stores 100 1000 10000 --top-k 30
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.api.store_search import StoreSearchIndex, store_document_tokens
+
+DISHES = ['牛肉麵', '滷肉飯', '小籠包', '蚵仔煎', '鹽酥雞', '珍珠奶茶', '臭豆腐', '雞排', '水餃', '鍋貼',
+          '拉麵', '壽司', '咖哩飯', '披薩', '漢堡', '炸雞', '火鍋', '燒肉', '豆花', '刈包',
+          '擔仔麵', '肉圓', '米糕', '蛋餅', '蘿蔔糕', '燒餅油條', '酸辣湯', '麻辣燙', '牛排', '咖啡']
+NAME_PARTS = ['阿', '老', '大', '小', '林', '陳', '王', '好', '福', '興', '記', '家', '香', '味', '樂']
+NAME_SUFFIXES = ['小吃', '食堂', '餐館', '麵館', '飯館', '屋', '坊', '亭']
+REVIEW_PHRASES = ['份量很大', '價格實惠', '服務親切', '環境乾淨', '排隊人潮多', '湯頭濃郁', '口味偏重',
+                  '適合家庭聚餐', '深夜也有營業', 'Great value for money', 'Friendly staff']
+QUERIES = ['我想吃牛肉麵', '附近有好吃的小籠包嗎', '想吃火鍋', '推薦珍珠奶茶', '想要吃拉麵', 'I want to eat sushi']
+
+def synthetic_stores(count, rng):
+    stores = []
+    for store_id in range(1, count + 1):
+        dishes = rng.sample(DISHES, 5)
+        stores.append(SimpleNamespace(
+            store_id=store_id,
+            store_name=''.join(rng.sample(NAME_PARTS, 2)) + rng.choice(NAME_SUFFIXES),
+            partner_level=rng.choice([0, 0, 0, 1, 2]),
+            review_summary='，'.join(rng.sample(REVIEW_PHRASES, 4)) + '。招牌' + dishes[0] + '必點。',
+            top_dish_1=dishes[0], top_dish_2=dishes[1], top_dish_3=dishes[2],
+            top_dish_4=dishes[3], top_dish_5=dishes[4],
+            main_photo_url=f"https://example.com/stores/{store_id}.jpg"
+        ))
+    return stores
+
+def store_info(store):
+    return {
+        'store_id': store.store_id,
+        'store_name': store.store_name,
+        'partner_level': store.partner_level,
+        'review_summary': store.review_summary or '',
+        'top_dishes': [dish for dish in (store.top_dish_1, store.top_dish_2, store.top_dish_3,
+                                         store.top_dish_4, store.top_dish_5) if dish],
+        'main_photo_url': store.main_photo_url
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='AI 店家推薦提示詞大小比較')
+    parser.add_argument('--stores', type=int, nargs='+', default=[100, 1000, 10000], help='店家數')
+    parser.add_argument('--top-k', type=int, default=30, help='候選店家數')
+    parser.add_argument('--repeat', type=int, default=50, help='每個查詢重複次數')
+    parser.add_argument('--seed', type=int, default=20250820, help='亂數種子')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    translated = {'sushi': '壽司'}
+    print(f"🧪 候選店家數 {args.top_k}，{len(QUERIES)} 個查詢各重複 {args.repeat} 次")
+    print(f"  {'店家數':>8}{'原本提示(字)':>14}{'候選提示(字)':>14}{'建立(ms)':>10}{'檢索 p50':>10}{'檢索 p99':>10}{'召回':>8}")
+    for count in args.stores:
+        stores = synthetic_stores(count, rng)
+        by_id = {store.store_id: store for store in stores}
+        full_prompt = json.dumps([store_info(store) for store in stores], ensure_ascii=False, indent=2)
+
+        index = StoreSearchIndex()
+        # 模擬英文翻譯摘要：熱門菜色為壽司的店家附上 sushi
+        index.build([
+            (store.store_id, store.partner_level,
+             store_document_tokens(store, ['sushi'] if '壽司' in store_info(store)['top_dishes'] else ()))
+            for store in stores
+        ])
+
+        timings, prompt_sizes, recalls = [], [], []
+        for query in QUERIES:
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                candidates = index.search(query, args.top_k)
+                timings.append((time.perf_counter() - started) * 1000)
+            candidate_stores = [by_id[store_id] for store_id, _ in candidates]
+            prompt_sizes.append(len(json.dumps([store_info(store) for store in candidate_stores],
+                                               ensure_ascii=False, separators=(',', ':'))))
+            dish = next((d for d in DISHES if d in query), None) or translated.get(query.split()[-1])
+            matching = [store for store in stores if dish in store_info(store)['top_dishes']]
+            hits = sum(1 for store in candidate_stores if dish in store_info(store)['top_dishes'])
+            recalls.append(hits / min(len(matching), args.top_k) if matching else 1.0)
+
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        print(f"  {count:>8}{len(full_prompt):>14}{int(statistics.mean(prompt_sizes)):>14}"
+              f"{index.last_build_ms:>10.1f}{statistics.median(timings):>10.3f}{p99:>10.3f}"
+              f"{statistics.mean(recalls):>8.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
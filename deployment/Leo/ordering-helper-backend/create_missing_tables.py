@@ -40,7 +40,7 @@ def create_missing_tables():
             print(f"現有資料表: {existing_tables}")
             
             # 檢查並創建必要的表
-            required_tables = ['ocr_menus', 'ocr_menu_items', 'ocr_menu_translations', 'order_summaries']
+            required_tables = ['ocr_menus', 'ocr_menu_items', 'ocr_menu_translations', 'order_summaries', 'translation_cache', 'background_jobs', 'temp_states', 'ocr_result_cache', 'order_daily_rollups']
             
             for table_name in required_tables:
                 if table_name not in existing_tables:
@@ -126,6 +126,118 @@ def create_missing_tables():
                         db.session.commit()
                         print(f"✅ {table_name} 表創建成功")
                         
+                    elif table_name == 'translation_cache':
+                        # 創建 translation_cache 表
+                        create_table_sql = """
+                        CREATE TABLE translation_cache (
+                            cache_id BIGINT NOT NULL AUTO_INCREMENT,
+                            cache_key CHAR(64) NOT NULL,
+                            source_lang VARCHAR(10) NOT NULL,
+                            target_lang VARCHAR(10) NOT NULL,
+                            source_text TEXT COLLATE utf8mb4_bin NOT NULL,
+                            translated_text TEXT COLLATE utf8mb4_bin NOT NULL,
+                            expires_at DATETIME NOT NULL,
+                            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                            PRIMARY KEY (cache_id),
+                            UNIQUE KEY uk_cache_key (cache_key)
+                        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin COMMENT='翻譯結果快取'
+                        """
+                        
+                        db.session.execute(text(create_table_sql))
+                        db.session.commit()
+                        print(f"✅ {table_name} 表創建成功")
+                        
+                    elif table_name == 'background_jobs':
+                        # 創建 background_jobs 表
+                        create_table_sql = """
+                        CREATE TABLE background_jobs (
+                            job_id BIGINT NOT NULL AUTO_INCREMENT,
+                            job_type VARCHAR(50) NOT NULL,
+                            payload TEXT COLLATE utf8mb4_bin NOT NULL,
+                            idempotency_key VARCHAR(128) DEFAULT NULL,
+                            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+                            attempts INT NOT NULL DEFAULT 0,
+                            max_attempts INT NOT NULL DEFAULT 5,
+                            run_after DATETIME NOT NULL,
+                            locked_by VARCHAR(100) DEFAULT NULL,
+                            locked_at DATETIME DEFAULT NULL,
+                            last_error TEXT COLLATE utf8mb4_bin,
+                            result TEXT COLLATE utf8mb4_bin,
+                            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                            PRIMARY KEY (job_id),
+                            UNIQUE KEY uk_idempotency_key (idempotency_key),
+                            KEY idx_background_jobs_status_run_after (status, run_after)
+                        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin COMMENT='背景工作佇列'
+                        """
+                        
+                        db.session.execute(text(create_table_sql))
+                        db.session.commit()
+                        print(f"✅ {table_name} 表創建成功")
+                        
+                    elif table_name == 'temp_states':
+                        # 創建 temp_states 表
+                        create_table_sql = """
+                        CREATE TABLE temp_states (
+                            state_key VARCHAR(128) NOT NULL,
+                            value MEDIUMBLOB NOT NULL,
+                            size_bytes INT NOT NULL,
+                            expires_at DATETIME NOT NULL,
+                            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                            PRIMARY KEY (state_key),
+                            KEY ix_temp_states_expires_at (expires_at)
+                        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin COMMENT='OCR 暫存狀態（TTL）'
+                        """
+                        
+                        db.session.execute(text(create_table_sql))
+                        db.session.commit()
+                        print(f"✅ {table_name} 表創建成功")
+                        
+                    elif table_name == 'ocr_result_cache':
+                        # 創建 ocr_result_cache 表
+                        create_table_sql = """
+                        CREATE TABLE ocr_result_cache (
+                            cache_id BIGINT NOT NULL AUTO_INCREMENT,
+                            image_hash CHAR(64) NOT NULL,
+                            thumbnail BLOB NOT NULL,
+                            target_lang VARCHAR(10) NOT NULL,
+                            result MEDIUMTEXT COLLATE utf8mb4_bin NOT NULL,
+                            item_count INT NOT NULL DEFAULT 0,
+                            hits INT NOT NULL DEFAULT 0,
+                            expires_at DATETIME NOT NULL,
+                            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                            PRIMARY KEY (cache_id),
+                            KEY idx_ocr_result_cache_lang_expires (target_lang, expires_at)
+                        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin COMMENT='菜單照片 OCR 結果快取（感知雜湊）'
+                        """
+                        
+                        db.session.execute(text(create_table_sql))
+                        db.session.commit()
+                        print(f"✅ {table_name} 表創建成功")
+                        
+                    elif table_name == 'order_daily_rollups':
+                        # 創建 order_daily_rollups 表
+                        create_table_sql = """
+                        CREATE TABLE order_daily_rollups (
+                            rollup_id INT NOT NULL AUTO_INCREMENT,
+                            rollup_date DATE NOT NULL,
+                            store_id INT NOT NULL,
+                            language_code VARCHAR(10) NOT NULL DEFAULT '',
+                            order_count INT NOT NULL DEFAULT 0,
+                            revenue BIGINT NOT NULL DEFAULT 0,
+                            last_order_id BIGINT NOT NULL DEFAULT 0,
+                            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                            PRIMARY KEY (rollup_id),
+                            UNIQUE KEY uk_order_daily_rollups (rollup_date, store_id, language_code),
+                            KEY ix_order_daily_rollups_last_order_id (last_order_id)
+                        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin COMMENT='訂單每日彙總（店家、語言）'
+                        """
+                        
+                        db.session.execute(text(create_table_sql))
+                        db.session.commit()
+                        print(f"✅ {table_name} 表創建成功")
+                        print("   首次查詢後台訂單統計時會自動彙總既有訂單")
+                        
                     else:
                         print(f"❌ 不支援創建 {table_name} 表")
                         return False
@@ -169,6 +281,25 @@ def create_missing_tables():
                         else:
                             print(f"✅ {table_name} 表結構正確")
             
+            # 檢查並創建必要的索引
+            required_indexes = [
+                ('stores', 'idx_stores_gps', 'gps_lat, gps_lng'),
+                ('orders', 'idx_orders_user_time', 'user_id, order_time, order_id'),
+                ('orders', 'idx_orders_order_time', 'order_time')
+            ]
+            
+            for table_name, index_name, columns in required_indexes:
+                if table_name not in existing_tables:
+                    continue
+                existing_indexes = [index['name'] for index in inspector.get_indexes(table_name)]
+                if index_name not in existing_indexes:
+                    print(f"🔧 創建 {table_name}.{index_name} 索引...")
+                    db.session.execute(text(f"CREATE INDEX {index_name} ON {table_name} ({columns})"))
+                    db.session.commit()
+                    print(f"✅ {index_name} 索引創建成功")
+                else:
+                    print(f"✅ {index_name} 索引已存在")
+            
             return True
             
     except Exception as e:
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試背景工作佇列（app/jobs.py）
+
+使用記憶體 SQLite 建立 background_jobs 表（不啟動工作執行緒，直接呼叫領取與執行），檢查：
+- 相同冪等鍵只排入一次
+- 領取：尚未到執行時間的工作不會被領取；已被其他執行者領取的工作不會重複領取
+- 重試：失敗後重新排入並延後執行、記錄錯誤；嘗試次數用盡後標記為 failed；成功後標記為 done 並保存結果
+- 重試時可由 job.result 取回上次保存的進度
+- 逾時回收：執行中超過 JOB_LOCK_TIMEOUT 的工作重新排入，未逾時的不受影響
+
+用法：
+    python test_job_queue.py
+"""
+
+import os
+import sys
+import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from sqlalchemy import BigInteger, update
+from sqlalchemy.ext.compiler import compiles
+
+from app import jobs
+from app.models import db, BackgroundJob
+
+# SQLite 只有 INTEGER PRIMARY KEY 會自動遞增，測試中把 BIGINT 建成 INTEGER
+@compiles(BigInteger, 'sqlite')
+def compile_big_integer_for_sqlite(type_, compiler, **kw):
+    return 'INTEGER'
+
+TEST_JOB = 'test_job'
+attempts_seen = []
+
+@jobs.job_handler(TEST_JOB)
+def run_test_job(payload, job):
+    """前 payload['fail_times'] 次失敗；每次先保存進度，成功時回傳累計進度"""
+    progress = job.result or {}
+    progress['runs'] = progress.get('runs', 0) + 1
+    job.save_progress(progress)
+    attempts_seen.append((job.attempts, progress['runs']))
+    if job.attempts <= payload.get('fail_times', 0):
+        raise RuntimeError(f"第 {job.attempts} 次失敗")
+    return progress
+
+def create_test_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    return app
+
+def load_job(job_id):
+    db.session.expire_all()
+    return db.session.get(BackgroundJob, job_id)
+
+def make_due(job_id):
+    """把延後重試的工作改為立即可執行"""
+    db.session.execute(update(BackgroundJob).where(BackgroundJob.job_id == job_id)
+                       .values(run_after=jobs._now() - datetime.timedelta(seconds=1)))
+    db.session.commit()
+
+def report(ok, message):
+    print(f"{'✅' if ok else '❌'} {message}")
+    return 0 if ok else 1
+
+def check_enqueue_and_claim(app):
+    """冪等鍵與領取"""
+    print("\n📋 排入與領取")
+    failed = 0
+    worker_a = jobs.WorkerPool(app, workers=1)
+    worker_b = jobs.WorkerPool(app, workers=1)
+    worker_a.worker_id, worker_b.worker_id = 'worker-a', 'worker-b'
+
+    first = jobs.enqueue_job(TEST_JOB, {'n': 1}, idempotency_key='claim:1')
+    second = jobs.enqueue_job(TEST_JOB, {'n': 2}, idempotency_key='claim:1')
+    failed += report(first == second and BackgroundJob.query.count() == 1,
+                     f"相同冪等鍵只排入一次（job_id {first} / {second}）")
+
+    delayed = jobs.enqueue_job(TEST_JOB, {}, idempotency_key='claim:delayed', delay_seconds=60)
+    claimed = worker_a._claim()
+    failed += report(claimed is not None and claimed[0] == first, "領取已到執行時間的工作")
+    job = load_job(first)
+    failed += report(job.status == jobs.STATUS_RUNNING and job.locked_by == 'worker-a' and job.attempts == 1,
+                     f"領取後狀態 {job.status}、執行者 {job.locked_by}、嘗試 {job.attempts} 次")
+    failed += report(worker_b._claim() is None, "已被領取與尚未到期的工作不會被其他執行者領取")
+    failed += report(load_job(delayed).status == jobs.STATUS_QUEUED, "延後執行的工作仍在佇列中")
+    return failed
+
+def check_retry(app):
+    """失敗重試、進度保存與次數用盡"""
+    print("\n📋 重試")
+    failed = 0
+    worker = jobs.WorkerPool(app, workers=1)
+    attempts_seen.clear()
+
+    job_id = jobs.enqueue_job(TEST_JOB, {'fail_times': 1}, idempotency_key='retry:ok', max_attempts=3)
+    worker._execute(*worker._claim())
+    job = load_job(job_id)
+    failed += report(job.status == jobs.STATUS_QUEUED and job.run_after > jobs._now() and
+                     'RuntimeError' in (job.last_error or '') and job.locked_by is None,
+                     f"失敗後重新排入並延後 {(job.run_after - jobs._now()).total_seconds():.1f} 秒")
+    failed += report(worker._claim() is None, "退避期間不會被領取")
+
+    make_due(job_id)
+    worker._execute(*worker._claim())
+    job = load_job(job_id)
+    failed += report(job.status == jobs.STATUS_DONE and job.attempts == 2, f"第 2 次成功，狀態 {job.status}")
+    failed += report(attempts_seen == [(1, 1), (2, 2)], f"重試時取回上次保存的進度 {attempts_seen}")
+
+    job_id = jobs.enqueue_job(TEST_JOB, {'fail_times': 9}, idempotency_key='retry:fail', max_attempts=2)
+    worker._execute(*worker._claim())
+    make_due(job_id)
+    worker._execute(*worker._claim())
+    job = load_job(job_id)
+    failed += report(job.status == jobs.STATUS_FAILED and job.attempts == 2,
+                     f"嘗試 {job.attempts} 次後標記為 {job.status}")
+    failed += report(worker.stats['retried'] == 2 and worker.stats['failed'] == 1 and worker.stats['succeeded'] == 1,
+                     f"統計 {worker.stats}")
+    return failed
+
+def check_stale_lock_recovery(app):
+    """逾時回收"""
+    print("\n📋 逾時回收")
+    failed = 0
+    worker = jobs.WorkerPool(app, workers=2)
+    stale = jobs.enqueue_job(TEST_JOB, {}, idempotency_key='stale:1')
+    fresh = jobs.enqueue_job(TEST_JOB, {}, idempotency_key='stale:2')
+    worker._claim()
+    worker._claim()
+    db.session.execute(update(BackgroundJob).where(BackgroundJob.job_id == stale).values(
+        locked_at=jobs._now() - datetime.timedelta(seconds=jobs.JOB_LOCK_TIMEOUT + 60)))
+    db.session.commit()
+
+    worker._last_recovery = float('-inf')
+    worker._recover_stale()
+    stale_job, fresh_job = load_job(stale), load_job(fresh)
+    failed += report(stale_job.status == jobs.STATUS_QUEUED and stale_job.locked_by is None,
+                     f"逾時的工作重新排入（{stale_job.status}）")
+    failed += report(fresh_job.status == jobs.STATUS_RUNNING, f"未逾時的工作不受影響（{fresh_job.status}）")
+
+    reclaimed = worker._claim()
+    failed += report(reclaimed is not None and reclaimed[0] == stale and reclaimed[3] == 2,
+                     "回收的工作可再次領取，嘗試次數累加")
+
+    # 30 秒內不重複掃描
+    db.session.execute(update(BackgroundJob).where(BackgroundJob.job_id == fresh).values(
+        locked_at=jobs._now() - datetime.timedelta(seconds=jobs.JOB_LOCK_TIMEOUT + 60)))
+    db.session.commit()
+    worker._recover_stale()
+    failed += report(load_job(fresh).status == jobs.STATUS_RUNNING and worker.stats['recovered'] == 1,
+                     "回收掃描有節流")
+    return failed
+
+def test_job_queue():
+    """測試背景工作佇列"""
+    print("🔧 開始測試背景工作佇列...")
+    failed = 0
+    for check in (check_enqueue_and_claim, check_retry, check_stale_lock_recovery):
+        app = create_test_app()
+        with app.app_context():
+            db.create_all()
+            failed += check(app)
+            db.session.remove()
+            db.drop_all()
+    assert not failed, f"背景工作佇列測試失敗：{failed} 項"
+    print("\n🎉 背景工作佇列測試完成")
+
+if __name__ == "__main__":
+    try:
+        test_job_queue()
+    except AssertionError as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
@@ -2,185 +2,185 @@
 # -*- coding: utf-8 -*-
 """
 測試 JSON 解析功能
+
+- 語料：fixtures/llm_json/*.txt，同名的 <檔名>.expected.json 為預期結果
+  （由原本的五個測試案例整理，另加程式碼區塊、未跳脫引號、截斷等實際遇過的格式）
+- 模糊測試：對每個語料做隨機切段、逐字截斷與變形，確認解析器只會拋出 LLMJSONError，
+  且串流解析的結果與一次解析一致
+
+用法：
+    python test_json_parsing.py
+    python test_json_parsing.py --rounds 500 --seed 7
 """
 
 import os
+import re
 import sys
 import json
+import random
+import argparse
 
-sys.path.append('.')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app import create_app
-from app.api.helpers import parse_gemini_json_response
+from app.llm_json import TolerantJSONParser, parse_llm_json, validate_schema, LLMJSONError, MENU_OCR_SCHEMA, RECOMMENDATION_SCHEMA
 
-def test_json_parsing():
-    """測試 JSON 解析功能"""
-    app = create_app()
-    
-    with app.app_context():
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'llm_json')
+SCHEMAS = {'menu': MENU_OCR_SCHEMA, 'recommendation': RECOMMENDATION_SCHEMA}
+ARRAY_KEYS = {'menu': 'menu_items', 'recommendation': 'recommendations'}
+NOISE_CHARS = '{}[]",:\'\\` \n-.0aetu'
+
+def load_corpus(corpus_dir=CORPUS_DIR):
+    """載入語料：[(名稱, 文字, 預期結果), ...]"""
+    corpus = []
+    for fn in sorted(os.listdir(corpus_dir)):
+        if not fn.endswith('.txt'):
+            continue
+        name = fn[:-4]
+        with open(os.path.join(corpus_dir, fn), 'r', encoding='utf-8') as f:
+            text = f.read()
+        with open(os.path.join(corpus_dir, name + '.expected.json'), 'r', encoding='utf-8') as f:
+            expected = json.load(f)
+        corpus.append((name, text, expected))
+    return corpus
+
+def stream_parse(text, array_key, sizes):
+    """依 sizes 切段餵入，返回 (串流產生的元素, 最終結果)"""
+    parser = TolerantJSONParser(stream_paths=[(array_key,)])
+    events = []
+    index = 0
+    for size in sizes:
+        events.extend(element for _, element in parser.feed(text[index:index + size]))
+        index += size
+    events.extend(element for _, element in parser.feed(text[index:]))
+    return events, parser.close()
+
+def check_expected(name, text, expected):
+    """檢查單一語料的解析結果，返回錯誤訊息 list"""
+    errors = []
+    result = parse_llm_json(text, SCHEMAS[expected['schema']])
+    items = result.get(ARRAY_KEYS[expected['schema']], [])
+    if len(items) != expected['items']:
+        errors.append(f"項目數 {len(items)}，預期 {expected['items']}")
+    if 'store_name' in expected:
+        store_name = (result.get('store_info') or {}).get('name')
+        if store_name != expected['store_name']:
+            errors.append(f"店名 {store_name!r}，預期 {expected['store_name']!r}")
+    if 'prices' in expected:
+        prices = [item.get('price') for item in items]
+        if prices != expected['prices']:
+            errors.append(f"價格 {prices}，預期 {expected['prices']}")
+    return errors
+
+def check_corpus(corpus):
+    """語料的解析結果符合預期"""
+    print("\n📋 語料解析")
+    failed = 0
+    for name, text, expected in corpus:
         try:
-            print("🔧 開始測試 JSON 解析功能...")
-            
-            # 測試案例1: 正常的 JSON
-            print("\n📋 測試案例1: 正常 JSON")
-            normal_json = '''
-            {
-                "success": true,
-                "menu_items": [
-                    {
-                        "original_name": "招牌金湯酸菜",
-                        "translated_name": "Signature Golden Soup Pickled Vegetables",
-                        "price": 68
-                    }
-                ],
-                "store_info": {
-                    "name": "食肆鍋",
-                    "address": null,
-                    "phone": null
-                }
-            }
-            '''
-            
-            try:
-                result = parse_gemini_json_response(normal_json)
-                print("✅ 正常 JSON 解析成功")
-                print(f"   成功狀態: {result.get('success')}")
-                print(f"   菜單項目數: {len(result.get('menu_items', []))}")
-            except Exception as e:
-                print(f"❌ 正常 JSON 解析失敗: {e}")
-            
-            # 測試案例2: 有尾隨逗號的 JSON
-            print("\n📋 測試案例2: 有尾隨逗號的 JSON")
-            trailing_comma_json = '''
-            {
-                "success": true,
-                "menu_items": [
-                    {
-                        "original_name": "招牌金湯酸菜",
-                        "translated_name": "Signature Golden Soup Pickled Vegetables",
-                        "price": 68,
-                    },
-                ],
-                "store_info": {
-                    "name": "食肆鍋",
-                    "address": null,
-                    "phone": null,
-                },
-            }
-            '''
-            
-            try:
-                result = parse_gemini_json_response(trailing_comma_json)
-                print("✅ 尾隨逗號 JSON 解析成功")
-                print(f"   成功狀態: {result.get('success')}")
-                print(f"   菜單項目數: {len(result.get('menu_items', []))}")
-            except Exception as e:
-                print(f"❌ 尾隨逗號 JSON 解析失敗: {e}")
-            
-            # 測試案例3: 有引號問題的 JSON
-            print("\n📋 測試案例3: 有引號問題的 JSON")
-            quote_issue_json = '''
-            {
-                "success": true,
-                "menu_items": [
-                    {
-                        "original_name": "招牌金湯酸菜",
-                        "translated_name": "Signature Golden Soup Pickled Vegetables",
-                        "price": 68
-                    }
-                ],
-                "store_info": {
-                    "name": "食肆鍋",
-                    "address": null,
-                    "phone": null
-                }
-            }
-            '''
-            
-            try:
-                result = parse_gemini_json_response(quote_issue_json)
-                print("✅ 引號問題 JSON 解析成功")
-                print(f"   成功狀態: {result.get('success')}")
-                print(f"   菜單項目數: {len(result.get('menu_items', []))}")
-            except Exception as e:
-                print(f"❌ 引號問題 JSON 解析失敗: {e}")
-            
-            # 測試案例4: 模擬 Gemini 長回應（包含額外文字）
-            print("\n📋 測試案例4: 模擬 Gemini 長回應")
-            long_response = '''
-            我已經分析了這張菜單圖片，以下是辨識結果：
-
-            {
-                "success": true,
-                "menu_items": [
-                    {
-                        "original_name": "招牌金湯酸菜",
-                        "translated_name": "Signature Golden Soup Pickled Vegetables",
-                        "price": 68
-                    },
-                    {
-                        "original_name": "白濃雞湯",
-                        "translated_name": "White Chicken Soup",
-                        "price": 49
-                    }
-                ],
-                "store_info": {
-                    "name": "食肆鍋",
-                    "address": null,
-                    "phone": null
-                }
-            }
-
-            以上是完整的菜單辨識結果，包含了所有可見的菜單項目。
-            '''
-            
+            errors = check_expected(name, text, expected)
+        except LLMJSONError as e:
+            errors = [f"解析失敗: {e}"]
+        if errors:
+            failed += 1
+            print(f"❌ {name}: {'; '.join(errors)}")
+        else:
+            print(f"✅ {name}")
+    return failed
+
+def mutations(text, rng):
+    """不改變內容的變形：前後說明文字、程式碼區塊、尾隨逗號、移除物件之間的逗號"""
+    yield 'prose', f"以下是辨識結果：\n{text}\n以上。"
+    yield 'fence', f"```json\n{text}\n```"
+    yield 'trailing_comma', re.sub(r'(["\d\]}el])(\s*)([}\]])', r'\1,\2\3', text)
+    yield 'missing_comma', re.sub(r'\}\s*,\s*\{', '}\n{', text)
+    yield 'crlf', text.replace('\n', '\r\n')
+
+def run_fuzz(corpus, rounds, seed):
+    """模糊測試：切段一致、截斷安全、變形後結果不變、隨機雜訊只會拋出 LLMJSONError"""
+    print(f"\n📋 模糊測試（每個語料 {rounds} 輪，seed={seed}）")
+    rng = random.Random(seed)
+    failed = 0
+    for name, text, expected in corpus:
+        array_key = ARRAY_KEYS[expected['schema']]
+        schema = SCHEMAS[expected['schema']]
+        problems = []
+        reference_events, reference = stream_parse(text, array_key, [])
+
+        # 1. 任意切段餵入，結果與一次解析相同
+        for _ in range(rounds):
+            sizes = [rng.randint(1, 12) for _ in range(len(text) // 4)]
+            events, result = stream_parse(text, array_key, sizes)
+            if events != reference_events or result != reference:
+                problems.append(f"切段 {sizes[:5]}... 結果不一致")
+                break
+
+        # 2. 逐字截斷：只允許 LLMJSONError，已串流的元素都在最終結果中
+        for cut in range(len(text) + 1):
             try:
-                result = parse_gemini_json_response(long_response)
-                print("✅ 長回應 JSON 解析成功")
-                print(f"   成功狀態: {result.get('success')}")
-                print(f"   菜單項目數: {len(result.get('menu_items', []))}")
+                events, result = stream_parse(text[:cut], array_key, [])
+            except LLMJSONError:
+                continue
             except Exception as e:
-                print(f"❌ 長回應 JSON 解析失敗: {e}")
-            
-            # 測試案例5: 格式錯誤的 JSON（模擬實際錯誤）
-            print("\n📋 測試案例5: 格式錯誤的 JSON")
-            malformed_json = '''
-            {
-                "success": true,
-                "menu_items": [
-                    {
-                        "original_name": "招牌金湯酸菜",
-                        "translated_name": "Signature Golden Soup Pickled Vegetables",
-                        "price": 68
-                    }
-                    {
-                        "original_name": "白濃雞湯",
-                        "translated_name": "White Chicken Soup",
-                        "price": 49
-                    }
-                ],
-                "store_info": {
-                    "name": "食肆鍋",
-                    "address": null,
-                    "phone": null
-                }
-            }
-            '''
-            
+                problems.append(f"截斷於 {cut} 拋出 {type(e).__name__}: {e}")
+                break
+            final = result.get(array_key, []) if isinstance(result, dict) else []
+            if any(element not in final for element in events):
+                problems.append(f"截斷於 {cut} 時串流元素不在最終結果中")
+                break
+
+        # 3. 變形後項目數不變（截斷的語料除外）
+        if not name.endswith('truncated'):
+            for label, mutated in mutations(text, rng):
+                try:
+                    items = parse_llm_json(mutated, schema).get(array_key, [])
+                except LLMJSONError as e:
+                    problems.append(f"變形 {label} 解析失敗: {e}")
+                    continue
+                if len(items) != expected['items']:
+                    problems.append(f"變形 {label} 項目數 {len(items)}，預期 {expected['items']}")
+
+        # 4. 隨機雜訊：插入、刪除字元，只允許 LLMJSONError
+        for _ in range(rounds):
+            chars = list(text)
+            for _ in range(rng.randint(1, 5)):
+                position = rng.randrange(len(chars) + 1)
+                if chars and rng.random() < 0.5:
+                    del chars[min(position, len(chars) - 1)]
+                else:
+                    chars.insert(position, rng.choice(NOISE_CHARS))
+            noisy = ''.join(chars)
             try:
-                result = parse_gemini_json_response(malformed_json)
-                print("✅ 格式錯誤 JSON 解析成功")
-                print(f"   成功狀態: {result.get('success')}")
-                print(f"   菜單項目數: {len(result.get('menu_items', []))}")
+                value = parse_llm_json(noisy)
+                if isinstance(value, dict):
+                    validate_schema(value, schema)
+            except LLMJSONError:
+                pass
             except Exception as e:
-                print(f"❌ 格式錯誤 JSON 解析失敗: {e}")
-            
-            print("\n🎉 JSON 解析功能測試完成")
-            
-        except Exception as e:
-            print(f"❌ 測試失敗: {e}")
-            import traceback
-            traceback.print_exc()
+                problems.append(f"雜訊輸入拋出 {type(e).__name__}: {e}")
+                break
+
+        if problems:
+            failed += 1
+            print(f"❌ {name}: {'; '.join(problems[:3])}")
+        else:
+            print(f"✅ {name}")
+    return failed
+
+def test_json_parsing(rounds=200, seed=20250820):
+    """測試 JSON 解析功能"""
+    print("🔧 開始測試 JSON 解析功能...")
+    corpus = load_corpus()
+    failed = check_corpus(corpus) + run_fuzz(corpus, rounds, seed)
+    assert not failed, f"JSON 解析功能測試失敗：{failed} 項"
+    print("\n🎉 JSON 解析功能測試完成")
 
 if __name__ == "__main__":
-    test_json_parsing()
+    parser = argparse.ArgumentParser(description='測試 JSON 解析功能')
+    parser.add_argument('--rounds', type=int, default=200, help='每個語料的模糊測試輪數')
+    parser.add_argument('--seed', type=int, default=20250820, help='亂數種子')
+    args = parser.parse_args()
+    try:
+        test_json_parsing(args.rounds, args.seed)
+    except AssertionError as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
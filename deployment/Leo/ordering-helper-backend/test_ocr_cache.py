@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試菜單 OCR 結果快取（app/api/ocr_cache.py）的命中門檻
+
+以 Pillow 產生同一版型的合成菜單照片（相同標題列與排版，只有品項與價格不同），
+使用記憶體 SQLite 的 ocr_result_cache 表執行完整的 store / lookup，檢查：
+- 重新壓縮、縮小與小幅裁切的同一張菜單命中，並回傳原本的結果
+- 同版型的不同菜單、少了最後幾個品項的同一份菜單都不命中（即使雜湊相近、通過篩選）
+- 縮圖比對的 ±2 像素位移搜尋：位移後的縮圖在不容許位移時不相符，容許 ±2 像素時相符
+- 大小不符的舊版縮圖不相符
+
+用法：
+    python test_ocr_cache.py
+"""
+
+import io
+import os
+import sys
+import random
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from flask import Flask
+from PIL import Image, ImageDraw, ImageFont
+from sqlalchemy import BigInteger
+from sqlalchemy.ext.compiler import compiles
+
+from app.models import db
+from app.api.ocr_cache import (
+    OCRResultCache, compute_image_signature, hash_similarity, thumbnail_similarity,
+    OCR_CACHE_HASH_SIMILARITY, OCR_CACHE_SIMILARITY, THUMBNAIL_SIZE
+)
+
+# SQLite 只有 INTEGER PRIMARY KEY 會自動遞增，測試中把 BIGINT 建成 INTEGER
+@compiles(BigInteger, 'sqlite')
+def compile_big_integer_for_sqlite(type_, compiler, **kw):
+    return 'INTEGER'
+
+WORDS = ['beef', 'noodle', 'soup', 'pork', 'rice', 'dumpling', 'tea', 'tofu',
+         'chicken', 'fried', 'spicy', 'fish', 'egg', 'bun']
+
+def make_menu(seed, items=14):
+    """同一版型的菜單：紅色標題列與 items 行「品名 + 價格」，品項與價格由 seed 決定"""
+    rng = random.Random(seed)
+    image = Image.new('RGB', (900, 1400), (250, 246, 236))
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+
+    def text(position, content, scale, fill):
+        # 預設字型無法指定大小，先畫成遮罩再放大
+        width, height = draw.textbbox((0, 0), content, font=font)[2:]
+        mask = Image.new('L', (width, height), 0)
+        ImageDraw.Draw(mask).text((0, 0), content, font=font, fill=255)
+        mask = mask.resize((width * scale, height * scale))
+        image.paste(Image.new('RGB', mask.size, fill), position, mask)
+
+    draw.rectangle((0, 0, 900, 150), fill=(150, 30, 30))
+    text((60, 40), 'DAILY MENU', 6, (255, 255, 255))
+    y = 200
+    for _ in range(items):
+        name = ' '.join(rng.sample(WORDS, rng.randint(1, 3))).title()
+        text((60, y), name, 4, (30, 30, 30))
+        text((720, y), f'${rng.randint(3, 30) * 10}', 4, (30, 30, 30))
+        y += 80
+    return image
+
+def reencode(image, quality=50, scale=1.0):
+    """縮放後以 JPEG 重新壓縮"""
+    if scale != 1.0:
+        image = image.resize((int(image.width * scale), int(image.height * scale)))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+def crop(image, ratio):
+    """裁掉左側 ratio 與上下各 ratio / 2"""
+    width, height = image.size
+    return image.crop((int(width * ratio), int(height * ratio / 2), width, height - int(height * ratio / 2)))
+
+def create_test_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    return app
+
+def report(ok, message):
+    print(f"{'✅' if ok else '❌'} {message}")
+    return 0 if ok else 1
+
+def run_lookup(cache, image):
+    """以照片查詢快取，返回 (結果或 None, 雜湊相似度, 縮圖相似度)"""
+    image_hash, thumbnail = compute_image_signature(image)
+    original_hash, original_thumbnail = ORIGINAL_SIGNATURE
+    cached = cache.lookup(image_hash, thumbnail, 'en')
+    return (cached[0] if cached else None,
+            hash_similarity(original_hash, image_hash),
+            thumbnail_similarity(original_thumbnail, thumbnail))
+
+ORIGINAL = make_menu(1)
+ORIGINAL_SIGNATURE = compute_image_signature(ORIGINAL)
+ORIGINAL_RESULT = {'success': True, 'menu_items': [{'original_name': 'Beef Noodle Soup', 'price': 120}]}
+
+def check_same_menu_hits(cache):
+    """重新壓縮與小幅裁切的同一張菜單命中"""
+    print("\n📋 同一張菜單命中")
+    failed = 0
+    variants = [
+        ('JPEG 重新壓縮並縮小為 60%', reencode(ORIGINAL, 50, 0.6)),
+        ('裁切 1%', crop(ORIGINAL, 0.01)),
+        ('裁切 2%', crop(ORIGINAL, 0.02)),
+        ('裁切 2% 後重新壓縮並縮小為 80%', reencode(crop(ORIGINAL, 0.02), 70, 0.8)),
+    ]
+    for label, image in variants:
+        result, hash_score, thumbnail_score = run_lookup(cache, image)
+        failed += report(result == ORIGINAL_RESULT,
+                         f"{label}：命中（雜湊 {hash_score:.3f}、縮圖 {thumbnail_score:.3f}）")
+    return failed
+
+def check_different_menu_misses(cache):
+    """同版型的不同菜單不命中"""
+    print("\n📋 不同菜單不命中")
+    failed = 0
+    variants = [(f'同版型的另一份菜單（seed {seed}）', reencode(make_menu(seed), 60, 0.8)) for seed in range(2, 7)]
+    variants.append(('同一份菜單少了最後兩個品項', make_menu(1, items=12)))
+    passed_hash_filter = 0
+    for label, image in variants:
+        result, hash_score, thumbnail_score = run_lookup(cache, image)
+        passed_hash_filter += hash_score >= OCR_CACHE_HASH_SIMILARITY
+        failed += report(result is None,
+                         f"{label}：未命中（雜湊 {hash_score:.3f}、縮圖 {thumbnail_score:.3f}）")
+    # 至少要有幾張通過雜湊篩選，才能確認是縮圖比對擋下的
+    failed += report(passed_hash_filter >= 3, f"{passed_hash_filter} 張不同菜單通過雜湊篩選，由縮圖比對排除")
+    return failed
+
+def check_shift_search(cache):
+    """縮圖比對的 ±2 像素位移搜尋"""
+    print("\n📋 位移搜尋")
+    failed = 0
+    _, thumbnail = ORIGINAL_SIGNATURE
+    pixels = np.frombuffer(thumbnail, dtype=np.uint8).reshape(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+    for dy, dx in ((2, 0), (0, 2), (-2, 2)):
+        # 往下 dy、往右 dx 位移，空出的邊緣以原本的邊緣像素填補
+        shifted = np.pad(pixels, 2, mode='edge')[2 - dy:2 - dy + THUMBNAIL_SIZE, 2 - dx:2 - dx + THUMBNAIL_SIZE].tobytes()
+        without_shift = thumbnail_similarity(thumbnail, shifted, max_shift=0)
+        with_shift = thumbnail_similarity(thumbnail, shifted, max_shift=2)
+        failed += report(without_shift < OCR_CACHE_SIMILARITY <= with_shift,
+                         f"位移 ({dy}, {dx})：不搜尋 {without_shift:.3f}、搜尋 ±2 像素 {with_shift:.3f}")
+
+    failed += report(thumbnail_similarity(thumbnail, bytes(32 * 32)) < OCR_CACHE_SIMILARITY,
+                     "大小不符的舊版縮圖不相符")
+    return failed
+
+def test_ocr_cache():
+    """測試菜單 OCR 結果快取"""
+    print("🔧 開始測試菜單 OCR 結果快取...")
+    failed = 0
+    for check in (check_same_menu_hits, check_different_menu_misses, check_shift_search):
+        app = create_test_app()
+        with app.app_context():
+            db.create_all()
+            cache = OCRResultCache()
+            cache.store(*ORIGINAL_SIGNATURE, 'en', ORIGINAL_RESULT)
+            failed += check(cache)
+            db.session.remove()
+            db.drop_all()
+    assert not failed, f"菜單 OCR 結果快取測試失敗：{failed} 項"
+    print("\n🎉 菜單 OCR 結果快取測試完成")
+
+if __name__ == "__main__":
+    try:
+        test_ocr_cache()
+    except AssertionError as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試訂單記錄查詢（get_order_history_page）
+
+使用記憶體 SQLite 建立測試資料，檢查：
+- 每頁固定 2 次查詢（訂單 + 店家一次、訂單項目 + 菜品一次），與訂單數、項目數無關
+- 讀取 order.store 與 item.menu_item 時不再發出查詢
+- 以 next_cursor 逐頁取得時，所有訂單依 (order_time, order_id) 由新到舊各出現一次，
+  同一時間的多筆訂單也不會重複或遺漏
+- 無效的游標拋出 ValueError
+
+用法：
+    python test_order_history.py
+"""
+
+import os
+import sys
+import datetime
+from contextlib import contextmanager
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from sqlalchemy import event
+
+from app.models import db, User, Store, Menu, MenuItem, Order, OrderItem
+from app.api.helpers import get_order_history_page
+
+ORDER_COUNT = 45
+
+def create_test_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    return app
+
+def seed_orders():
+    """
+    建立一位使用者、三家店與 ORDER_COUNT 筆訂單（每三筆共用同一個下單時間），返回使用者 ID
+
+    SQLite 不會自動遞增 BIGINT 主鍵，使用者、訂單與訂單項目的 ID 直接指定。
+    """
+    user = User(user_id=1, line_user_id='U_test_history', preferred_lang='zh')
+    other = User(user_id=2, line_user_id='U_other', preferred_lang='en')
+    db.session.add_all([user, other])
+    stores = [Store(store_name=f"測試店家{i}", partner_level=i % 3) for i in range(3)]
+    db.session.add_all(stores)
+    db.session.flush()
+
+    menu_items = []
+    for store in stores:
+        menu = Menu(store_id=store.store_id)
+        db.session.add(menu)
+        db.session.flush()
+        for i in range(4):
+            menu_items.append(MenuItem(menu_id=menu.menu_id, item_name=f"{store.store_name}菜品{i}", price_small=50 + i * 10))
+    db.session.add_all(menu_items)
+    db.session.flush()
+
+    base_time = datetime.datetime(2025, 8, 1, 12, 0, 0)
+    order_item_id = 0
+    for index in range(ORDER_COUNT):
+        store = stores[index % 3]
+        order = Order(
+            order_id=index + 1,
+            user_id=user.user_id,
+            store_id=store.store_id,
+            order_time=base_time + datetime.timedelta(minutes=index // 3),
+            total_amount=0,
+            status='completed'
+        )
+        db.session.add(order)
+        db.session.flush()
+        store_items = menu_items[(index % 3) * 4:(index % 3) * 4 + 4]
+        for item in store_items[:index % 4 + 1]:
+            order_item_id += 1
+            db.session.add(OrderItem(order_item_id=order_item_id, order_id=order.order_id,
+                                     menu_item_id=item.menu_item_id, quantity_small=1, subtotal=item.price_small))
+            order.total_amount += item.price_small
+    # 其他使用者的訂單不應出現在結果中
+    db.session.add(Order(order_id=ORDER_COUNT + 1, user_id=other.user_id, store_id=stores[0].store_id,
+                         order_time=base_time, total_amount=0))
+    db.session.commit()
+    db.session.expunge_all()
+    return 1
+
+@contextmanager
+def count_queries():
+    """計算區塊內發出的 SQL 查詢數"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+def serialize(orders):
+    """與 /orders/history 相同的序列化方式"""
+    return [{
+        'order_id': order.order_id,
+        'store_name': order.store.store_name if order.store else "Unknown Store",
+        'items': [item.menu_item.item_name for item in order.items if item.menu_item]
+    } for order in orders]
+
+def check_query_count():
+    """每頁固定 2 次查詢，序列化時不再查詢"""
+    print("\n📋 查詢次數")
+    failed = 0
+    app = create_test_app()
+    with app.app_context():
+        db.create_all()
+        user_id = seed_orders()
+        for limit in (5, 20, 100):
+            db.session.expunge_all()
+            with count_queries() as statements:
+                orders, _ = get_order_history_page(user_id, limit=limit)
+            with count_queries() as lazy_statements:
+                data = serialize(orders)
+            ok = len(statements) == 2 and not lazy_statements and all(order['items'] for order in data)
+            failed += 0 if ok else 1
+            print(f"{'✅' if ok else '❌'} limit={limit}: {len(orders)} 筆訂單，查詢 {len(statements)} 次，"
+                  f"序列化時查詢 {len(lazy_statements)} 次")
+        db.drop_all()
+    return failed
+
+def check_keyset_pagination():
+    """逐頁取得所有訂單，順序正確且不重複、不遺漏"""
+    print("\n📋 keyset 分頁")
+    failed = 0
+    app = create_test_app()
+    with app.app_context():
+        db.create_all()
+        user_id = seed_orders()
+        expected = [
+            order.order_id for order in Order.query.filter_by(user_id=user_id)
+            .order_by(Order.order_time.desc(), Order.order_id.desc()).all()
+        ]
+        for limit in (1, 4, 7, ORDER_COUNT, ORDER_COUNT + 10):
+            seen, cursor, pages = [], None, 0
+            while True:
+                orders, cursor = get_order_history_page(user_id, limit=limit, before=cursor)
+                seen.extend(order.order_id for order in orders)
+                pages += 1
+                if cursor is None or pages > ORDER_COUNT + 1:
+                    break
+            ok = seen == expected
+            failed += 0 if ok else 1
+            print(f"{'✅' if ok else '❌'} limit={limit}: {pages} 頁，共 {len(seen)} 筆（預期 {len(expected)} 筆）")
+
+        try:
+            get_order_history_page(user_id, before='not-a-cursor')
+            print("❌ 無效游標未拋出 ValueError")
+            failed += 1
+        except ValueError:
+            print("✅ 無效游標拋出 ValueError")
+        db.drop_all()
+    return failed
+
+def test_order_history():
+    """測試訂單記錄查詢"""
+    print("🔧 開始測試訂單記錄查詢...")
+    failed = check_query_count() + check_keyset_pagination()
+    assert not failed, f"訂單記錄查詢測試失敗：{failed} 項"
+    print("\n🎉 訂單記錄查詢測試完成")
+
+if __name__ == "__main__":
+    try:
+        test_order_history()
+    except AssertionError as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 TTS 音訊快取（app/api/tts_cache.py）與語音檔清理
+
+在暫存目錄中模擬 VOICE_DIR（快取放在 VOICE_DIR/cache），檢查：
+- 相同內容只合成一次，之後的輸出檔直接由快取複製
+- 輸出檔是獨立的檔案（不是快取檔的硬連結），有自己的修改時間
+- 快取命中不會讓舊的輸出檔看起來是新的：cleanup_old_voice_files 仍會刪除過期的輸出檔，
+  剛產生的輸出檔與快取檔本身不受影響
+
+用法：
+    python test_tts_cache.py
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.api import helpers
+from app.api.tts_cache import TTSAudioCache, make_tts_cache_key
+
+AUDIO = b'\xff\xfb\x90\x64' + b'\x00' * 413
+
+def report(ok, message):
+    print(f"{'✅' if ok else '❌'} {message}")
+    return 0 if ok else 1
+
+def check_cache_hits(voice_dir):
+    """命中時不重新合成，輸出檔為獨立檔案"""
+    print("\n📋 快取命中")
+    failed = 0
+    cache = TTSAudioCache(os.path.join(voice_dir, 'cache'), gcs_bucket=None)
+    key = make_tts_cache_key('牛肉麵一碗', 'cmn-TW-Wavenet-B', 'cmn-TW', 1.0)
+    calls = []
+
+    def synthesize():
+        calls.append(1)
+        return AUDIO
+
+    first = os.path.join(voice_dir, 'order_1.mp3')
+    second = os.path.join(voice_dir, 'order_2.mp3')
+    ok = cache.get_or_create(key, first, synthesize) and cache.get_or_create(key, second, synthesize)
+    failed += report(ok and len(calls) == 1, f"兩個輸出檔只合成 {len(calls)} 次")
+    with open(second, 'rb') as file:
+        failed += report(file.read() == AUDIO, "命中時的輸出檔內容與合成結果相同")
+    failed += report(os.stat(first).st_nlink == 1 and os.stat(second).st_nlink == 1,
+                     "輸出檔不是快取檔的硬連結")
+    return failed
+
+def check_cleanup_after_hits(voice_dir):
+    """快取命中不會延長舊輸出檔的壽命"""
+    print("\n📋 命中後清理舊語音檔")
+    failed = 0
+    cache = TTSAudioCache(os.path.join(voice_dir, 'cache'), gcs_bucket=None)
+    key = make_tts_cache_key('珍珠奶茶兩杯', 'cmn-TW-Wavenet-B', 'cmn-TW', 1.0)
+
+    old_output = os.path.join(voice_dir, 'order_old.mp3')
+    cache.get_or_create(key, old_output, lambda: AUDIO)
+    # 舊輸出檔與快取檔都是兩小時前產生的
+    two_hours_ago = time.time() - 7200
+    for path in (old_output, cache._path(key)):
+        os.utime(path, (two_hours_ago, two_hours_ago))
+
+    new_output = os.path.join(voice_dir, 'order_new.mp3')
+    cache.get_or_create(key, new_output, lambda: None)
+    failed += report(os.path.getmtime(old_output) <= two_hours_ago + 1,
+                     "命中後舊輸出檔的修改時間不變")
+    failed += report(time.time() - os.path.getmtime(new_output) < 60,
+                     "新輸出檔的修改時間是現在，不沿用快取檔的時間")
+
+    original_voice_dir = helpers.VOICE_DIR
+    helpers.VOICE_DIR = voice_dir
+    try:
+        helpers.cleanup_old_voice_files(max_age=3600)
+    finally:
+        helpers.VOICE_DIR = original_voice_dir
+    failed += report(not os.path.exists(old_output), "過期的輸出檔被清理")
+    failed += report(os.path.exists(new_output), "剛產生的輸出檔保留")
+    failed += report(os.path.exists(cache._path(key)), "快取檔保留")
+    return failed
+
+def test_tts_cache():
+    """測試 TTS 音訊快取"""
+    print("🔧 開始測試 TTS 音訊快取...")
+    failed = 0
+    for check in (check_cache_hits, check_cleanup_after_hits):
+        with tempfile.TemporaryDirectory() as voice_dir:
+            failed += check(voice_dir)
+    assert not failed, f"TTS 音訊快取測試失敗：{failed} 項"
+    print("\n🎉 TTS 音訊快取測試完成")
+
+if __name__ == "__main__":
+    try:
+        test_tts_cache()
+    except AssertionError as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
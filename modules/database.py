@@ -191,6 +191,7 @@ class DatabaseManager:
                         language_code VARCHAR(5) NOT NULL,
                         description TEXT,
                         translated_summary TEXT,
+                        source_summary TEXT,
                         UNIQUE KEY uk_store_language (store_id, language_code)
                     ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin
                 """
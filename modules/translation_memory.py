@@ -0,0 +1,252 @@
+import hashlib
+import re
+import unicodedata
+from collections import OrderedDict
+from mysql.connector import Error
+from utils.logger import setup_logger
+
+logger = setup_logger('translation_memory')
+
+# 行首格式：標題（##）、編號（1.）、項目符號（-）
+LINE_PATTERN = re.compile(r'^(\s*(?:#{1,6}\s+|\d+[.)、]\s*|[-*•]\s+)?)(.*?)(\s*)$')
+
+# 行內分隔符（例如「牛肉麵 - 提及次數：5 - 湯頭濃郁」）
+INLINE_SEPARATOR = re.compile(r'(\s+[-–—]\s+)')
+
+# 數字以佔位符表示，讓「提及次數：3」與「提及次數：5」共用同一筆翻譯
+NUMBER_PATTERN = re.compile(r'\d+(?:[.,]\d+)*')
+PLACEHOLDER_PATTERN = re.compile(r'\[\[(\d+)\]\]')
+
+# 不含任何文字（僅數字、標點或空白）的片段不需翻譯
+NO_TEXT_PATTERN = re.compile(r'^[\W\d_]*$')
+
+class TranslationMemory:
+    """
+    評論摘要的片段級翻譯記憶
+
+    將摘要拆成行與行內片段，依目標語言查詢完全相符與正規化（數字佔位）相符的既有翻譯，
+    只把未見過的片段送去翻譯，最後依原本的格式重新組合。
+    """
+
+    def __init__(self, connection, cursor, max_cache_size=20000):
+        self.connection = connection
+        self.cursor = cursor
+        self.max_cache_size = max_cache_size
+
+        # (lang_code, 原始片段) -> 翻譯
+        self._exact_cache = OrderedDict()
+        # (lang_code, 正規化範本雜湊) -> 範本翻譯
+        self._template_cache = OrderedDict()
+
+        self.stats = {'exact_hits': 0, 'normalized_hits': 0, 'misses': 0}
+
+        self._check_translation_memory_table()
+
+    def _check_translation_memory_table(self):
+        """檢查並創建 translation_memory 表"""
+        create_query = """
+            CREATE TABLE IF NOT EXISTS translation_memory (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                lang_code VARCHAR(10) NOT NULL,
+                source_hash CHAR(64) NOT NULL,
+                source_text TEXT NOT NULL,
+                translated_text TEXT NOT NULL,
+                hit_count INT NOT NULL DEFAULT 0,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                UNIQUE KEY uk_lang_source (lang_code, source_hash)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin
+        """
+        self.cursor.execute(create_query)
+        self.connection.commit()
+
+    # =========================================================================
+    # 片段拆解與組合
+    # =========================================================================
+
+    @staticmethod
+    def normalize_segment(segment):
+        """
+        正規化片段：全形轉半形、合併空白、數字改為 [[n]] 佔位符
+
+        Returns:
+            tuple: (正規化範本, 依序取出的數字列表)
+        """
+        text = unicodedata.normalize('NFKC', segment)
+        text = re.sub(r'\s+', ' ', text).strip()
+        numbers = NUMBER_PATTERN.findall(text)
+        counter = iter(range(len(numbers)))
+        template = NUMBER_PATTERN.sub(lambda _: f'[[{next(counter)}]]', text)
+        return template, numbers
+
+    @staticmethod
+    def fill_placeholders(template_translation, numbers):
+        """將數字填回範本翻譯的佔位符"""
+        return PLACEHOLDER_PATTERN.sub(
+            lambda m: numbers[int(m.group(1))] if int(m.group(1)) < len(numbers) else m.group(0),
+            template_translation
+        )
+
+    @staticmethod
+    def split_document(text):
+        """
+        將摘要拆成版面骨架與待翻譯片段
+
+        Returns:
+            tuple: (parts, segments)；parts 中的整數代表 segments 的索引，字串則原樣保留
+        """
+        parts = []
+        segments = []
+        for index, line in enumerate(text.split('\n')):
+            if index > 0:
+                parts.append('\n')
+            prefix, content, suffix = LINE_PATTERN.match(line).groups()
+            parts.append(prefix)
+            for piece in INLINE_SEPARATOR.split(content):
+                if not piece or INLINE_SEPARATOR.fullmatch(piece) or NO_TEXT_PATTERN.match(piece):
+                    parts.append(piece)
+                else:
+                    parts.append(len(segments))
+                    segments.append(piece)
+            parts.append(suffix)
+        return parts, segments
+
+    @staticmethod
+    def join_document(parts, translated_segments):
+        """依版面骨架重新組合翻譯後的摘要"""
+        return ''.join(
+            translated_segments[part] if isinstance(part, int) else part
+            for part in parts
+        )
+
+    # =========================================================================
+    # 查詢與寫入
+    # =========================================================================
+
+    @staticmethod
+    def _hash(template):
+        return hashlib.sha256(template.encode('utf-8')).hexdigest()
+
+    def _remember(self, cache, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > self.max_cache_size:
+            cache.popitem(last=False)
+
+    def _load_templates(self, lang_code, hashes):
+        """從資料庫批次載入範本翻譯到記憶體快取"""
+        missing = [h for h in hashes if (lang_code, h) not in self._template_cache]
+        if not missing:
+            return
+        try:
+            placeholders = ', '.join(['%s'] * len(missing))
+            query = f"""
+                SELECT source_hash, translated_text FROM translation_memory
+                WHERE lang_code = %s AND source_hash IN ({placeholders})
+            """
+            self.cursor.execute(query, (lang_code, *missing))
+            for row in self.cursor.fetchall():
+                self._remember(self._template_cache, (lang_code, row['source_hash']), row['translated_text'])
+
+            found = [h for h in missing if (lang_code, h) in self._template_cache]
+            if found:
+                update_query = f"""
+                    UPDATE translation_memory SET hit_count = hit_count + 1
+                    WHERE lang_code = %s AND source_hash IN ({', '.join(['%s'] * len(found))})
+                """
+                self.cursor.execute(update_query, (lang_code, *found))
+                self.connection.commit()
+        except Error as e:
+            logger.error(f"讀取翻譯記憶失敗: {e}")
+
+    def _save_templates(self, lang_code, entries):
+        """將新的範本翻譯寫入資料庫"""
+        if not entries:
+            return
+        try:
+            query = """
+                INSERT INTO translation_memory (lang_code, source_hash, source_text, translated_text)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE translated_text = VALUES(translated_text)
+            """
+            self.cursor.executemany(query, [
+                (lang_code, self._hash(template), template, translation)
+                for template, translation in entries
+            ])
+            self.connection.commit()
+        except Error as e:
+            logger.error(f"儲存翻譯記憶失敗: {e}")
+            if self.connection:
+                self.connection.rollback()
+
+    def translate_document(self, text, lang_code, translate_segments):
+        """
+        以翻譯記憶翻譯整份摘要
+
+        Args:
+            text: 原文摘要
+            lang_code: 目標語言代碼
+            translate_segments: callable(list[str]) -> list[str]，翻譯未命中的範本片段，
+                                需保留 [[n]] 佔位符；失敗時回傳 None
+
+        Returns:
+            str: 翻譯後的摘要；若未命中片段翻譯失敗則回傳 None
+        """
+        parts, segments = self.split_document(text)
+        translated = [None] * len(segments)
+
+        pending = {}
+        for index, segment in enumerate(segments):
+            cached = self._exact_cache.get((lang_code, segment))
+            if cached is not None:
+                self._exact_cache.move_to_end((lang_code, segment))
+                translated[index] = cached
+                self.stats['exact_hits'] += 1
+                continue
+            template, numbers = self.normalize_segment(segment)
+            pending.setdefault(template, []).append((index, numbers))
+
+        hashes = {template: self._hash(template) for template in pending}
+        self._load_templates(lang_code, list(hashes.values()))
+
+        misses = []
+        for template, occurrences in pending.items():
+            template_translation = self._template_cache.get((lang_code, hashes[template]))
+            if template_translation is None:
+                misses.append(template)
+                self.stats['misses'] += len(occurrences)
+                continue
+            self.stats['normalized_hits'] += len(occurrences)
+            self._apply(lang_code, segments, translated, occurrences, template_translation)
+
+        if misses:
+            logger.info(f"翻譯記憶命中 {len(segments) - sum(len(pending[t]) for t in misses)}/{len(segments)} 個片段，"
+                        f"送出 {len(misses)} 個未見過的片段翻譯到 {lang_code}")
+            results = translate_segments(misses)
+            if not results or len(results) != len(misses):
+                return None
+
+            new_entries = []
+            for template, template_translation in zip(misses, results):
+                expected = set(PLACEHOLDER_PATTERN.findall(template))
+                if not template_translation or set(PLACEHOLDER_PATTERN.findall(template_translation)) != expected:
+                    logger.warning(f"片段翻譯遺失佔位符，放棄使用翻譯記憶: {template}")
+                    return None
+                new_entries.append((template, template_translation))
+                self._remember(self._template_cache, (lang_code, hashes[template]), template_translation)
+                self._apply(lang_code, segments, translated, pending[template], template_translation)
+            self._save_templates(lang_code, new_entries)
+
+        return self.join_document(parts, translated)
+
+    def _apply(self, lang_code, segments, translated, occurrences, template_translation):
+        for index, numbers in occurrences:
+            translated[index] = self.fill_placeholders(template_translation, numbers)
+            self._remember(self._exact_cache, (lang_code, segments[index]), translated[index])
+
+    def get_hit_rate(self):
+        """取得翻譯記憶命中率"""
+        total = sum(self.stats.values())
+        if total == 0:
+            return 0.0
+        return (self.stats['exact_hits'] + self.stats['normalized_hits']) / total
@@ -1,11 +1,18 @@
 import google.generativeai as genai
 from utils.logger import setup_logger
+from modules.translation_memory import TranslationMemory
+import difflib
+import json
+import re
 import mysql.connector
 from mysql.connector import Error
 
 logger = setup_logger('translator')
 
 class ReviewTranslator:
+    # 摘要變動比例超過此門檻時才整份重新翻譯，否則只翻譯變動的行
+    DIFF_RETRANSLATE_THRESHOLD = 0.5
+    
     def __init__(self, config):
         self.api_key = config['api_keys']['REVIEW_GEMINI_API_KEY']
         genai.configure(api_key=self.api_key)
@@ -19,6 +26,9 @@ class ReviewTranslator:
         # 語言對應表 - 將從資料庫動態載入
         self.language_mapping = {}
         
+        # 片段級翻譯記憶（資料庫連接成功後建立）
+        self.translation_memory = None
+        
         # 初始化資料庫連接並載入語言設定
         self._initialize_database()
     
@@ -42,6 +52,12 @@ class ReviewTranslator:
                 # 載入語言設定
                 self._load_languages()
                 
+                # 確認翻譯記錄保存來源原文的欄位
+                self._check_source_summary_column()
+                
+                # 初始化翻譯記憶
+                self._initialize_translation_memory()
+                
         except Error as e:
             logger.error(f"翻譯器資料庫連接失敗: {e}")
             raise
@@ -83,6 +99,65 @@ class ReviewTranslator:
                 'zh-TW': 'Traditional Chinese (Taiwan)'
             }
     
+    def _check_source_summary_column(self):
+        """檢查 store_translations 是否有 source_summary 欄位（每種語言翻譯所依據的原文），沒有則新增"""
+        try:
+            check_query = """
+                SELECT COUNT(*) as count
+                FROM information_schema.columns
+                WHERE table_schema = %s AND table_name = 'store_translations'
+                  AND column_name = 'source_summary'
+            """
+            self.cursor.execute(check_query, (self.db_config['mysql']['database'],))
+            result = self.cursor.fetchone()
+            
+            if result['count'] == 0:
+                self.cursor.execute("ALTER TABLE store_translations ADD COLUMN source_summary TEXT")
+                self.connection.commit()
+                logger.info("store_translations 新增 source_summary 欄位")
+                
+        except Error as e:
+            logger.error(f"檢查 store_translations.source_summary 欄位時發生錯誤: {e}")
+    
+    def _initialize_translation_memory(self):
+        """初始化片段級翻譯記憶，失敗時退回整份翻譯"""
+        try:
+            self.translation_memory = TranslationMemory(self.connection, self.cursor)
+            logger.info("翻譯記憶初始化成功")
+        except Error as e:
+            logger.warning(f"翻譯記憶初始化失敗，將使用整份翻譯: {e}")
+            self.translation_memory = None
+    
+    def _translate_segments(self, segments, target_language):
+        """以單次 Gemini 呼叫翻譯多個摘要片段，回傳與輸入等長的列表"""
+        try:
+            prompt = f"""
+請將以下 JSON 陣列中的每個繁體中文餐廳評論摘要片段翻譯成{target_language}。
+
+翻譯要求：
+1. 只輸出一個 JSON 字串陣列，長度與順序必須和輸入相同，不要有任何說明文字
+2. [[0]]、[[1]] 等佔位符代表數字，必須原樣保留在譯文中
+3. 菜品名稱可以保留中文並加上{target_language}翻譯
+4. 翻譯要自然流暢，使用專業的餐廳評論術語
+
+{json.dumps(segments, ensure_ascii=False)}
+"""
+            response = self.model.generate_content(prompt)
+            if not response or not response.text:
+                logger.error("Gemini API 片段翻譯沒有返回結果")
+                return None
+            
+            text = re.sub(r'^```(?:json)?\s*|\s*```$', '', response.text.strip())
+            results = json.loads(text)
+            if not isinstance(results, list) or len(results) != len(segments):
+                logger.error(f"片段翻譯結果數量不符: 預期 {len(segments)}")
+                return None
+            return [str(item).strip() for item in results]
+            
+        except Exception as e:
+            logger.error(f"片段翻譯到 {target_language} 時發生錯誤: {e}")
+            return None
+    
     def translate_review_summary(self, review_summary, target_lang_code):
         """翻譯評論摘要"""
         try:
@@ -98,6 +173,19 @@ class ReviewTranslator:
             # 取得目標語言名稱
             target_language = self.language_mapping.get(target_lang_code, target_lang_code)
             
+            # 優先使用翻譯記憶，只翻譯未見過的片段
+            if self.translation_memory:
+                translated_text = self.translation_memory.translate_document(
+                    review_summary,
+                    target_lang_code,
+                    lambda segments: self._translate_segments(segments, target_language)
+                )
+                if translated_text:
+                    logger.info(f"以翻譯記憶完成 {target_language} 翻譯，"
+                                f"累計命中率 {self.translation_memory.get_hit_rate():.1%}")
+                    return translated_text
+                logger.warning(f"翻譯記憶無法完成 {target_language} 翻譯，改為整份翻譯")
+            
             # 針對資料庫中的不同語言設計翻譯提示
 
             # 其他語言或未知語言使用通用模板
@@ -132,6 +220,65 @@ class ReviewTranslator:
             logger.error(f"翻譯評論摘要到 {target_lang_code} 時發生錯誤: {e}")
             return ""
     
+    def _translate_lines(self, lines, target_lang_code):
+        """翻譯多行摘要內容，回傳逐行對應的譯文列表"""
+        target_language = self.language_mapping.get(target_lang_code, target_lang_code)
+        if self.translation_memory:
+            translated_text = self.translation_memory.translate_document(
+                '\n'.join(lines),
+                target_lang_code,
+                lambda segments: self._translate_segments(segments, target_language)
+            )
+            if translated_text is not None:
+                return translated_text.split('\n')
+        return self._translate_segments(lines, target_language)
+    
+    def _patch_translation(self, previous_summary, previous_translation, review_summary, target_lang_code):
+        """
+        依新舊摘要的逐行差異修補既有翻譯，只重新翻譯變動的行
+        
+        Returns:
+            str: 修補後的翻譯；變動超過門檻或舊翻譯無法逐行對齊時回傳 None
+        """
+        old_lines = previous_summary.split('\n')
+        new_lines = review_summary.split('\n')
+        old_translated_lines = previous_translation.split('\n')
+        
+        # 舊翻譯必須與舊原文逐行對齊，才能安全地沿用未變動的行
+        if len(old_translated_lines) != len(old_lines):
+            logger.info(f"{target_lang_code} 舊翻譯無法與原文逐行對齊，改為整份翻譯")
+            return None
+        
+        matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+        opcodes = matcher.get_opcodes()
+        changed_indexes = [
+            j for tag, _, _, j1, j2 in opcodes if tag in ('replace', 'insert')
+            for j in range(j1, j2)
+        ]
+        change_ratio = 1 - matcher.ratio()
+        if change_ratio > self.DIFF_RETRANSLATE_THRESHOLD:
+            logger.info(f"摘要變動比例 {change_ratio:.0%} 超過門檻，{target_lang_code} 改為整份翻譯")
+            return None
+        
+        # 空白行不需翻譯
+        to_translate = [j for j in changed_indexes if new_lines[j].strip()]
+        translated_changes = {}
+        if to_translate:
+            results = self._translate_lines([new_lines[j] for j in to_translate], target_lang_code)
+            if not results or len(results) != len(to_translate):
+                return None
+            translated_changes = dict(zip(to_translate, results))
+        
+        patched_lines = []
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag == 'equal':
+                patched_lines.extend(old_translated_lines[i1:i2])
+            elif tag in ('replace', 'insert'):
+                patched_lines.extend(translated_changes.get(j, new_lines[j]) for j in range(j1, j2))
+        
+        logger.info(f"{target_lang_code} 差異翻譯：重新翻譯 {len(to_translate)}/{len(new_lines)} 行")
+        return '\n'.join(patched_lines)
+    
     def batch_translate_and_save(self, store_id, review_summary):
         """批量翻譯並儲存到資料庫"""
         try:
@@ -154,12 +301,26 @@ class ReviewTranslator:
                     lang_name = self.language_mapping[lang_code]
                     logger.info(f"正在翻譯到 {lang_name} ({lang_code})")
                     
+                    # 差異以該語言翻譯所依據的原文為基準，某語言上次失敗時不會沿用或修補到錯誤的版本
+                    translation = None
+                    previous_translation, previous_summary = self._get_translation_record(store_id, lang_code)
+                    if previous_translation and previous_summary:
+                        if previous_summary == review_summary:
+                            # 摘要未變動，直接沿用既有翻譯
+                            translations[lang_code] = previous_translation
+                            logger.info(f"摘要未變動，沿用既有 {lang_name} 翻譯")
+                            continue
+                        translation = self._patch_translation(
+                            previous_summary, previous_translation, review_summary, lang_code
+                        )
+                    
                     # 執行翻譯
-                    translation = self.translate_review_summary(review_summary, lang_code)
+                    if not translation:
+                        translation = self.translate_review_summary(review_summary, lang_code)
                     
                     if translation:
                         # 儲存翻譯到資料庫
-                        if self._save_translation_to_db(store_id, lang_code, translation):
+                        if self._save_translation_to_db(store_id, lang_code, translation, review_summary):
                             translations[lang_code] = translation
                             logger.info(f"成功翻譯並儲存到 {lang_name}")
                         else:
@@ -176,7 +337,7 @@ class ReviewTranslator:
                     continue
             
             # 同時儲存原文（繁體中文）
-            if self._save_translation_to_db(store_id, 'zh-TW', review_summary):
+            if self._save_translation_to_db(store_id, 'zh-TW', review_summary, review_summary):
                 translations['zh-TW'] = review_summary
                 logger.info("成功儲存原文（繁體中文）")
             
@@ -187,8 +348,8 @@ class ReviewTranslator:
             logger.error(f"批量翻譯處理失敗: {e}")
             return {}
     
-    def _save_translation_to_db(self, store_id, lang_code, translation):
-        """將翻譯結果儲存到資料庫"""
+    def _save_translation_to_db(self, store_id, lang_code, translation, source_summary):
+        """將翻譯結果與其依據的原文儲存到資料庫"""
         try:
             # 檢查是否已存在該店家和語言的翻譯
             check_query = """
@@ -202,19 +363,19 @@ class ReviewTranslator:
                 # 更新現有記錄 - 注意這裡 translated_summary 欄位用來存放翻譯後的摘要
                 update_query = """
                     UPDATE store_translations 
-                    SET translated_summary = %s
+                    SET translated_summary = %s, source_summary = %s
                     WHERE store_id = %s AND language_code = %s
                 """
-                self.cursor.execute(update_query, (translation, store_id, lang_code))
+                self.cursor.execute(update_query, (translation, source_summary, store_id, lang_code))
                 logger.debug(f"更新店家 {store_id} 語言 {lang_code} 的翻譯")
             else:
                 # 插入新記錄 - 注意這裡 translated_summary 欄位用來存放翻譯後的摘要
                 insert_query = """
                     INSERT INTO store_translations (
-                        store_id, language_code, translated_summary
-                    ) VALUES (%s, %s, %s)
+                        store_id, language_code, translated_summary, source_summary
+                    ) VALUES (%s, %s, %s, %s)
                 """
-                self.cursor.execute(insert_query, (store_id, lang_code, translation))
+                self.cursor.execute(insert_query, (store_id, lang_code, translation, source_summary))
                 logger.debug(f"新增店家 {store_id} 語言 {lang_code} 的翻譯")
             
             self.connection.commit()
@@ -226,6 +387,28 @@ class ReviewTranslator:
                 self.connection.rollback()
             return False
     
+    def _get_translation_record(self, store_id, lang_code):
+        """
+        取得既有翻譯與其依據的原文
+        
+        Returns:
+            tuple: (translated_summary, source_summary)；找不到或舊資料沒有原文時對應值為 None
+        """
+        try:
+            query = """
+                SELECT translated_summary, source_summary FROM store_translations 
+                WHERE store_id = %s AND language_code = %s
+            """
+            self.cursor.execute(query, (store_id, lang_code))
+            result = self.cursor.fetchone()
+            if result:
+                return result['translated_summary'], result['source_summary']
+            return None, None
+            
+        except Error as e:
+            logger.error(f"從資料庫取得翻譯記錄失敗: {e}")
+            return None, None
+    
     def get_translation_from_db(self, store_id, lang_code):
         """從資料庫取得翻譯"""
         try:
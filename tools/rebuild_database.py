@@ -1,8 +1,41 @@
+import argparse
 import configparser
+import csv
+import datetime
 import mysql.connector
 from mysql.connector import Error
 import os
+import random
 import re # 導入正則表達式模組
+import time
+
+# 從 order_menu.sql 中提取所有 CREATE TABLE 的表格名稱
+TABLES_TO_DROP = [
+    'account',
+    'crawl_logs',
+    'gemini_processing',
+    'languages',
+    'menu_crawls',
+    'menu_items',
+    'menu_templates',
+    'menu_translations',
+    'menus',
+    'ocr_menu_items',
+    'ocr_menus',
+    'order_items',
+    'orders',
+    'store_translations',
+    'stores',
+    'reviews',
+    'user_actions',
+    'users'
+]
+
+# CSV 固定資料中代表 NULL 的寫法（與 LOAD DATA INFILE 相同）
+CSV_NULL = '\\N'
+
+# 多筆 INSERT 每批的列數，避免超過 max_allowed_packet
+DEFAULT_BATCH_SIZE = 5000
 
 def get_db_config(config_file_path):
     """讀取資料庫設定檔"""
@@ -21,12 +54,97 @@ def get_db_config(config_file_path):
         print(f"錯誤：無法讀取或解析設定檔 {config_file_path}：{e}")
         return None
 
+def split_sql_statements(sql_script):
+    """將 SQL 腳本拆分為單個語句，並過濾掉空語句和註釋"""
+    sql_commands = []
+    # 移除多行註釋
+    sql_script = re.sub(r'/\*.*?\*/', '', sql_script, flags=re.DOTALL)
+    # 按分號分割，同時處理單行註釋
+    for statement in sql_script.split(';'):
+        clean_statement = statement.strip()
+        if clean_statement and not clean_statement.startswith('--') and not clean_statement.startswith('#'):
+            sql_commands.append(clean_statement)
+    return sql_commands
+
+def _create_table_name(statement):
+    """取得 CREATE TABLE 語句的表格名稱，非 CREATE TABLE 則回傳 None"""
+    match = re.match(r'CREATE\s+TABLE\s+`?(\w+)`?', statement, flags=re.IGNORECASE)
+    return match.group(1) if match else None
+
+def _topological_order(tables, parents):
+    """穩定的拓撲排序：依原始順序挑選父表格皆已排入的表格（循環相依時保留原順序）"""
+    ordered = []
+    remaining = list(tables)
+    while remaining:
+        ready = next((t for t in remaining if (parents.get(t, set()) & set(remaining)) == set()), remaining[0])
+        ordered.append(ready)
+        remaining.remove(ready)
+    return ordered
+
+def order_statements_by_dependency(sql_commands):
+    """
+    依外鍵相依順序重新排列 CREATE TABLE 語句，被參照的表格會先建立。
+    只在連續的 CREATE TABLE 區段內調整順序，ALTER、SET 等語句維持原位，
+    以免改變後續遷移語句的語意。
+    """
+    # 收集每個表格參照的父表格（包含內嵌 CONSTRAINT 與 ALTER TABLE ADD CONSTRAINT）
+    parents = {}
+    for command in sql_commands:
+        owner = _create_table_name(command)
+        if owner is None:
+            alter = re.match(r'ALTER\s+TABLE\s+`?(\w+)`?', command, flags=re.IGNORECASE)
+            owner = alter.group(1) if alter else None
+        if owner is None:
+            continue
+        for parent in re.findall(r'REFERENCES\s+`?(\w+)`?', command, flags=re.IGNORECASE):
+            if parent != owner:
+                parents.setdefault(owner, set()).add(parent)
+
+    ordered = []
+    block = []
+
+    def flush_block():
+        statements = {}
+        for command in block:
+            statements.setdefault(_create_table_name(command), []).append(command)
+        for table in _topological_order(list(statements), parents):
+            ordered.extend(statements[table])
+        block.clear()
+
+    for command in sql_commands:
+        if _create_table_name(command):
+            block.append(command)
+        else:
+            flush_block()
+            ordered.append(command)
+    flush_block()
+    return ordered
+
+def get_table_load_order(cursor, db_name):
+    """從 information_schema 取得外鍵關係，回傳父表格在前的表格順序"""
+    cursor.execute(
+        "SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME",
+        (db_name,)
+    )
+    tables = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT TABLE_NAME, REFERENCED_TABLE_NAME FROM information_schema.KEY_COLUMN_USAGE "
+        "WHERE TABLE_SCHEMA = %s AND REFERENCED_TABLE_NAME IS NOT NULL",
+        (db_name,)
+    )
+    parents = {table: set() for table in tables}
+    for table, parent in cursor.fetchall():
+        if table in parents and parent != table:
+            parents[table].add(parent)
+
+    return _topological_order(tables, parents)
+
 def execute_sql_from_file(sql_file_path, db_config):
     """
     連接到 MySQL 資料庫並執行 SQL 檔案中的所有命令。
     此函數會首先嘗試連接到不指定資料庫的執行個體，
     然後切換到目標資料庫，首先執行 DROP TABLE 命令，
-    最後執行 SQL 腳本中的 CREATE TABLE 及其他命令。
+    最後依外鍵相依順序執行 SQL 腳本中的 CREATE TABLE 及其他命令。
     """
     conn = None
     cursor = None
@@ -56,30 +174,8 @@ def execute_sql_from_file(sql_file_path, db_config):
         cursor.execute("SET FOREIGN_KEY_CHECKS = 0;")
         print("暫時禁用外部鍵檢查。")
 
-        # 從 order_menu.sql 中提取所有 CREATE TABLE 的表格名稱
-        tables_to_drop = [
-            'account',
-            'crawl_logs',
-            'gemini_processing',
-            'languages',
-            'menu_crawls',
-            'menu_items',
-            'menu_templates',
-            'menu_translations',
-            'menus',
-            'ocr_menu_items',
-            'ocr_menus',
-            'order_items',
-            'orders',
-            'store_translations',
-            'stores',
-            'reviews',
-            'user_actions',
-            'users'
-        ]
-
         print("正在嘗試刪除所有現有表格 (如果存在)...")
-        for table_name in tables_to_drop:
+        for table_name in TABLES_TO_DROP:
             try:
                 cursor.execute(f"DROP TABLE IF EXISTS `{table_name}`;")
                 print(f"  - 表格 `{table_name}` 已刪除 (或不存在)。")
@@ -99,15 +195,7 @@ def execute_sql_from_file(sql_file_path, db_config):
         with open(sql_file_path, 'r', encoding='utf-8') as file:
             sql_script = file.read()
 
-        # 將 SQL 腳本拆分為單個語句，並過濾掉空語句和註釋
-        sql_commands = []
-        # 移除多行註釋
-        sql_script = re.sub(r'/\*.*?\*/', '', sql_script, flags=re.DOTALL)
-        # 按分號分割，同時處理單行註釋
-        for statement in sql_script.split(';'):
-            clean_statement = statement.strip()
-            if clean_statement and not clean_statement.startswith('--') and not clean_statement.startswith('#'):
-                sql_commands.append(clean_statement)
+        sql_commands = order_statements_by_dependency(split_sql_statements(sql_script))
 
         # 執行 SQL 命令
         print(f"正在執行 {len(sql_commands)} 個 SQL 語句以重建表格結構...")
@@ -134,7 +222,7 @@ def execute_sql_from_file(sql_file_path, db_config):
         else:
             print("目前資料庫中沒有表格。")
         # --- 列出表格結束 ---
-
+        return True
 
     except Error as e:
         print(f"資料庫操作錯誤：{e}")
@@ -148,15 +236,356 @@ def execute_sql_from_file(sql_file_path, db_config):
         if conn and conn.is_connected():
             conn.close()
             print("資料庫連線已關閉。")
+    return False
+
+# =============================================================================
+# 快速載入固定資料（fixtures）
+# =============================================================================
+
+def _defer_secondary_indexes(cursor, db_name, table):
+    """
+    移除表格上的次要索引並回傳重建用的 ALTER TABLE 語句。
+    主鍵、唯一索引與外鍵所依賴的索引會保留：唯一索引在載入時就擋下重複資料，
+    避免載入完成後才在重建時失敗；外鍵存在時其索引無法刪除。
+    """
+    cursor.execute(
+        "SELECT INDEX_NAME, NON_UNIQUE, COLUMN_NAME, SUB_PART FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND INDEX_NAME <> 'PRIMARY' "
+        "ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+        (db_name, table)
+    )
+    indexes = {}
+    for index_name, non_unique, column_name, sub_part in cursor.fetchall():
+        entry = indexes.setdefault(index_name, {'unique': not non_unique, 'columns': []})
+        column = f"`{column_name}`({sub_part})" if sub_part else f"`{column_name}`"
+        entry['columns'].append((column_name, column))
+
+    cursor.execute(
+        "SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE "
+        "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND REFERENCED_TABLE_NAME IS NOT NULL",
+        (db_name, table)
+    )
+    fk_columns = {row[0] for row in cursor.fetchall()}
+
+    drops, adds = [], []
+    for index_name, entry in indexes.items():
+        if entry['unique'] or entry['columns'][0][0] in fk_columns:
+            continue
+        drops.append(f"DROP INDEX `{index_name}`")
+        columns = ', '.join(column for _, column in entry['columns'])
+        adds.append(f"ADD KEY `{index_name}` ({columns})")
+
+    if not drops:
+        return None
+    # 一次 ALTER 處理所有索引，表格只需重建一次
+    cursor.execute(f"ALTER TABLE `{table}` {', '.join(drops)}")
+    return f"ALTER TABLE `{table}` {', '.join(adds)}"
+
+def _restore_secondary_indexes(cursor, deferred_indexes):
+    """
+    重建 _defer_secondary_indexes 移除的索引（載入失敗時也會執行）。
+    重建失敗時印出 ALTER TABLE 語句供手動執行。
+
+    Returns:
+        bool: 是否全部重建成功
+    """
+    restored = True
+    for table, rebuild in deferred_indexes:
+        try:
+            cursor.execute(rebuild)
+            print(f"  - `{table}` 索引已重建")
+        except Error as e:
+            restored = False
+            print(f"  - `{table}` 索引重建失敗：{e}")
+            print(f"    請手動執行：{rebuild};")
+    return restored
+
+def _read_csv_fixture(csv_path):
+    """讀取 CSV 固定資料，第一列為欄位名稱，\\N 代表 NULL"""
+    with open(csv_path, 'r', encoding='utf-8', newline='') as file:
+        reader = csv.reader(file)
+        columns = next(reader)
+        rows = [tuple(None if value == CSV_NULL else value for value in row) for row in reader]
+    return columns, rows
+
+def _insert_rows(cursor, table, columns, rows, batch_size):
+    """以多筆 VALUES 的 INSERT 語句分批寫入"""
+    column_sql = ', '.join(f"`{column}`" for column in columns)
+    row_placeholder = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        values_sql = ', '.join([row_placeholder] * len(batch))
+        params = [value for row in batch for value in row]
+        cursor.execute(f"INSERT INTO `{table}` ({column_sql}) VALUES {values_sql}", params)
+
+def _load_data_infile(cursor, table, csv_path, columns):
+    """
+    以 LOAD DATA LOCAL INFILE 直接載入 CSV（需伺服器允許 local_infile）
+
+    ESCAPED BY '' 讓資料中的反斜線保持原樣，因此 \\N 不會被視為 NULL；
+    各欄先讀入使用者變數，再以 NULLIF 轉換，結果與 _read_csv_fixture 的 INSERT 路徑一致。
+    """
+    variables = [f"@c{index}" for index in range(len(columns))]
+    assignments = ', '.join(
+        f"`{column}` = NULLIF({variable}, %s)" for column, variable in zip(columns, variables)
+    )
+    cursor.execute(
+        f"LOAD DATA LOCAL INFILE %s INTO TABLE `{table}` CHARACTER SET utf8mb4 "
+        f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+        f"LINES TERMINATED BY '\\r\\n' IGNORE 1 LINES ({', '.join(variables)}) SET {assignments}",
+        (os.path.abspath(csv_path), *([CSV_NULL] * len(columns)))
+    )
+
+def load_fixtures(fixture_dir, db_config, use_load_data=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    從 CSV 固定資料目錄快速載入資料（檔名為 <表格名稱>.csv）。
+    依外鍵相依順序載入，載入期間停用外鍵檢查，
+    非唯一的次要索引先移除，資料載入完成（或失敗）後再一次建立。
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = mysql.connector.connect(
+            host=db_config['host'],
+            user=db_config['user'],
+            password=db_config['password'],
+            port=db_config['port'],
+            database=db_config['database'],
+            allow_local_infile=use_load_data
+        )
+        cursor = conn.cursor()
+        db_name = db_config['database']
+
+        fixtures = {
+            os.path.splitext(name)[0]: os.path.join(fixture_dir, name)
+            for name in os.listdir(fixture_dir) if name.endswith('.csv')
+        }
+        tables = [t for t in get_table_load_order(cursor, db_name) if t in fixtures]
+        missing = sorted(set(fixtures) - set(tables))
+        if missing:
+            print(f"警告：以下固定資料沒有對應的表格，將略過：{', '.join(missing)}")
+
+        cursor.execute("SET autocommit = 0, foreign_key_checks = 0;")
+        print(f"開始載入 {len(tables)} 個表格的固定資料...")
+        started = time.perf_counter()
+        total_rows = 0
+        deferred_indexes = []
+        try:
+            for table in tables:
+                table_started = time.perf_counter()
+                rebuild = _defer_secondary_indexes(cursor, db_name, table)
+                if rebuild:
+                    deferred_indexes.append((table, rebuild))
+
+                columns, rows = _read_csv_fixture(fixtures[table])
+                if use_load_data:
+                    _load_data_infile(cursor, table, fixtures[table], columns)
+                else:
+                    _insert_rows(cursor, table, columns, rows, batch_size)
+                conn.commit()
+                total_rows += len(rows)
+                print(f"  - `{table}` 已載入 {len(rows)} 筆 ({time.perf_counter() - table_started:.2f}s)")
+        except Exception:
+            # 重建索引的 ALTER TABLE 會隱含提交，先回復失敗表格中未提交的資料
+            conn.rollback()
+            raise
+        finally:
+            print("正在重建次要索引...")
+            indexes_restored = _restore_secondary_indexes(cursor, deferred_indexes)
+
+        cursor.execute("SET foreign_key_checks = 1;")
+        conn.commit()
+        if not indexes_restored:
+            print("固定資料已載入，但部分索引重建失敗，請依上方語句手動重建。")
+            return False
+        print(f"固定資料載入完成：共 {total_rows} 筆，耗時 {time.perf_counter() - started:.2f}s")
+        return True
+
+    except Error as e:
+        print(f"載入固定資料失敗：{e}")
+        if conn:
+            conn.rollback()
+    except FileNotFoundError:
+        print(f"錯誤：找不到固定資料目錄 '{fixture_dir}'。")
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+    return False
+
+# =============================================================================
+# 快照與還原（在同一個 MySQL 執行個體內複製，不經過網路傳輸資料）
+# =============================================================================
+
+def _copy_tables(cursor, source_db, target_db, tables):
+    """將 source_db 的表格資料複製到 target_db（目標表格不存在時以 LIKE 建立）"""
+    cursor.execute(
+        "SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s",
+        (target_db,)
+    )
+    existing = {row[0] for row in cursor.fetchall()}
+    for table in tables:
+        if table in existing:
+            cursor.execute(f"TRUNCATE TABLE `{target_db}`.`{table}`")
+        else:
+            cursor.execute(f"CREATE TABLE `{target_db}`.`{table}` LIKE `{source_db}`.`{table}`")
+        cursor.execute(f"INSERT INTO `{target_db}`.`{table}` SELECT * FROM `{source_db}`.`{table}`")
+        print(f"  - `{table}` 已複製")
+
+def snapshot_database(db_config, snapshot_name=None, restore=False):
+    """
+    建立或還原已載入資料的資料庫快照。
+    快照是同一執行個體上的另一個 schema（預設為 <database>_snapshot）；
+    還原時只清空並重新填入資料，保留目標資料庫原有的外鍵與索引。
+    """
+    db_name = db_config['database']
+    snapshot_name = snapshot_name or f"{db_name}_snapshot"
+    source_db, target_db = (snapshot_name, db_name) if restore else (db_name, snapshot_name)
+
+    conn = None
+    cursor = None
+    try:
+        conn = mysql.connector.connect(
+            host=db_config['host'],
+            user=db_config['user'],
+            password=db_config['password'],
+            port=db_config['port']
+        )
+        cursor = conn.cursor()
+        if not restore:
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{snapshot_name}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;")
+
+        cursor.execute("SET foreign_key_checks = 0, unique_checks = 0;")
+        started = time.perf_counter()
+        tables = get_table_load_order(cursor, source_db)
+        if not tables:
+            print(f"錯誤：資料庫 '{source_db}' 中沒有可複製的表格。")
+            return False
+
+        print(f"{'還原' if restore else '建立'}快照：`{source_db}` -> `{target_db}`")
+        _copy_tables(cursor, source_db, target_db, tables)
+        cursor.execute("SET foreign_key_checks = 1, unique_checks = 1;")
+        conn.commit()
+        print(f"快照{'還原' if restore else '建立'}完成，耗時 {time.perf_counter() - started:.2f}s")
+        return True
+
+    except Error as e:
+        print(f"快照操作失敗：{e}")
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+    return False
+
+# =============================================================================
+# 產生效能測試用的固定資料
+# =============================================================================
+
+BENCHMARK_LANGUAGES = [('zh', '中文'), ('en', 'English'), ('ja', '日本語'), ('ko', '한국어')]
+BENCHMARK_DISHES = ['牛肉麵', '滷肉飯', '雞排', '水餃', '珍珠奶茶', '蚵仔煎', '小籠包', '炒米粉', '鹹酥雞', '豆花']
+
+def generate_benchmark_fixtures(output_dir, store_count=2500, items_per_store=20, orders_per_store=5, seed=42):
+    """
+    產生接近真實分佈的 CSV 固定資料。
+    預設 2500 家店家約產生 10 萬筆資料（店家、菜單、品項、使用者、訂單、訂單品項）。
+    """
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    now = datetime.datetime(2025, 1, 1)
+
+    def write(table, columns, rows):
+        path = os.path.join(output_dir, f"{table}.csv")
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file, lineterminator='\r\n')
+            writer.writerow(columns)
+            writer.writerows(rows)
+        print(f"  - {table}.csv：{len(rows)} 筆")
+        return len(rows)
+
+    print(f"正在產生效能測試固定資料到 {output_dir}...")
+    total = write('languages', ['lang_code', 'lang_name'], BENCHMARK_LANGUAGES)
+
+    stores = []
+    for store_id in range(1, store_count + 1):
+        dishes = rng.sample(BENCHMARK_DISHES, 5)
+        stores.append((
+            store_id, f"測試店家{store_id}", rng.choice([0, 0, 1, 2]),
+            round(25.0 + rng.random() * 0.2, 6), round(121.45 + rng.random() * 0.2, 6),
+            f"ChIJbench{store_id:08d}",
+            f"## 網友好評菜品Top5\n1. {dishes[0]}\n2. {dishes[1]}\n3. {dishes[2]}",
+            *dishes
+        ))
+    total += write('stores', ['store_id', 'store_name', 'partner_level', 'gps_lat', 'gps_lng', 'place_id',
+                              'review_summary', 'top_dish_1', 'top_dish_2', 'top_dish_3', 'top_dish_4', 'top_dish_5'], stores)
+    total += write('menus', ['menu_id', 'store_id', 'version', 'effective_date'],
+                   [(store_id, store_id, 1, now.strftime('%Y-%m-%d %H:%M:%S')) for store_id in range(1, store_count + 1)])
+
+    menu_items = []
+    prices = {}
+    for store_id in range(1, store_count + 1):
+        for n in range(items_per_store):
+            menu_item_id = (store_id - 1) * items_per_store + n + 1
+            price_small = rng.randrange(40, 300, 5)
+            price_big = price_small + 20 if rng.random() < 0.3 else CSV_NULL
+            prices[menu_item_id] = price_small
+            menu_items.append((menu_item_id, store_id, f"{rng.choice(BENCHMARK_DISHES)}{n + 1}", price_big, price_small))
+    total += write('menu_items', ['menu_item_id', 'menu_id', 'item_name', 'price_big', 'price_small'], menu_items)
+
+    user_count = store_count * 2
+    total += write('users', ['user_id', 'line_user_id', 'preferred_lang'],
+                   [(user_id, f"Ubench{user_id:010d}", rng.choice(BENCHMARK_LANGUAGES)[0]) for user_id in range(1, user_count + 1)])
+
+    orders, order_items = [], []
+    order_item_id = 0
+    for order_id in range(1, store_count * orders_per_store + 1):
+        store_id = rng.randint(1, store_count)
+        total_amount = 0
+        for _ in range(2):
+            order_item_id += 1
+            menu_item_id = (store_id - 1) * items_per_store + rng.randint(1, items_per_store)
+            quantity = rng.randint(1, 3)
+            subtotal = quantity * prices[menu_item_id]
+            total_amount += subtotal
+            order_items.append((order_item_id, order_id, menu_item_id, 0, quantity, CSV_NULL, prices[menu_item_id], subtotal))
+        order_time = now + datetime.timedelta(minutes=rng.randint(0, 60 * 24 * 180))
+        orders.append((order_id, rng.randint(1, user_count), store_id, order_time.strftime('%Y-%m-%d %H:%M:%S'),
+                       rng.choice(BENCHMARK_LANGUAGES)[0], total_amount))
+    total += write('orders', ['order_id', 'user_id', 'store_id', 'order_time', 'language_used', 'total_amount'], orders)
+    total += write('order_items', ['order_item_id', 'order_id', 'menu_item_id', 'quantity_big', 'quantity_small',
+                                   'price_big', 'price_small', 'subtotal'], order_items)
+
+    print(f"固定資料產生完成：共 {total} 筆。")
+    return total
 
 if __name__ == "__main__":
     # 根據您的檔案結構，config.ini 在 tools 目錄的上一層
     current_dir = os.path.dirname(os.path.abspath(__file__))
     config_file = os.path.join(current_dir, '..', 'config.ini')
-    
+
     # order_menu.sql 在 rebuild_database.py 相同的 tools 目錄下
-    sql_file = os.path.join(current_dir, 'order_menu.sql') 
+    sql_file = os.path.join(current_dir, 'order_menu.sql')
+
+    arg_parser = argparse.ArgumentParser(description='重建資料庫表格並可選擇快速載入固定資料')
+    arg_parser.add_argument('--generate-fixtures', metavar='DIR', help='產生效能測試用的 CSV 固定資料到指定目錄')
+    arg_parser.add_argument('--stores', type=int, default=2500, help='產生固定資料時的店家數量（預設 2500，約 10 萬筆）')
+    arg_parser.add_argument('--fixtures', metavar='DIR', help='重建後從指定目錄載入 CSV 固定資料')
+    arg_parser.add_argument('--load-data', action='store_true', help='使用 LOAD DATA LOCAL INFILE 取代多筆 INSERT')
+    arg_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='多筆 INSERT 每批的列數')
+    arg_parser.add_argument('--snapshot', nargs='?', const='', metavar='NAME', help='載入後建立快照（預設 <database>_snapshot）')
+    arg_parser.add_argument('--restore', nargs='?', const='', metavar='NAME', help='不重建，直接從快照還原資料')
+    args = arg_parser.parse_args()
+
+    if args.generate_fixtures:
+        generate_benchmark_fixtures(args.generate_fixtures, store_count=args.stores)
 
     db_config = get_db_config(config_file)
     if db_config:
-        execute_sql_from_file(sql_file, db_config)
\ No newline at end of file
+        if args.restore is not None:
+            snapshot_database(db_config, args.restore or None, restore=True)
+        elif execute_sql_from_file(sql_file, db_config):
+            fixture_dir = args.fixtures or args.generate_fixtures
+            if fixture_dir and load_fixtures(fixture_dir, db_config, args.load_data, args.batch_size):
+                if args.snapshot is not None:
+                    snapshot_database(db_config, args.snapshot or None)